@@ -0,0 +1,83 @@
+import boto3
+import threading
+
+from botocore.config import Config
+from configparser import ConfigParser
+from typing import Dict
+
+
+config = ConfigParser()
+config.read_file(open('params.cfg'))
+
+# -----------Envrionment Variables----------- #
+# AWS
+max_attempts = int(config['AWS']['max_attempts'])
+retry_mode = config['AWS']['retry_mode']
+max_pool_connections = int(config['AWS']['max_pool_connections'])
+# ------------------------------------------- #
+
+# Creating clients loads the service models and resolves credentials, which
+# is slow and not thread-safe, so every client is built once under the lock
+registry_lock = threading.Lock()
+session = None
+clients = {}
+# Resources are not thread-safe, so each thread builds its own
+thread_resources = threading.local()
+# Number of clients and resources built per service during this run
+built: Dict[str, int] = {}
+
+def get_session() -> boto3.session.Session:
+   """Return the session shared by every client, creating it on first use.
+   """
+   global session
+   with registry_lock:
+      if session is None:
+         session = boto3.session.Session()
+      return session
+
+def get_client_config() -> Config:
+   """Retry and connection pool settings for every client.
+   """
+   return Config(
+      retries={'max_attempts': max_attempts, 'mode': retry_mode},
+      max_pool_connections=max_pool_connections
+   )
+
+def get_client(service: str):
+   """Return the client of the AWS service, creating it on first use.
+   Clients are thread-safe and shared across threads.
+   """
+   aws_session = get_session()
+   with registry_lock:
+      if service not in clients:
+         clients[service] = aws_session.client(service, config=get_client_config())
+         built[service] = built.get(service, 0) + 1
+      return clients[service]
+
+def get_resource(service: str):
+   """Return the resource of the AWS service for the calling thread,
+   creating it on first use.
+   """
+   resources = thread_resources.__dict__
+   if service not in resources:
+      aws_session = get_session()
+      with registry_lock:
+         resources[service] = aws_session.resource(service, config=get_client_config())
+         built[f'{service} (resource)'] = built.get(f'{service} (resource)', 0) + 1
+   return resources[service]
+
+def reset() -> None:
+   """Forget every session, client and resource, e.g. when the credentials
+   or the endpoint change.
+   """
+   global session, thread_resources
+   with registry_lock:
+      session = None
+      clients.clear()
+      built.clear()
+      thread_resources = threading.local()
+
+def print_clients_built() -> None:
+   """Print how many clients and resources were built during the run.
+   """
+   print(f'{sum(built.values())} AWS clients built: {", ".join(f"{service} x{count}" for service, count in sorted(built.items()))}')
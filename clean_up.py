@@ -1,34 +1,41 @@
-import boto3
-
+from aws import get_client, get_resource, print_clients_built
 from configparser import ConfigParser
 from botocore.exceptions import ClientError
+from dag import run_dag, get_critical_path, print_timings
+from state import forget_state, get_recorded, get_state
+from iam_policies import forget_policy, get_policy_arn
 
 
 config = ConfigParser()
 config.read_file(open('params.cfg'))
 
 # -----------Envrionment Variables----------- #
+# Account Info
+account_id = config['Account Info']['account_id']
 # S3
 bucket_name = config['S3']['bucket_name']
 # Transfer Family
 transfer_role = config['Transfer Family']['transfer_role']
+transfer_s3_policy = config['Transfer Family']['transfer_s3_policy_prefix'] + bucket_name
 # Redshift
 redshift_cluster = config['Redshift']['redshift_cluster']
 security_group_name = config['Redshift']['security_group_name']
 redshift_role = config['Redshift']['redshift_role']
+redshift_s3_policy = config['Redshift']['redshift_s3_policy_prefix'] + bucket_name
 # ------------------------------------------- #
 
 def delete_redshift_cluster(name: str) -> None:
    """Delte the Redshift cluster.
    """
    try:
-      redshift = boto3.client('redshift')
+      redshift = get_client('redshift')
       redshift.delete_cluster(
          ClusterIdentifier=name,
          SkipFinalClusterSnapshot=True
       )
       # Wait for the cluster deletion to complete
-      redshift.get_waiter('cluster_deleted').wait(ClusterIdentifier=redshift_cluster)
+      redshift.get_waiter('cluster_deleted').wait(ClusterIdentifier=name)
+      forget_state(f'redshift_cluster:{name}')
    except ClientError as error:
       redshift_error = error.response["Error"]
       print(f'{redshift_error["Code"]}: {redshift_error["Message"]}')
@@ -37,8 +44,9 @@ def delete_security_group(name: str) -> None:
    """Delete the security group.
    """
    try:
-      ec2 = boto3.client('ec2')
+      ec2 = get_client('ec2')
       ec2.delete_security_group(GroupName=name)
+      forget_state(f'security_group:{name}')
    except ClientError as error:
       security_error = error.response["Error"]
       print(f'{security_error["Code"]}: {security_error["Message"]}')
@@ -47,12 +55,21 @@ def delete_iam_role(name: str) -> None:
    """Detach all managed policies from the IAM role.
    """
    try:
-      # Detach all attached policies
-      role = boto3.resource('iam').Role(name)
-      for policy in role.attached_policies.all():
-         role.detach_policy(PolicyArn=policy.arn)
-      # Delete the role
-      role.delete()
+      role = get_resource('iam').Role(name)
+      try:
+         policies = list(role.attached_policies.all())
+      except ClientError as error:
+         if error.response['Error']['Code'] != 'NoSuchEntity':
+            raise
+         # A stale record, e.g. of a role deleted in the console
+         policies = None
+      if policies is not None:
+         # Detach all attached policies
+         for policy in policies:
+            role.detach_policy(PolicyArn=policy.arn)
+         # Delete the role
+         role.delete()
+      forget_state(f'role:{name}')
    except ClientError as error:
       role_error = error.response["Error"]
       print(f'{role_error["Code"]}: {role_error["Message"]}')
@@ -61,57 +78,95 @@ def delete_servers() -> None:
    """Delete the SFTP server. Return the server ID.
    """
    try:
-      transfer = boto3.client('transfer')
-      for server in transfer.list_servers()['Servers']:
-         server_id = server['ServerId']
-         # Delete the server
-         transfer.delete_server(ServerId=server_id)
+      transfer = get_client('transfer')
+      # The server recorded by infrastructures.py, or every server of the account
+      server_id = get_state('sftp_server')
+      if server_id:
+         try:
+            transfer.delete_server(ServerId=server_id)
+         except ClientError as error:
+            if error.response['Error']['Code'] not in ('ResourceNotFoundException', 'ServerNotFound'):
+               raise
+            # A stale record, e.g. of a server deleted in the console
+            forget_state('sftp_server')
+            server_id = None
+      if not server_id:
+         for server in transfer.list_servers()['Servers']:
+            # Delete the server
+            transfer.delete_server(ServerId=server['ServerId'])
+      forget_state('sftp_server')
+      for username in get_recorded('sftp_user'):
+         forget_state(f'sftp_user:{username}')
    except ClientError as error:
       server_error = error.response["Error"]
       print(f'{server_error["Code"]}: {server_error["Message"]}')
 
-def delete_s3_policy(bucket: str, service: str) -> None:
-   """Delete the S3 bucket policy associated with the service.
-
-   Service is either 'transfer' or 'redshift'.
+def delete_s3_policy(name: str) -> None:
+   """Delete the customer managed S3 policy.
    """
-   iam = boto3.client('iam')
-   customer_managed = iam.list_policies(Scope='Local')
-   for customer_managed_policy in customer_managed['Policies']:
-      policy = customer_managed_policy['PolicyName'].lower()
-      if service in policy and bucket in policy:
-         policy_arn = customer_managed_policy['Arn']
-         # Delete the S3 policy
-         iam.delete_policy(PolicyArn=policy_arn)
+   try:
+      iam = get_client('iam')
+      # The policy recorded by infrastructures.py, or the one IAM resolves
+      policy_arn = get_state(f'policy:{name}')
+      if policy_arn:
+         try:
+            iam.delete_policy(PolicyArn=policy_arn)
+         except ClientError as error:
+            if error.response['Error']['Code'] != 'NoSuchEntity':
+               raise
+            # A stale record, e.g. of a policy deleted in the console
+            forget_state(f'policy:{name}')
+            forget_policy(name)
+            policy_arn = None
+      if not policy_arn:
+         policy_arn = get_policy_arn(name, account_id=account_id)
+         if policy_arn is not None:
+            # Delete the S3 policy
+            iam.delete_policy(PolicyArn=policy_arn)
+      forget_policy(name)
+      forget_state(f'policy:{name}')
+   except ClientError as error:
+      policy_error = error.response["Error"]
+      print(f'{policy_error["Code"]}: {policy_error["Message"]}')
 
 def delete_s3_bucket(name: str) -> None:
    """Empty and delete the S3 bucket. 
    """
    try:
-      bucket = boto3.resource('s3').Bucket(name)
+      bucket = get_resource('s3').Bucket(name)
       # Empty all objects in the bucket
       bucket.objects.delete()
       # Delete the bucket
       bucket.delete()
+      forget_state(f'bucket:{name}')
    except ClientError as error:
       s3_error = error.response["Error"]
       print(f'{s3_error["Code"]}: {s3_error["Message"]}')
 
-def main():
-   # 1. Delete the Redshift cluster
-   delete_redshift_cluster(name=redshift_cluster)
-   # 2. Delete the security group
-   delete_security_group(name=security_group_name)
-   # 3. Delete the SFTP server and its user
-   delete_servers()
-   # 4. Delete the Transfer Family and Redshift IAM roles
-   delete_iam_role(name=transfer_role)
-   delete_iam_role(name=redshift_role)
-   # 5. Delete the S3 policies for Transfer Family and Redshift
-   delete_s3_policy(bucket=bucket_name, service='transfer')
-   delete_s3_policy(bucket=bucket_name, service='redshift')
-   # 6. Delete the S3 bucket
-   delete_s3_bucket(name=bucket_name)
+def main() -> None:
+   """Tear down every AWS resource set up by infrastructures.py.
+
+   The steps run as a reverse dependency graph on a thread pool, so that
+   the SFTP servers and the S3 bucket are deleted while the Redshift
+   cluster is shutting down.
+   """
+   tasks = {
+      # 1. Delete the Redshift cluster, then the security group and the role it used
+      'redshift_cluster': (lambda: delete_redshift_cluster(name=redshift_cluster), []),
+      'security_group': (lambda: delete_security_group(name=security_group_name), ['redshift_cluster']),
+      'redshift_role': (lambda: delete_iam_role(name=redshift_role), ['redshift_cluster']),
+      # 2. Delete the SFTP server and its user, then the Transfer Family role
+      'sftp_servers': (delete_servers, []),
+      'transfer_family_role': (lambda: delete_iam_role(name=transfer_role), ['sftp_servers']),
+      # 3. Delete the S3 policies once they are detached from the roles
+      'transfer_family_s3_policy': (lambda: delete_s3_policy(name=transfer_s3_policy), ['transfer_family_role']),
+      'redshift_s3_policy': (lambda: delete_s3_policy(name=redshift_s3_policy), ['redshift_role']),
+      # 4. Empty and delete the S3 bucket
+      's3_bucket': (lambda: delete_s3_bucket(name=bucket_name), [])
+   }
+   timings = run_dag(tasks, max_workers=len(tasks))
+   print_timings(timings, critical_path=get_critical_path(tasks, timings))
+   print_clients_built()
 
 if __name__ == '__main__':
    main()
\ No newline at end of file
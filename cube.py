@@ -0,0 +1,280 @@
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+
+from collections import OrderedDict
+from configparser import ConfigParser
+from star_schema import DIMENSIONS
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+config = ConfigParser()
+config.read_file(open('params.cfg'))
+
+# -----------Envrionment Variables----------- #
+# Data
+data_directory = config['Data']['data_directory']
+# ------------------------------------------- #
+
+# Levels of the natural hierarchies of the dimensions, from the top
+LEVELS: Dict[str, List[str]] = {
+   'program': ['organization_group', 'department', 'program'],
+   'type': ['character', 'object', 'sub_object'],
+   'fund': ['fund_type', 'fund', 'fund_category'],
+   'finance': ['revenue_or_spending']
+}
+# Dimension of every attribute; the fiscal year is a dimension of its own
+ATTRIBUTES: Dict[str, str] = {
+   'fiscal_year': 'fiscal_year',
+   **{attribute: name for name, attributes in DIMENSIONS.items() for attribute in attributes}
+}
+# Groupings of up to this many cells are counted in dense arrays, larger
+# ones after sorting their keys
+DENSE_LIMIT = 1 << 22
+MAX_RESULTS = 256
+# Aggregated per cell or group: the total and largest amount, and the number of transactions
+Aggregate = Dict[str, Any]
+
+def load_fact(path: str) -> Dict[str, np.ndarray]:
+   """Read the transaction fact as compact columns: the fiscal year as
+   int16, the dimension ids as int32 and the amount as int64 cents.
+   """
+   dtypes = {'fiscal_year': 'int16', 'amount': 'float64', **{f'{name}_id': 'int32' for name in DIMENSIONS}}
+   fact = pd.read_csv(path, usecols=list(dtypes), dtype=dtypes, engine='pyarrow')
+   columns = {column: fact[column].to_numpy() for column in dtypes if column != 'amount'}
+   columns['amount'] = np.rint(fact['amount'].to_numpy() * 100).astype(np.int64)
+   return columns
+
+def load_dimensions(directory: str) -> Dict[str, pd.DataFrame]:
+   """Read the dimension tables of the data directory.
+   """
+   return {
+      name: pd.read_csv(os.path.join(directory, f'{name}.csv'), dtype={attribute: str for attribute in attributes})
+      for name, attributes in DIMENSIONS.items()
+   }
+
+def ravel(keys: List[np.ndarray], sizes: List[int]) -> np.ndarray:
+   """Number the combination of the keys of every row, each key being
+   below its size.
+   """
+   cell = keys[0].astype(np.int64)
+   for key, size in zip(keys[1:], sizes[1:]):
+      cell *= size
+      cell += key
+   return cell
+
+def group_cells(keys: List[np.ndarray], sizes: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+   """Number the combinations of the keys, each key being below its size.
+   Return the cell of every combination found, in order, and the position
+   of the cell of every row among them.
+   """
+   cell = ravel(keys, sizes)
+   if np.prod(sizes, dtype=np.int64) <= DENSE_LIMIT:
+      occupied = np.flatnonzero(np.bincount(cell, minlength=int(np.prod(sizes, dtype=np.int64))))
+      positions = np.zeros(int(np.prod(sizes, dtype=np.int64)), dtype=np.int64)
+      positions[occupied] = np.arange(len(occupied))
+      return occupied, positions[cell]
+   return np.unique(cell, return_inverse=True)
+
+def aggregate(groups: np.ndarray, count: int, source: Aggregate) -> Aggregate:
+   """Sum, count and take the largest amount of the rows or cells of the
+   source per group.
+   """
+   # The float sums of whole cents are exact up to 2**53 cents
+   amount = np.rint(np.bincount(groups, weights=source['amount'], minlength=count)).astype(np.int64)
+   if source['transactions'] is None:
+      transactions = np.bincount(groups, minlength=count)
+   else:
+      transactions = np.bincount(groups, weights=source['transactions'], minlength=count).astype(np.int64)
+   max_amount = np.full(count, np.iinfo(np.int64).min)
+   np.maximum.at(max_amount, groups, source['max_amount'])
+   return {'amount': amount, 'transactions': transactions, 'max_amount': max_amount}
+
+class Cube:
+   """Answer group-by and filter queries on any attribute of the star
+   schema from the fact held in memory as NumPy arrays.
+
+   A query is first aggregated into a cuboid, the total and largest amount
+   and the number of transactions per id of every dimension the query
+   groups or filters on, and then rolled up from its cells to the levels
+   asked for. The cuboids are cached, so that another level of the same
+   hierarchies, another filter or fewer dimensions roll up cached cells
+   instead of scanning the fact again.
+   """
+   def __init__(self, fact: Dict[str, np.ndarray], dimensions: Dict[str, pd.DataFrame], max_results: int = MAX_RESULTS) -> None:
+      self.fact = fact
+      first, last = int(fact['fiscal_year'].min()), int(fact['fiscal_year'].max())
+      self.first_year = first
+      # Number of the keys of every dimension
+      self.sizes = {'fiscal_year': last - first + 1}
+      # Code of the value of every attribute per key, and the value of every code
+      self.codes = {'fiscal_year': np.arange(last - first + 1, dtype=np.int32)}
+      self.labels = {'fiscal_year': np.arange(first, last + 1)}
+      for name, dimension in dimensions.items():
+         ids = dimension[f'{name}_id'].to_numpy()
+         self.sizes[name] = int(ids.max()) + 1
+         for attribute in DIMENSIONS[name]:
+            codes, labels = pd.factorize(dimension[attribute])
+            self.codes[attribute] = np.zeros(self.sizes[name], dtype=np.int32)
+            self.codes[attribute][ids] = codes
+            self.labels[attribute] = np.asarray(labels)
+      self.cuboids: Dict[Tuple[str, ...], Aggregate] = {}
+      self.results: Dict[tuple, pd.DataFrame] = OrderedDict()
+      self.max_results = max_results
+      self.lock = threading.Lock()
+
+   def key(self, dimension: str) -> np.ndarray:
+      """Return the key of the dimension of every transaction: its id, or
+      the offset of its fiscal year from the first one.
+      """
+      if dimension == 'fiscal_year':
+         return self.fact['fiscal_year'] - self.first_year
+      return self.fact[f'{dimension}_id']
+
+   @classmethod
+   def from_directory(cls, directory: str = data_directory) -> 'Cube':
+      """Load the star schema written to the data directory by star_schema.py.
+      """
+      return cls(load_fact(os.path.join(directory, 'transaction.csv')), load_dimensions(directory))
+
+   def build_cuboid(self, dimensions: Tuple[str, ...]) -> Optional[Aggregate]:
+      """Aggregate the fact per id of the dimensions, or return None if
+      there are too many combinations of ids to be worth caching.
+      """
+      sizes = [self.sizes[name] for name in dimensions]
+      if np.prod(sizes, dtype=np.int64) > DENSE_LIMIT:
+         return None
+      # The total of all the transactions is a cuboid of a single cell
+      keys = [self.key(name) for name in dimensions] or [np.zeros(len(self.fact['amount']), dtype=np.int8)]
+      # Aggregated into every cell, then the empty cells are dropped, which
+      # saves numbering the cells found on every transaction
+      cuboid = aggregate(ravel(keys, sizes or [1]), int(np.prod(sizes, dtype=np.int64)), {'amount': self.fact['amount'], 'transactions': None, 'max_amount': self.fact['amount']})
+      cells = np.flatnonzero(cuboid['transactions'])
+      cuboid = {measure: values[cells] for measure, values in cuboid.items()}
+      cuboid['keys'] = dict(zip(dimensions, np.unravel_index(cells, sizes or [1])))
+      return cuboid
+
+   def get_cuboid(self, dimensions: Tuple[str, ...]) -> Optional[Aggregate]:
+      """Return the smallest cached cuboid over at least the dimensions, or
+      build and cache the cuboid over them.
+      """
+      cached = [cuboid for key, cuboid in self.cuboids.items() if set(dimensions) <= set(key)]
+      if cached:
+         return min(cached, key=lambda cuboid: len(cuboid['amount']))
+      cuboid = self.build_cuboid(dimensions)
+      if cuboid is not None:
+         self.cuboids[dimensions] = cuboid
+      return cuboid
+
+   def warm(self) -> None:
+      """Build the cuboids of the fiscal year, revenue or spending and one
+      other dimension, from which any query on a single hierarchy rolls up.
+      """
+      for name in DIMENSIONS:
+         if name != 'finance':
+            with self.lock:
+               self.get_cuboid(tuple(sorted(['fiscal_year', 'finance', name])))
+
+   def query(self, by: Iterable[str], where: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+      """Return the total amount, number of transactions and largest amount
+      per combination of the attributes by, of the transactions whose
+      attributes are among the values of where, e.g.
+
+         cube.query(['organization_group'], where={'fiscal_year': 2022, 'revenue_or_spending': 'Spending'})
+      """
+      by = list(by)
+      where = {
+         attribute: list(values) if isinstance(values, (list, tuple, set)) else [values]
+         for attribute, values in (where or {}).items()
+      }
+      unknown = set(by).union(where) - set(ATTRIBUTES)
+      if unknown:
+         raise ValueError(f'Unknown attributes {sorted(unknown)}')
+      key = (tuple(by), tuple(sorted((attribute, tuple(values)) for attribute, values in where.items())))
+      with self.lock:
+         if key in self.results:
+            self.results.move_to_end(key)
+            return self.results[key].copy()
+
+         dimensions = tuple(sorted({ATTRIBUTES[attribute] for attribute in by + list(where)}))
+         source = self.get_cuboid(dimensions)
+         if source is None:
+            source = {'keys': {name: self.key(name) for name in dimensions}, 'amount': self.fact['amount'], 'transactions': None, 'max_amount': self.fact['amount']}
+         result = self.roll_up(source, by, where)
+
+         self.results[key] = result
+         if len(self.results) > self.max_results:
+            self.results.popitem(last=False)
+         return result.copy()
+
+   def roll_up(self, source: Aggregate, by: List[str], where: Dict[str, list]) -> pd.DataFrame:
+      """Filter the rows or cells of the source, then aggregate them per
+      combination of the attributes by.
+      """
+      keys = source['keys']
+      selected = None
+      for attribute, values in where.items():
+         allowed = np.isin(self.labels[attribute], values)[self.codes[attribute]]
+         matches = allowed[keys[ATTRIBUTES[attribute]]]
+         selected = matches if selected is None else selected & matches
+      if selected is not None:
+         # Taking the rows by position is faster than by mask for several columns
+         selected = np.flatnonzero(selected)
+         keys = {name: key[selected] for name, key in keys.items()}
+         amount = source['amount'][selected]
+         source = {
+            'amount': amount,
+            'transactions': None if source['transactions'] is None else source['transactions'][selected],
+            # The rows of the fact are their own largest amount
+            'max_amount': amount if source['max_amount'] is source['amount'] else source['max_amount'][selected]
+         }
+
+      sizes = [len(self.labels[attribute]) for attribute in by]
+      codes = [self.codes[attribute][keys[ATTRIBUTES[attribute]]] for attribute in by]
+      if not by:
+         codes = [np.zeros(len(source['amount']), dtype=np.int32)]
+      cells, groups = group_cells(codes, sizes or [1])
+      aggregated = aggregate(groups, len(cells), source)
+
+      result = pd.DataFrame({
+         attribute: self.labels[attribute][code]
+         for attribute, code in zip(by, np.unravel_index(cells, sizes or [1]))
+      })
+      result['amount'] = aggregated['amount'] / 100
+      result['transactions'] = aggregated['transactions']
+      result['max_amount'] = aggregated['max_amount'] / 100
+      return result.sort_values(by, ignore_index=True) if by else result
+
+   def rollup(self, hierarchy: str, by: Iterable[str] = (), where: Optional[Dict[str, Any]] = None) -> Dict[str, pd.DataFrame]:
+      """Query every level of the hierarchy, from the top, each grouped by
+      the level and the attributes by.
+      """
+      return {level: self.query([*by, level], where) for level in LEVELS[hierarchy]}
+
+def main() -> None:
+   """Load the star schema in data/ and print the metrics of the dashboard.
+   """
+   if not os.path.exists(os.path.join(data_directory, 'transaction.csv')):
+      print(f'No transaction.csv in {data_directory}, run star_schema.py first')
+      return
+   start = time.perf_counter()
+   cube = Cube.from_directory()
+   print(f"{len(cube.fact['amount'])} transactions loaded in {time.perf_counter() - start:.2f}s")
+
+   fiscal_year = int(cube.labels['fiscal_year'][-1])
+   queries = {
+      'Net Profit by Organization Group': (['organization_group', 'revenue_or_spending'], {'fiscal_year': fiscal_year}),
+      'Taxes as Revenue': (['fiscal_year'], {'character': [character for character in cube.labels['character'] if 'Taxes' in character], 'revenue_or_spending': 'Revenue'}),
+      'Top Fund Type by Max Spending': (['fund_type'], {'fiscal_year': fiscal_year, 'revenue_or_spending': 'Spending'}),
+      'Transactions by Organization Group': (['organization_group'], {'fiscal_year': fiscal_year})
+   }
+   for title, (by, where) in queries.items():
+      start = time.perf_counter()
+      result = cube.query(by, where)
+      print(f'\n{title} ({time.perf_counter() - start:.3f}s)')
+      print(result.to_string(index=False))
+
+if __name__ == '__main__':
+   main()
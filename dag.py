@@ -0,0 +1,80 @@
+import time
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# A task is a callable with no arguments and the names of the tasks it depends on
+Task = Tuple[Callable[[], Any], List[str]]
+
+def run_dag(tasks: Dict[str, Task], max_workers: int) -> Dict[str, Tuple[float, float]]:
+   """Run every task on a thread pool as soon as the tasks it depends on
+   have finished. Return the start and end time of each task in seconds
+   since the run began.
+
+   If a task fails, the tasks that depend on it are not started and the
+   error is raised once the running tasks have finished.
+   """
+   for name, (_, dependencies) in tasks.items():
+      unknown = set(dependencies) - set(tasks)
+      if unknown:
+         raise ValueError(f'Task {name} depends on unknown tasks {sorted(unknown)}')
+
+   timings = {}
+   started = time.perf_counter()
+
+   def timed(name: str) -> Any:
+      start = time.perf_counter() - started
+      try:
+         return tasks[name][0]()
+      finally:
+         timings[name] = (start, time.perf_counter() - started)
+
+   done, failed = set(), None
+   with ThreadPoolExecutor(max_workers=max_workers) as executor:
+      running = {}
+      while True:
+         # Submit every task whose dependencies have all finished
+         if failed is None:
+            for name, (_, dependencies) in tasks.items():
+               if name not in done and name not in running.values() and set(dependencies) <= done:
+                  running[executor.submit(timed, name)] = name
+         if not running:
+            break
+         finished, _ = wait(running, return_when=FIRST_COMPLETED)
+         for future in finished:
+            name = running.pop(future)
+            if future.exception() is not None:
+               failed = failed or future.exception()
+            else:
+               done.add(name)
+
+   if failed is not None:
+      raise failed
+   if len(done) < len(tasks):
+      raise ValueError(f'Tasks {sorted(set(tasks) - done)} are part of a dependency cycle')
+   return timings
+
+def get_critical_path(tasks: Dict[str, Task], timings: Dict[str, Tuple[float, float]]) -> List[str]:
+   """Return the chain of tasks that determined the wall-clock time of the
+   run: starting from the last task to finish, follow the dependency that
+   finished last back to a task without dependencies.
+   """
+   path = [max(timings, key=lambda name: timings[name][1])]
+   while tasks[path[-1]][1]:
+      path.append(max(tasks[path[-1]][1], key=lambda name: timings[name][1]))
+   return path[::-1]
+
+def print_timings(timings: Dict[str, Tuple[float, float]], critical_path: Optional[List[str]] = None) -> None:
+   """Print when each task ran, and the wall-clock time of the run against
+   the time the tasks would have taken one after another. Tasks on the
+   critical path are marked with an asterisk.
+   """
+   for name, (start, end) in sorted(timings.items(), key=lambda timing: timing[1]):
+      marker = '*' if name in (critical_path or []) else ' '
+      print(f'{marker} {name:<30}{start:>8.2f}s -> {end:>8.2f}s ({end - start:.2f}s)')
+   wall_clock = max(end for _, end in timings.values())
+   serial = sum(end - start for start, end in timings.values())
+   print(f'  {"Wall-clock":<30}{wall_clock:>8.2f}s (serial: {serial:.2f}s)')
+   if critical_path:
+      print(f'  Critical path: {" -> ".join(critical_path)}')
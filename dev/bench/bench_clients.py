@@ -0,0 +1,99 @@
+"""Count the boto3 clients built, and the time spent building them, during
+a provisioning and a teardown run against moto. With --baseline, first
+run them with a client built at every call, as before the aws.py
+registry.
+
+   python3 dev/bench/bench_clients.py --baseline   # from the project root with ssh/ keys
+"""
+import os
+import sys
+import time
+import boto3
+import argparse
+import botocore.session
+
+from unittest import mock
+from moto import mock_aws
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def count_clients(run) -> None:
+   """Run the function while counting the botocore clients it creates.
+   """
+   create_client = botocore.session.Session.create_client
+   calls = {'count': 0, 'seconds': 0.0}
+
+   def counted(self, *args, **kwargs):
+      start = time.perf_counter()
+      try:
+         return create_client(self, *args, **kwargs)
+      finally:
+         calls['count'] += 1
+         calls['seconds'] += time.perf_counter() - start
+
+   start = time.perf_counter()
+   with mock.patch.object(botocore.session.Session, 'create_client', counted):
+      run()
+   elapsed = time.perf_counter() - start
+   print(f'{run.__module__}.{run.__name__}: {calls["count"]} clients built in {calls["seconds"]:.2f}s of a {elapsed:.2f}s run')
+
+def client_per_call(service: str):
+   return boto3.client(service)
+
+def resource_per_call(service: str):
+   return boto3.resource(service)
+
+def run(per_call: bool) -> None:
+   """Provision and tear down against a fresh moto account, with the
+   registry of aws.py or with a client per call.
+   """
+   import aws
+   import clean_up
+   import iam_policies
+   import infrastructures
+
+   # Nothing is kept from the previous run
+   aws.reset()
+   iam_policies.policy_index = None
+   patches = []
+   if per_call:
+      for module in [infrastructures, clean_up, iam_policies]:
+         patches.append(mock.patch.object(module, 'get_client', client_per_call))
+         if hasattr(module, 'get_resource'):
+            patches.append(mock.patch.object(module, 'get_resource', resource_per_call))
+   for patch in patches:
+      patch.start()
+   try:
+      with mock_aws(config={'iam': {'load_aws_managed_policies': True}}):
+         count_clients(infrastructures.main)
+         count_clients(clean_up.main)
+   finally:
+      for patch in patches:
+         patch.stop()
+
+def main() -> None:
+   parser = argparse.ArgumentParser()
+   parser.add_argument('--baseline', action='store_true', help='Also run with a client built at every call')
+   args = parser.parse_args()
+
+   os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+   import infrastructures
+   import clean_up
+
+   settings = {'account_id': '123456789012', 'region': os.environ['AWS_DEFAULT_REGION'], 'bucket_name': 'bench-sftp-bucket'}
+   for name, value in settings.items():
+      setattr(infrastructures, name, value)
+   clean_up.bucket_name = settings['bucket_name']
+   infrastructures.transfer_s3_policy += settings['bucket_name']
+   infrastructures.redshift_s3_policy += settings['bucket_name']
+   clean_up.transfer_s3_policy, clean_up.redshift_s3_policy = infrastructures.transfer_s3_policy, infrastructures.redshift_s3_policy
+   infrastructures.sftp_server_username = 'bench-user'
+   infrastructures.redshift_db_username, infrastructures.redshift_db_password = 'awsuser', 'Bench1234pass'
+
+   for per_call in [True, False] if args.baseline else [False]:
+      print(f'\n{"client per call" if per_call else "aws.py registry"}')
+      run(per_call)
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,96 @@
+"""Time the queries of cube.py on a synthetic fact of tens of millions of
+transactions drawn from the dimensions in data/: the first time, again,
+and on a cube whose cuboids were warmed up; against joining the
+dimensions to the fact and grouping in pandas.
+
+   python3 dev/bench/bench_cube.py --rows 20000000 50000000 --baseline
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from typing import Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+from cube import Cube, load_dimensions
+from generate_export import FISCAL_YEARS, zipf_weights
+
+# The dashboard metrics, then drill-downs and other filters on the same dimensions
+QUERIES = [
+   ('net profit by organization group', ['organization_group', 'revenue_or_spending'], {'fiscal_year': 2023}),
+   ('drill down to departments', ['department', 'revenue_or_spending'], {'fiscal_year': 2023}),
+   ('drill down to programs', ['program'], {'fiscal_year': 2023, 'organization_group': 'Public Protection'}),
+   ('spending per year', ['fiscal_year'], {'revenue_or_spending': 'Spending'}),
+   ('top fund type by max spending', ['fund_type'], {'fiscal_year': 2023, 'revenue_or_spending': 'Spending'}),
+   ('funds per year', ['fiscal_year', 'fund'], {}),
+   ('taxes as revenue', ['fiscal_year'], {'character': ['Business Taxes', 'Other Local Taxes', 'Property Taxes'], 'revenue_or_spending': 'Revenue'}),
+   ('objects per organization group', ['organization_group', 'object'], {'fiscal_year': [2022, 2023]})
+]
+
+def generate_fact(rows: int, dimensions: Dict[str, pd.DataFrame], seed: int = 0) -> Dict[str, np.ndarray]:
+   """Draw the fact from skewed dimension ids, as generate_export.py does.
+   """
+   rng = np.random.default_rng(seed)
+   year_weights = np.linspace(1, 3, len(FISCAL_YEARS)) / np.linspace(1, 3, len(FISCAL_YEARS)).sum()
+   fact = {'fiscal_year': rng.choice(FISCAL_YEARS, rows, p=year_weights).astype(np.int16)}
+   for name, dimension in dimensions.items():
+      ids = dimension[f'{name}_id'].to_numpy(dtype=np.int32)
+      fact[f'{name}_id'] = ids[rng.choice(len(ids), rows, p=zipf_weights(len(ids), rng))]
+   fact['amount'] = np.rint(rng.lognormal(mean=8, sigma=2.5, size=rows) * 100).astype(np.int64)
+   return fact
+
+def baseline(fact: Dict[str, np.ndarray], dimensions: Dict[str, pd.DataFrame]) -> float:
+   """Time the first query by joining the dimensions to the fact in pandas.
+   """
+   start = time.perf_counter()
+   df = pd.DataFrame(fact)
+   df = df[df['fiscal_year'] == 2023]
+   for name in ['program', 'finance']:
+      df = df.merge(dimensions[name], on=f'{name}_id')
+   df.groupby(['organization_group', 'revenue_or_spending'])['amount'].agg(['sum', 'count', 'max'])
+   return time.perf_counter() - start
+
+def run(rows: int, dimensions: Dict[str, pd.DataFrame], compare: bool) -> None:
+   start = time.perf_counter()
+   fact = generate_fact(rows, dimensions)
+   print(f'\n{rows:,} rows generated in {time.perf_counter() - start:.1f}s '
+         f'({sum(column.nbytes for column in fact.values()) / 1024 / 1024:.0f} MB)')
+   start = time.perf_counter()
+   cube = Cube(fact, dimensions)
+   print(f'cube built in {time.perf_counter() - start:.3f}s')
+   print(f'{"query":<34}{"first":>10}{"repeated":>10}{"warm":>10}{"groups":>8}')
+   warm = Cube(fact, dimensions)
+   start = time.perf_counter()
+   warm.warm()
+   warmed = time.perf_counter() - start
+   for title, by, where in QUERIES:
+      start = time.perf_counter()
+      result = cube.query(by, where)
+      first = time.perf_counter() - start
+      start = time.perf_counter()
+      cube.query(by, where)
+      repeated = time.perf_counter() - start
+      start = time.perf_counter()
+      warm.query(by, where)
+      print(f'{title:<34}{first:>9.3f}s{repeated:>9.4f}s{time.perf_counter() - start:>9.4f}s{len(result):>8}')
+   print(f'cached cuboids: {[" x ".join(key) for key in cube.cuboids]}')
+   print(f'warming up the cuboids of every hierarchy took {warmed:.3f}s')
+   if compare:
+      print(f'{"pandas join and group by":<34}{baseline(fact, dimensions):>9.3f}s')
+
+def main() -> None:
+   parser = argparse.ArgumentParser()
+   parser.add_argument('--rows', type=int, nargs='+', default=[20000000])
+   parser.add_argument('--baseline', action='store_true', help='Also time the first query in pandas')
+   args = parser.parse_args()
+
+   dimensions = load_dimensions('data')
+   for rows in args.rows:
+      run(rows, dimensions, args.baseline)
+
+if __name__ == '__main__':
+   main()
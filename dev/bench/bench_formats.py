@@ -0,0 +1,59 @@
+"""Compare the size and the write/read throughput of the transaction fact
+as CSV against Parquet.
+
+   python3 dev/bench/bench_formats.py --rows 5000000
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+from export import write_parquet
+
+
+def synthetic_fact(rows: int, seed: int = 0) -> pd.DataFrame:
+   """Build a fact table with the key cardinalities of data/*.csv.
+   """
+   rng = np.random.default_rng(seed)
+   return pd.DataFrame({
+      'transaction_id': np.arange(1, rows + 1),
+      'fiscal_year': rng.integers(1999, 2023, rows),
+      'program_id': rng.integers(1, 1572, rows),
+      'type_id': rng.integers(1, 4459, rows),
+      'fund_id': rng.integers(1, 838, rows),
+      'finance_id': rng.integers(1, 3, rows),
+      'amount': rng.lognormal(8, 2, rows).round(2)
+   })
+
+def main() -> None:
+   parser = argparse.ArgumentParser()
+   parser.add_argument('--rows', type=int, default=1000000)
+   args = parser.parse_args()
+
+   directory = tempfile.mkdtemp()
+   try:
+      csv_path = os.path.join(directory, 'transaction.csv')
+      start = time.perf_counter()
+      synthetic_fact(args.rows).to_csv(csv_path, index=False)
+      print(f'CSV written in {time.perf_counter() - start:.2f}s')
+
+      parquet_path = write_parquet('transaction', source=directory, directory=directory)
+
+      # Read both formats into Arrow, as a columnar loader would
+      for label, path, read in [('CSV', csv_path, pa_csv.read_csv), ('Parquet', parquet_path, pq.read_table)]:
+         start = time.perf_counter()
+         read(path)
+         elapsed = time.perf_counter() - start
+         print(f'{label:<10}{os.path.getsize(path) / 1e6:>10.1f} MB  read in {elapsed:.2f}s ({args.rows / elapsed / 1e6:.1f}M rows/s)')
+   finally:
+      shutil.rmtree(directory)
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,155 @@
+"""Time and memory-profile every stage of the pipeline on synthetic raw
+exports (dev/bench/generate_export.py): cleaning, hierarchy repair, the
+star schema build, the file export and a local load. Each stage runs in
+a fresh process, so its peak RSS is its own.
+
+   python3 dev/bench/bench_pipeline.py --rows 1000000 10000000 50000000
+   BENCH_POSTGRES_URL=postgresql+psycopg2://postgres@localhost/bench python3 dev/bench/bench_pipeline.py
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import resource
+import tempfile
+import multiprocessing
+import pandas as pd
+
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+from generate_export import generate_export
+
+
+def clean_stage(directory: str) -> int:
+   from transform import clean, read_raw_chunks
+   return sum(len(clean(chunk)) for chunk in read_raw_chunks(os.path.join(directory, 'raw.csv')))
+
+def repair_stage(directory: str) -> int:
+   from transform import stream_transform
+   return stream_transform(os.path.join(directory, 'raw.csv'), output=os.path.join(directory, 'stage_transaction.csv'))
+
+def star_schema_stage(directory: str) -> int:
+   from star_schema import DIMENSIONS, build_star_schema, write_star_schema
+   attributes = {attribute: str for attributes in DIMENSIONS.values() for attribute in attributes}
+   partitions = pd.read_csv(os.path.join(directory, 'stage_transaction.csv'), dtype=attributes, chunksize=500000)
+   dimensions, transaction = build_star_schema(partitions)
+   write_star_schema(dimensions, transaction, directory=directory)
+   return len(transaction)
+
+def export_stage(directory: str) -> int:
+   from export import split_table, write_parquet
+   export_directory = os.path.join(directory, 'export')
+   os.makedirs(export_directory, exist_ok=True)
+   split_table('transaction', source=directory, directory=export_directory, parts=8, compression='gzip', bucket='bench')
+   write_parquet('transaction', source=directory, directory=export_directory)
+   return sum(1 for _ in open(os.path.join(directory, 'transaction.csv'))) - 1
+
+def load_stage(directory: str) -> int:
+   """Load the star schema with load_tables.py into the local Postgres
+   database at $BENCH_POSTGRES_URL, or else into a SQLite database with the
+   DDL of load_tables.py.
+   """
+   from sqlalchemy import create_engine
+   from sqlalchemy.schema import MetaData
+   import load_tables
+   from load_tables import TABLES, create_program_dimension, create_type_dimension
+   from load_tables import create_fund_dimension, create_finance_dimension, create_transaction_fact
+
+   rows = sum(1 for _ in open(os.path.join(directory, 'transaction.csv'))) - 1
+   creates = [create_program_dimension, create_type_dimension, create_fund_dimension, create_finance_dimension, create_transaction_fact]
+   if os.environ.get('BENCH_POSTGRES_URL'):
+      load_tables.backend, load_tables.local_url, load_tables.local_directory = 'postgres', os.environ['BENCH_POSTGRES_URL'], directory
+      engine = load_tables.warehouse_connection()
+      load_tables.create_schema(name='report', engine=engine)
+      report = MetaData(schema='report')
+      load_tables.create_data_version(schema=report, engine=engine)
+      for create in creates:
+         create(schema=report, engine=engine)
+      # The database may hold a previous run, whose fact rows reference the dimensions
+      load_tables.reload_star_schema({name: None for name in TABLES}, schema='report', engine=engine)
+      engine.dispose()
+      return rows
+
+   database = os.path.join(directory, 'report.db')
+   engine = create_engine(f'sqlite:///{database}')
+   report = MetaData()
+   for create in creates:
+      create(schema=report, engine=engine)
+   engine.dispose()
+
+   with sqlite3.connect(database) as connection:
+      for name in TABLES:
+         for chunk in pd.read_csv(os.path.join(directory, f'{name}.csv'), chunksize=500000):
+            placeholders = ', '.join('?' * len(chunk.columns))
+            connection.executemany(f'INSERT INTO "{name}" VALUES ({placeholders})', chunk.itertuples(index=False, name=None))
+   return rows
+
+STAGES: Dict[str, Callable[[str], int]] = {
+   'clean': clean_stage,
+   'hierarchy repair': repair_stage,
+   'star schema': star_schema_stage,
+   'export': export_stage,
+   'local load': load_stage
+}
+
+def profile(stage: str, directory: str, results: multiprocessing.Queue) -> None:
+   """Run the stage and report its time, rows and peak RSS, including the
+   RSS of the worker processes it started.
+   """
+   start = time.perf_counter()
+   rows = STAGES[stage](directory)
+   elapsed = time.perf_counter() - start
+   # ru_maxrss is in kilobytes on Linux
+   peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+   results.put({'seconds': elapsed, 'rows': rows, 'peak_rss_mb': peak / 1024})
+
+def run(rows: int, directory: str) -> List[dict]:
+   """Generate an export of the given rows and profile every stage on it.
+   """
+   context = multiprocessing.get_context('spawn')
+   # Generated in a child too, since a process starts with the RSS of its parent
+   start = time.perf_counter()
+   process = context.Process(target=generate_export, args=(rows, os.path.join(directory, 'raw.csv')))
+   process.start()
+   process.join()
+   print(f'{"stage":<18}{"seconds":>10}{"rows/s":>14}{"peak RSS":>12}')
+   print(f'{"generate":<18}{time.perf_counter() - start:>10.1f}')
+   report = []
+   for stage in STAGES:
+      results = context.Queue()
+      process = context.Process(target=profile, args=(stage, directory, results))
+      process.start()
+      process.join()
+      if process.exitcode != 0:
+         raise RuntimeError(f'The {stage} stage failed')
+      result = results.get()
+      result.update({'stage': stage, 'export_rows': rows})
+      report.append(result)
+      print(f'{stage:<18}{result["seconds"]:>10.1f}{result["rows"] / result["seconds"]:>14,.0f}{result["peak_rss_mb"]:>9.0f} MB')
+   return report
+
+def main() -> None:
+   parser = argparse.ArgumentParser()
+   parser.add_argument('--rows', type=int, nargs='+', default=[1000000])
+   parser.add_argument('--output', help='Write the results as JSON to this path')
+   args = parser.parse_args()
+
+   report = []
+   for rows in args.rows:
+      directory = tempfile.mkdtemp()
+      try:
+         print(f'\n{rows:,} rows')
+         report += run(rows, directory)
+      finally:
+         shutil.rmtree(directory)
+   if args.output:
+      with open(args.output, 'w') as file:
+         json.dump(report, file, indent=3)
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,68 @@
+"""Compare a single-session paramiko put of every file, the way an
+interactive `put data/*` runs, against sftp_upload.upload_files over
+several pipelined sessions, with a local SFTP server serving a temporary
+directory in place of the bucket.
+
+   python3 dev/bench/bench_sftp.py --files 8 --size-mb 32 --sessions 4
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import importlib.util
+import paramiko
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+from sftp_upload import open_session, upload_files
+
+# The local server lives with the tests
+spec = importlib.util.spec_from_file_location('sftp_stub', os.path.join(os.path.dirname(__file__), '..', 'tdd', 'sftp_stub.py'))
+sftp_stub = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sftp_stub)
+
+
+def main() -> None:
+   parser = argparse.ArgumentParser()
+   parser.add_argument('--files', type=int, default=8)
+   parser.add_argument('--size-mb', type=int, default=32)
+   parser.add_argument('--sessions', type=int, default=4)
+   args = parser.parse_args()
+
+   directory = tempfile.mkdtemp()
+   try:
+      source, bucket = os.path.join(directory, 'source'), os.path.join(directory, 'bucket')
+      os.mkdir(source)
+      os.mkdir(bucket)
+      paths = []
+      for part in range(args.files):
+         path = os.path.join(source, f'transaction.{part:04d}.csv.gz')
+         with open(path, 'wb') as file:
+            file.write(os.urandom(args.size_mb * 1024 * 1024))
+         paths.append(path)
+      total = args.files * args.size_mb
+      key = paramiko.RSAKey.generate(2048)
+      port, stop = sftp_stub.serve(bucket, host_key=key)
+
+      start = time.perf_counter()
+      transport, sftp = open_session('127.0.0.1', port, 'bench-user', key)
+      for path in paths:
+         sftp.put(path, os.path.basename(path))
+      sftp.close()
+      transport.close()
+      baseline = time.perf_counter() - start
+      print(f'single session put: {baseline:.2f}s ({total / baseline:.1f} MB/s)')
+
+      for name in os.listdir(bucket):
+         os.remove(os.path.join(bucket, name))
+      start = time.perf_counter()
+      upload_files(paths, host='127.0.0.1', port=port, username='bench-user', key=key, max_sessions=args.sessions)
+      elapsed = time.perf_counter() - start
+      print(f'upload_files over {args.sessions} sessions: {elapsed:.2f}s ({total / elapsed:.1f} MB/s, {baseline / elapsed:.1f}x)')
+      stop()
+   finally:
+      shutil.rmtree(directory)
+
+if __name__ == '__main__':
+   main()
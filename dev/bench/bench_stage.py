@@ -0,0 +1,158 @@
+"""Time and memory-profile reading the staged transactions of synthetic
+raw exports (dev/bench/generate_export.py) with stage.read_stage, which
+streams chunks from a server-side cursor, against reading the whole
+table at once as pd.read_sql does. On a local Postgres database, also
+time staging the export with stage.write_stage, which streams chunks
+with COPY FROM STDIN, against DataFrame.to_sql as dev/eda.ipynb does.
+Each read and write runs in a fresh process, so its peak RSS is its own.
+
+   python3 dev/bench/bench_stage.py --rows 200000 1000000 5000000
+   BENCH_POSTGRES_URL=postgresql+psycopg2://postgres@localhost/bench python3 dev/bench/bench_stage.py
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import multiprocessing
+import pandas as pd
+
+from typing import Callable, Dict, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+from generate_export import generate_export
+
+
+def connect(directory: str) -> Tuple[str, str]:
+   """Return the URL and schema of the local Postgres database at
+   $BENCH_POSTGRES_URL, or else of a SQLite database in the directory.
+   """
+   if os.environ.get('BENCH_POSTGRES_URL'):
+      return os.environ['BENCH_POSTGRES_URL'], 'stage'
+   return f"sqlite:///{os.path.join(directory, 'stage.db')}", 'main'
+
+def stage_export(path: str, url: str, schema: str) -> None:
+   """Stage the raw export as the transaction table of dev/eda.ipynb, with
+   write_stage on Postgres.
+   """
+   from sqlalchemy import Column, MetaData, Table, create_engine
+   from sqlalchemy.types import BigInteger, Float, Text
+   from transform import normalize_columns
+
+   if schema != 'main':
+      write_copy(path, url, schema, name='transaction')
+      return
+   engine = create_engine(url)
+   table = None
+   with engine.begin() as conn:
+      for chunk in pd.read_csv(path, chunksize=100000):
+         chunk = normalize_columns(chunk)
+         if table is None:
+            columns = [Column(col, {'i': BigInteger, 'f': Float}.get(chunk[col].dtype.kind, Text)) for col in chunk.columns]
+            table = Table('transaction', MetaData(schema=schema), *columns)
+            table.create(conn)
+         conn.execute(table.insert(), chunk.astype(object).where(chunk.notna(), None).to_dict('records'))
+   engine.dispose()
+
+def read_streamed(url: str, schema: str) -> Tuple[float, int]:
+   from sqlalchemy import create_engine
+   from stage import read_stage
+
+   start, first, rows = time.perf_counter(), None, 0
+   for chunk in read_stage('transaction', engine=create_engine(url), schema=schema):
+      first = first or time.perf_counter() - start
+      rows += len(chunk)
+   return first, rows
+
+def read_whole(url: str, schema: str) -> Tuple[float, int]:
+   from sqlalchemy import create_engine, text
+   from transform import compact_types
+
+   start = time.perf_counter()
+   with create_engine(url).connect() as conn:
+      result = conn.execute(text(f'SELECT * FROM {schema}."transaction";'))
+      df = compact_types(pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys())))
+   return time.perf_counter() - start, len(df)
+
+def write_copy(path: str, url: str, schema: str, name: str = 'transaction_copy') -> Tuple[float, int]:
+   from stage import TRANSACTION_TYPES, copy_connection, write_stage
+   from transform import normalize_columns
+
+   start = time.perf_counter()
+   with copy_connection(url) as conn:
+      chunks = (normalize_columns(chunk) for chunk in pd.read_csv(path, dtype=str, chunksize=100000))
+      rows = write_stage(chunks, name, conn=conn, schema=schema, types=TRANSACTION_TYPES)
+   return time.perf_counter() - start, rows
+
+def write_to_sql(path: str, url: str, schema: str) -> Tuple[float, int]:
+   from sqlalchemy import create_engine
+   from transform import normalize_columns
+
+   start = time.perf_counter()
+   expenditure = normalize_columns(pd.read_csv(path))
+   expenditure.to_sql(name='transaction_to_sql', con=create_engine(url), schema=schema, if_exists='replace')
+   return time.perf_counter() - start, len(expenditure)
+
+READS: Dict[str, Callable[[str, str], Tuple[float, int]]] = {
+   'read_stage': read_streamed,
+   'whole table': read_whole
+}
+WRITES: Dict[str, Callable[[str, str, str], Tuple[float, int]]] = {
+   'write_stage': write_copy,
+   'to_sql': write_to_sql
+}
+
+def profile(read: str, args: tuple, results: multiprocessing.Queue) -> None:
+   """Run the read or write and report its time to the first chunk, total
+   time and peak RSS.
+   """
+   start = time.perf_counter()
+   first, rows = {**READS, **WRITES}[read](*args)
+   elapsed = time.perf_counter() - start
+   # ru_maxrss is in kilobytes on Linux
+   results.put({'first': first, 'seconds': elapsed, 'rows': rows, 'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+
+def run(rows: int, directory: str) -> None:
+   context = multiprocessing.get_context('spawn')
+   url, schema = connect(directory)
+   raw = os.path.join(directory, 'raw.csv')
+   # Generated and staged in children too, since a process starts with the RSS of its parent
+   start = time.perf_counter()
+   for target, args in [(generate_export, (rows, raw)), (stage_export, (raw, url, schema))]:
+      process = context.Process(target=target, args=args)
+      process.start()
+      process.join()
+   print(f'generated and staged in {time.perf_counter() - start:.1f}s')
+   print(f'{"read":<14}{"first chunk":>12}{"seconds":>10}{"peak RSS":>12}')
+   # COPY FROM STDIN is Postgres only
+   runs = [(read, (url, schema)) for read in READS]
+   runs += [(write, (raw, url, schema)) for write in WRITES] if schema != 'main' else []
+   for read, args in runs:
+      results = context.Queue()
+      process = context.Process(target=profile, args=(read, args, results))
+      process.start()
+      process.join()
+      if process.exitcode != 0:
+         raise RuntimeError(f'The {read} run failed')
+      result = results.get()
+      first = f'{result["first"]:>11.2f}s' if read in READS else f'{"":>12}'
+      print(f'{read:<14}{first}{result["seconds"]:>9.1f}s{result["peak_rss_mb"]:>9.0f} MB')
+
+def main() -> None:
+   parser = argparse.ArgumentParser()
+   parser.add_argument('--rows', type=int, nargs='+', default=[200000, 1000000])
+   args = parser.parse_args()
+
+   for rows in args.rows:
+      directory = tempfile.mkdtemp()
+      try:
+         print(f'\n{rows:,} rows')
+         run(rows, directory)
+      finally:
+         shutil.rmtree(directory)
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,94 @@
+"""Benchmark the vectorized hierarchy repair of transform.py against the
+row-wise functions of dev/transform.ipynb.
+
+   python3 dev/bench/bench_transform.py --rows 200000
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+from transform import HIERARCHIES, repair_hierarchy
+
+
+# --------Notebook Version (dev/transform.ipynb)-------- #
+def get_invalid_feature_values(*cols, target: str, df: pd.DataFrame) -> pd.DataFrame:
+   group_cols = [col for col in cols]
+   feature_with_multiple_codes = df[group_cols + [target]].groupby(group_cols, as_index=False).agg({target: 'nunique'})
+   invalid_features = feature_with_multiple_codes[feature_with_multiple_codes[target] > 1][group_cols]
+
+   return invalid_features
+
+def get_invalid_feature_impute_code(*cols, target: str, invalid_features: pd.DataFrame, df: pd.DataFrame) -> pd.DataFrame:
+   group_cols = [col for col in cols]
+   row_condition = df[group_cols].apply(tuple, axis=1).isin(invalid_features[group_cols].apply(tuple, axis=1))
+   invalid_rows = df[group_cols + [target]][row_condition]
+   invalid_impute_codes = invalid_rows.groupby(group_cols, as_index=False).first()
+
+   return invalid_impute_codes
+
+def impute_codes(invalid_features_impute_codes: pd.DataFrame, df: pd.DataFrame) -> None:
+   features_group = invalid_features_impute_codes.columns[:-1]
+   target = invalid_features_impute_codes.columns[-1]
+
+   for invalid_features_impute_code in invalid_features_impute_codes.apply(tuple, axis=1):
+      invalid_group = invalid_features_impute_code[:-1]
+      impute_code = invalid_features_impute_code[-1]
+
+      df_invalid_group = (df[features_group].apply(tuple, axis=1) == invalid_group)
+
+      df.loc[df_invalid_group, target] = df.loc[df_invalid_group, target].apply(lambda val: impute_code if val != impute_code else val)
+
+def notebook_transform(hierarchy, target: str, df: pd.DataFrame) -> None:
+   invalid_features = get_invalid_feature_values(*hierarchy, target=target, df=df)
+   invalid_impute_codes = get_invalid_feature_impute_code(*hierarchy, target=target, invalid_features=invalid_features, df=df)
+   if len(invalid_impute_codes) > 0:
+      impute_codes(invalid_features_impute_codes=invalid_impute_codes, df=df)
+# ------------------------------------------------------ #
+
+def synthetic_transactions(rows: int, seed: int = 0) -> pd.DataFrame:
+   """Build hierarchy columns in which about 2% of the groups carry
+   more than one code.
+   """
+   rng = np.random.default_rng(seed)
+   df = pd.DataFrame()
+   for hierarchy, target in HIERARCHIES:
+      feature = hierarchy[-1]
+      if feature in df:
+         continue
+      cardinality = {1: 10, 2: 60, 3: 1500}[len(hierarchy)]
+      labels = rng.integers(0, cardinality, rows)
+      df[feature] = pd.Series(labels).map(lambda label: f'{feature} {label}')
+      dirty = (rng.random(cardinality) < 0.02)[labels] & (rng.random(rows) < 0.5)
+      df[target] = np.where(dirty, labels + cardinality * rng.integers(1, 3, rows), labels).astype(str)
+   return df
+
+def main() -> None:
+   parser = argparse.ArgumentParser()
+   parser.add_argument('--rows', type=int, default=20000)
+   args = parser.parse_args()
+
+   df = synthetic_transactions(args.rows)
+   notebook_df, vectorized_df = df.copy(), df.copy()
+
+   print(f'{"target":<25}{"notebook (s)":>15}{"vectorized (s)":>16}{"speedup":>10}')
+   for hierarchy, target in HIERARCHIES:
+      start = time.perf_counter()
+      notebook_transform(hierarchy, target=target, df=notebook_df)
+      notebook_time = time.perf_counter() - start
+
+      start = time.perf_counter()
+      repair_hierarchy(hierarchy, target=target, df=vectorized_df)
+      vectorized_time = time.perf_counter() - start
+
+      print(f'{target:<25}{notebook_time:>15.3f}{vectorized_time:>16.3f}{notebook_time / vectorized_time:>9.0f}x')
+
+   # Both versions must agree on every imputed code
+   pd.testing.assert_frame_equal(notebook_df, vectorized_df)
+   print('Results match.')
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,165 @@
+"""Generate a synthetic Spending_and_Revenue export with the columns of
+the DataSF download, drawn from the dimension rows in data/*.csv. The
+dirty cases handled by transform.py are injected at about the rates
+found in the real export (dev/eda.ipynb):
+
+- about 2% of the groups of every hierarchy carry a second code
+- null programs, departments, characters and fund categories
+- NKEY sub-objects, and upper-case related government units
+
+   python3 dev/bench/generate_export.py --rows 10000000 --output data/Spending_and_Revenue.csv
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from typing import Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+from transform import HIERARCHIES, group_ids
+
+
+# Columns of the raw export, with the dimension attribute each one holds
+RAW_COLUMNS = {
+   'Fiscal Year': 'fiscal_year',
+   'Related Govt Units': 'related_govt_units',
+   'Organization Group Code': 'organization_group_code',
+   'Organization Group': 'organization_group',
+   'Department Code': 'department_code',
+   'Department': 'department',
+   'Program Code': 'program_code',
+   'Program': 'program',
+   'Character Code': 'character_code',
+   'Character': 'character',
+   'Object Code': 'object_code',
+   'Object': 'object',
+   'Sub-object Code': 'sub_object_code',
+   'Sub-object': 'sub_object',
+   'Fund Type Code': 'fund_type_code',
+   'Fund Type': 'fund_type',
+   'Fund Code': 'fund_code',
+   'Fund': 'fund',
+   'Fund Category Code': 'fund_category_code',
+   'Fund Category': 'fund_category',
+   'Revenue or Spending': 'revenue_or_spending',
+   'Amount': 'amount'
+}
+# Share of the rows of the real export with each dirty case
+NULL_PROGRAM_RATE = 736 / 656959
+NULL_DEPARTMENT_RATE = 1 / 656959
+NULL_CHARACTER_RATE = 246 / 656959
+UPPER_CASE_RATE = 0.03
+# Share of the groups of a hierarchy with a second code, and of their rows using it
+MULTI_CODE_GROUP_RATE = 0.02
+SECOND_CODE_RATE = 0.1
+FISCAL_YEARS = np.arange(1999, 2024)
+
+def zipf_weights(n: int, rng: np.random.Generator, exponent: float = 0.8) -> np.ndarray:
+   """Skewed sampling weights, so that a few programs, types and funds
+   hold most of the transactions, in a random order.
+   """
+   weights = 1 / np.arange(1, n + 1) ** exponent
+   rng.shuffle(weights)
+   return weights / weights.sum()
+
+def second_code(code: str) -> str:
+   """Another code of the same kind, e.g. 12 for 2 or 'ADM2' for 'ADM'.
+   """
+   try:
+      return f'{float(code) + 10:.1f}' if '.' in code else str(int(code) + 10)
+   except ValueError:
+      return f'{code}2'
+
+def is_revenue(character_code: pd.Series) -> np.ndarray:
+   """Characters 400-499 and the named revenue characters are revenues.
+   """
+   code = character_code.str.upper()
+   return (code.str.match(r'^4\d\d$') | code.str.contains('REV|CHGS|RENTS|TFR_IN|TAX')).to_numpy()
+
+class ExportGenerator:
+   """Draw transactions from the dimension rows of a data directory.
+   """
+   def __init__(self, data_directory: str, seed: int = 0) -> None:
+      self.rng = np.random.default_rng(seed)
+      self.dimensions: Dict[str, pd.DataFrame] = {
+         name: pd.read_csv(os.path.join(data_directory, f'{name}.csv'), dtype=str).drop(columns=f'{name}_id')
+         for name in ['program', 'type', 'fund']
+      }
+      self.weights = {name: zipf_weights(len(dimension), self.rng) for name, dimension in self.dimensions.items()}
+      self.year_weights = np.linspace(1, 3, len(FISCAL_YEARS)) / np.linspace(1, 3, len(FISCAL_YEARS)).sum()
+      # The second code of the rows of the groups picked to carry one
+      self.second_codes = {}
+      for hierarchy, target in HIERARCHIES:
+         dimension = next(dimension for dimension in self.dimensions.values() if target in dimension)
+         ids = group_ids(dimension, hierarchy)
+         picked = self.rng.random(ids.max() + 1) < MULTI_CODE_GROUP_RATE
+         codes = dimension[target].map(second_code).to_numpy(dtype=object)
+         self.second_codes[target] = np.where(picked[ids], codes, None)
+
+   def generate(self, rows: int) -> pd.DataFrame:
+      """Return rows transactions with the columns of the raw export.
+      """
+      rng = self.rng
+      df = pd.DataFrame({'fiscal_year': rng.choice(FISCAL_YEARS, rows, p=self.year_weights)})
+      positions = {}
+      for name, dimension in self.dimensions.items():
+         positions[name] = rng.choice(len(dimension), rows, p=self.weights[name])
+         for column in dimension.columns:
+            df[column] = dimension[column].to_numpy(dtype=object)[positions[name]]
+      df['revenue_or_spending'] = np.where(is_revenue(df['character_code']), 'Revenue', 'Spending')
+      amount = np.round(rng.lognormal(mean=8, sigma=2.5, size=rows), 2)
+      df['amount'] = np.where(rng.random(rows) < 0.05, -amount, amount)
+
+      # Groups with a second code
+      for target, codes in self.second_codes.items():
+         name = next(name for name, dimension in self.dimensions.items() if target in dimension)
+         second = codes[positions[name]]
+         use = (second != None) & (rng.random(rows) < SECOND_CODE_RATE)
+         df.loc[use, target] = second[use]
+      # The placeholders of the cleaned dimensions are nulls in the export
+      no_character = (df['character'] == 'No Character').to_numpy() | (rng.random(rows) < NULL_CHARACTER_RATE)
+      df.loc[no_character, ['character', 'object', 'object_code', 'sub_object']] = None
+      df.loc[df['sub_object_code'] == 'NKEY', 'sub_object'] = None
+      no_category = (df['fund_category'] == 'No Fund Category').to_numpy()
+      df.loc[no_category, ['fund_category', 'fund_category_code']] = None
+      df.loc[rng.random(rows) < NULL_PROGRAM_RATE, ['program', 'program_code']] = None
+      df.loc[rng.random(rows) < NULL_DEPARTMENT_RATE, 'department'] = None
+      upper = rng.random(rows) < UPPER_CASE_RATE
+      df.loc[upper, 'related_govt_units'] = df.loc[upper, 'related_govt_units'].str.upper()
+
+      return df[list(RAW_COLUMNS.values())].set_axis(list(RAW_COLUMNS), axis=1)
+
+def generate_export(rows: int, output: str, data_directory: str = 'data', seed: int = 0, chunksize: int = 1000000) -> None:
+   """Write rows synthetic transactions to the output CSV, one chunk at a
+   time so that memory does not grow with the number of rows.
+   """
+   import pyarrow as pa
+   import pyarrow.csv as pa_csv
+
+   generator = ExportGenerator(data_directory, seed=seed)
+   schema = pa.schema([
+      (column, pa.int64() if column == 'Fiscal Year' else pa.float64() if column == 'Amount' else pa.string())
+      for column in RAW_COLUMNS
+   ])
+   start, written = time.perf_counter(), 0
+   # pyarrow writes CSV several times faster than DataFrame.to_csv
+   with pa_csv.CSVWriter(output, schema) as writer:
+      while written < rows:
+         chunk = generator.generate(min(chunksize, rows - written))
+         writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+         written += len(chunk)
+   print(f'{written} rows written to {output} in {time.perf_counter() - start:.1f}s ({os.path.getsize(output) / 1e6:.0f} MB)')
+
+def main() -> None:
+   parser = argparse.ArgumentParser()
+   parser.add_argument('--rows', type=int, default=1000000)
+   parser.add_argument('--output', default='data/Spending_and_Revenue.csv')
+   parser.add_argument('--seed', type=int, default=0)
+   args = parser.parse_args()
+   generate_export(args.rows, output=args.output, seed=args.seed)
+
+if __name__ == '__main__':
+   main()
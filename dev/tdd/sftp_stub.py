@@ -0,0 +1,120 @@
+"""A local SFTP server, built on paramiko, that serves a directory in place
+of the Transfer Family server and its S3 bucket.
+"""
+import os
+import socket
+import threading
+import paramiko
+
+from typing import Callable, Tuple
+
+
+class StubServer(paramiko.ServerInterface):
+   """Accept the one public key given, for any user.
+   """
+   def __init__(self, authorized_key: paramiko.PKey) -> None:
+      self.authorized_key = authorized_key
+
+   def check_auth_publickey(self, username, key):
+      if key.asbytes() == self.authorized_key.asbytes():
+         return paramiko.AUTH_SUCCESSFUL
+      return paramiko.AUTH_FAILED
+
+   def get_allowed_auths(self, username):
+      return 'publickey'
+
+   def check_channel_request(self, kind, chanid):
+      return paramiko.OPEN_SUCCEEDED if kind == 'session' else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+class StubHandle(paramiko.SFTPHandle):
+
+   def stat(self):
+      return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+   def chattr(self, attr):
+      return paramiko.SFTP_OK
+
+class StubSFTPServer(paramiko.SFTPServerInterface):
+   """Serve the files of the root directory.
+   """
+   def __init__(self, server, *args, root: str, **kwargs) -> None:
+      super().__init__(server, *args, **kwargs)
+      self.root = root
+
+   def local_path(self, path: str) -> str:
+      return os.path.join(self.root, self.canonicalize(path).lstrip('/'))
+
+   def canonicalize(self, path):
+      return os.path.normpath(os.path.join('/', path))
+
+   def stat(self, path):
+      try:
+         return paramiko.SFTPAttributes.from_stat(os.stat(self.local_path(path)))
+      except OSError as error:
+         return paramiko.SFTPServer.convert_errno(error.errno)
+
+   lstat = stat
+
+   def list_folder(self, path):
+      try:
+         directory = self.local_path(path)
+         return [
+            paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(directory, name)), name)
+            for name in os.listdir(directory)
+         ]
+      except OSError as error:
+         return paramiko.SFTPServer.convert_errno(error.errno)
+
+   def open(self, path, flags, attr):
+      try:
+         fd = os.open(self.local_path(path), flags, 0o666)
+      except OSError as error:
+         return paramiko.SFTPServer.convert_errno(error.errno)
+      if flags & os.O_WRONLY:
+         mode = 'ab' if flags & os.O_APPEND else 'wb'
+      elif flags & os.O_RDWR:
+         mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+      else:
+         mode = 'rb'
+      handle = StubHandle(flags)
+      handle.readfile = handle.writefile = os.fdopen(fd, mode)
+      return handle
+
+   def remove(self, path):
+      try:
+         os.remove(self.local_path(path))
+      except OSError as error:
+         return paramiko.SFTPServer.convert_errno(error.errno)
+      return paramiko.SFTP_OK
+
+def serve(root: str, host_key: paramiko.PKey) -> Tuple[int, Callable[[], None]]:
+   """Serve the root directory over SFTP on a local port, authenticating
+   clients with the host key, as the Transfer Family server does with the
+   project's key. Return the port and a function that stops the server.
+   """
+   listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+   listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+   listener.bind(('127.0.0.1', 0))
+   listener.listen(16)
+   transports = []
+
+   def accept() -> None:
+      while True:
+         try:
+            connection, _ = listener.accept()
+         except OSError:
+            return
+         transport = paramiko.Transport(connection)
+         transport.add_server_key(host_key)
+         transport.set_subsystem_handler('sftp', paramiko.SFTPServer, StubSFTPServer, root=root)
+         transport.start_server(server=StubServer(host_key))
+         transports.append(transport)
+
+   threading.Thread(target=accept, daemon=True).start()
+
+   def stop() -> None:
+      listener.close()
+      for transport in transports:
+         transport.close()
+
+   return listener.getsockname()[1], stop
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+from cube import Cube, load_dimensions
+
+
+class TestCube(unittest.TestCase):
+
+   @classmethod
+   def setUpClass(cls):
+      cls.dimensions = load_dimensions('data')
+      rng = np.random.default_rng(0)
+      rows = 100000
+      cls.fact = {'fiscal_year': rng.integers(2015, 2024, rows).astype(np.int16)}
+      for name, dimension in cls.dimensions.items():
+         cls.fact[f'{name}_id'] = rng.choice(dimension[f'{name}_id'].to_numpy(dtype=np.int32), rows)
+      cls.fact['amount'] = rng.integers(-100000, 10000000, rows)
+
+   def setUp(self):
+      self.cube = Cube(self.fact, self.dimensions)
+
+   def joined(self):
+      df = pd.DataFrame(self.fact)
+      for name, dimension in self.dimensions.items():
+         df = df.merge(dimension, on=f'{name}_id')
+      return df
+
+   def assertMatchesPandas(self, result, by, df):
+      expected = df.groupby(by)['amount'].agg(['sum', 'count', 'max']).reset_index()
+      self.assertEqual(result[by].values.tolist(), expected[by].values.tolist())
+      np.testing.assert_array_equal(result['amount'].to_numpy(), expected['sum'].to_numpy() / 100)
+      np.testing.assert_array_equal(result['transactions'].to_numpy(), expected['count'].to_numpy())
+      np.testing.assert_array_equal(result['max_amount'].to_numpy(), expected['max'].to_numpy() / 100)
+
+   def test_Queries_Match_Joining_The_Dimensions(self):
+      df = self.joined()
+      result = self.cube.query(['organization_group', 'fiscal_year'], where={'revenue_or_spending': 'Spending'})
+      self.assertMatchesPandas(result, ['organization_group', 'fiscal_year'], df[df['revenue_or_spending'] == 'Spending'])
+      # Across hierarchies, too many ids to cache a cuboid of
+      result = self.cube.query(['character', 'department'], where={'fiscal_year': [2020, 2021]})
+      self.assertMatchesPandas(result, ['character', 'department'], df[df['fiscal_year'].isin([2020, 2021])])
+
+   def test_Levels_Of_A_Hierarchy_Roll_Up_From_One_Cuboid(self):
+      df = self.joined()
+      levels = self.cube.rollup('program', by=['fiscal_year'], where={'revenue_or_spending': 'Revenue'})
+
+      self.assertEqual(list(levels), ['organization_group', 'department', 'program'])
+      for level, result in levels.items():
+         self.assertMatchesPandas(result, ['fiscal_year', level], df[df['revenue_or_spending'] == 'Revenue'])
+      self.assertEqual(list(self.cube.cuboids), [('finance', 'fiscal_year', 'program')])
+      # Fewer dimensions roll up the cached cuboid as well
+      self.assertEqual(self.cube.query([])['transactions'][0], len(df))
+      self.assertEqual(len(self.cube.cuboids), 1)
+
+   def test_Results_Are_Cached_Up_To_The_Limit(self):
+      cube = Cube(self.fact, self.dimensions, max_results=2)
+      first = cube.query(['fund_type'])
+      first['amount'] = 0
+      cube.query(['fund'])
+      self.assertNotEqual(cube.query(['fund_type'])['amount'].sum(), 0)
+      cube.query(['fund_category'])
+      self.assertEqual(list(cube.results), [(('fund_type',), ()), (('fund_category',), ())])
+      with self.assertRaises(ValueError):
+         cube.query(['department_name'])
+
+   def test_Cube_Of_A_Data_Directory(self):
+      directory = tempfile.mkdtemp()
+      try:
+         for name in self.dimensions:
+            shutil.copy(os.path.join('data', f'{name}.csv'), directory)
+         fact = pd.DataFrame({'transaction_id': [1, 2, 3], 'fiscal_year': [2022, 2023, 2023], 'program_id': [1, 1, 2], 'type_id': [1, 1, 1], 'fund_id': [1, 1, 1], 'finance_id': [1, 1, 2], 'amount': [10.10, 0.20, 1234567.89]})
+         fact.to_csv(os.path.join(directory, 'transaction.csv'), index=False)
+         cube = Cube.from_directory(directory)
+      finally:
+         shutil.rmtree(directory)
+
+      self.assertEqual(cube.fact['fiscal_year'].dtype, np.int16)
+      self.assertEqual(cube.fact['program_id'].dtype, np.int32)
+      self.assertEqual(cube.fact['amount'].tolist(), [1010, 20, 123456789])
+      result = cube.query(['fiscal_year'], where={'revenue_or_spending': 'Spending'})
+      self.assertEqual(result[['fiscal_year', 'amount', 'transactions']].values.tolist(), [[2022, 10.10, 1], [2023, 0.20, 1]])
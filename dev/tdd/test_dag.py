@@ -0,0 +1,48 @@
+import time
+import unittest
+
+from dag import run_dag, get_critical_path
+
+
+class TestDependencyGraph(unittest.TestCase):
+
+   def test_Independent_Tasks_Run_Concurrently(self):
+      tasks = {name: (lambda: time.sleep(0.2), []) for name in ['program', 'type', 'fund', 'finance']}
+      tasks['transaction'] = (lambda: time.sleep(0.2), list(tasks))
+
+      timings = run_dag(tasks, max_workers=4)
+
+      self.assertLess(max(end for _, end in timings.values()), 0.7)
+      for name in ['program', 'type', 'fund', 'finance']:
+         self.assertLessEqual(timings[name][1], timings['transaction'][0])
+
+   def test_Failed_Task_Skips_Its_Dependents(self):
+      ran = []
+      def fail():
+         raise RuntimeError('COPY failed')
+      tasks = {
+         'load_program': (fail, []),
+         'load_type': (lambda: ran.append('load_type'), []),
+         'load_transaction': (lambda: ran.append('load_transaction'), ['load_program', 'load_type'])
+      }
+
+      with self.assertRaises(RuntimeError):
+         run_dag(tasks, max_workers=2)
+      self.assertNotIn('load_transaction', ran)
+
+   def test_Cycle_Is_Rejected(self):
+      tasks = {'a': (lambda: None, ['b']), 'b': (lambda: None, ['a'])}
+      with self.assertRaises(ValueError):
+         run_dag(tasks, max_workers=2)
+
+   def test_Critical_Path_Follows_The_Slowest_Dependencies(self):
+      tasks = {
+         'security_group': (lambda: time.sleep(0.1), []),
+         'redshift_role': (lambda: time.sleep(0.3), []),
+         'sftp_server': (lambda: time.sleep(0.1), []),
+         'redshift_cluster': (lambda: time.sleep(0.1), ['security_group', 'redshift_role'])
+      }
+
+      timings = run_dag(tasks, max_workers=4)
+
+      self.assertEqual(get_critical_path(tasks, timings), ['redshift_role', 'redshift_cluster'])
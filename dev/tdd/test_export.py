@@ -0,0 +1,78 @@
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+from botocore.exceptions import ClientError
+from export import split_table, write_parquet
+from load_tables import parquet_object_exists
+
+
+class TestSplitTable(unittest.TestCase):
+
+   def setUp(self):
+      self.directory = tempfile.mkdtemp()
+      self.rows = [f'{row},{row % 23},{row % 7},{row * 1.5:.2f}\n' for row in range(400000)]
+      with open(os.path.join(self.directory, 'transaction.csv'), 'w') as file:
+         file.write('transaction_id,program_id,type_id,amount\n')
+         file.writelines(self.rows)
+
+   def tearDown(self):
+      shutil.rmtree(self.directory)
+
+   def test_Parts_Hold_Every_Row_Once_With_A_Header(self):
+      manifest_path = split_table(
+         name='transaction', source=self.directory, directory=self.directory,
+         parts=4, compression='gzip', bucket='test-bucket', max_workers=2
+      )
+      with open(manifest_path) as file:
+         entries = json.load(file)['entries']
+
+      self.assertEqual(len(entries), 4)
+      rows = []
+      for entry in entries:
+         self.assertTrue(entry['url'].startswith('s3://test-bucket/transaction.'))
+         with gzip.open(os.path.join(self.directory, entry['url'].split('/')[-1]), 'rt') as part:
+            self.assertEqual(part.readline(), 'transaction_id,program_id,type_id,amount\n')
+            rows.extend(part.readlines())
+      self.assertEqual(rows, self.rows)
+
+
+class TestWriteParquet(unittest.TestCase):
+
+   def setUp(self):
+      self.directory = tempfile.mkdtemp()
+      with open(os.path.join(self.directory, 'transaction.csv'), 'w') as file:
+         file.write('transaction_id,fiscal_year,program_id,type_id,fund_id,finance_id,amount\n')
+         file.write('1,2020,3,4,5,1,0.30000000000000004\n2,2021,3,4,5,2,-1234.5\n')
+
+   def tearDown(self):
+      shutil.rmtree(self.directory)
+
+   def test_Fact_Columns_Are_Typed(self):
+      import pyarrow as pa
+      import pyarrow.parquet as pq
+
+      table = pq.read_table(write_parquet('transaction', source=self.directory, directory=self.directory))
+
+      self.assertEqual(table.schema.field('program_id').type, pa.int32())
+      self.assertEqual(table.schema.field('amount').type, pa.decimal128(20, 2))
+      self.assertEqual([str(amount) for amount in table.column('amount').to_pylist()], ['0.30', '-1234.50'])
+
+class TestParquetObject(unittest.TestCase):
+
+   def head_object(self, code):
+      s3 = mock.Mock()
+      s3.head_object.side_effect = ClientError({'Error': {'Code': code, 'Message': code}}, 'HeadObject')
+      return mock.patch('load_tables.get_client', return_value=s3)
+
+   def test_Missing_Object_Falls_Back_To_CSV(self):
+      with self.head_object('404'):
+         self.assertFalse(parquet_object_exists('transaction'))
+
+   def test_Other_Errors_Are_Raised(self):
+      with self.head_object('AccessDenied'), self.assertRaises(ClientError):
+         parquet_object_exists('transaction')
@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib.util
+import pandas as pd
+
+from transform import HIERARCHIES, get_invalid_groups, read_raw_chunks, stream_transform
+
+# The generator is a benchmark tool, so load it by path
+spec = importlib.util.spec_from_file_location('generate_export', os.path.join(os.getcwd(), 'dev', 'bench', 'generate_export.py'))
+generate_export = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(generate_export)
+
+
+class TestSyntheticExport(unittest.TestCase):
+
+   @classmethod
+   def setUpClass(cls):
+      cls.directory = tempfile.mkdtemp()
+      cls.raw = os.path.join(cls.directory, 'raw.csv')
+      generate_export.generate_export(100000, output=cls.raw, chunksize=40000)
+
+   @classmethod
+   def tearDownClass(cls):
+      shutil.rmtree(cls.directory)
+
+   def test_Columns_Of_The_Raw_Export(self):
+      header = pd.read_csv(self.raw, nrows=0).columns.tolist()
+      self.assertEqual(header, list(generate_export.RAW_COLUMNS))
+
+   def test_Dirty_Cases_Are_Injected(self):
+      df = next(read_raw_chunks(self.raw, chunksize=200000))
+      self.assertEqual(len(df), 100000)
+      self.assertGreater(df['program'].isna().sum(), 0)
+      self.assertGreater(df['character'].isna().sum(), 0)
+      self.assertGreater((df['sub_object_code'] == 'NKEY').sum(), 0)
+      self.assertGreater(df['related_govt_units'].isin(['NO', 'YES']).sum(), 0)
+      self.assertTrue(any(get_invalid_groups(hierarchy, target, df.dropna()).any() for hierarchy, target in HIERARCHIES))
+
+   def test_Transform_Repairs_Every_Hierarchy(self):
+      output = os.path.join(self.directory, 'stage_transaction.csv')
+      stream_transform(self.raw, output=output, chunksize=30000)
+      df = pd.read_csv(output, dtype=str)
+      for hierarchy, target in HIERARCHIES:
+         self.assertFalse(get_invalid_groups(hierarchy, target, df).any(), target)
@@ -0,0 +1,51 @@
+import os
+import json
+import unittest
+import boto3
+import aws
+import iam_policies
+
+from unittest import mock
+from moto import mock_aws
+from iam_policies import forget_policy, get_policy_arn, get_policy_index
+
+
+account_id = '123456789012'
+document = json.dumps({
+   'Version': '2012-10-17',
+   'Statement': [{'Effect': 'Allow', 'Action': 's3:ListBucket', 'Resource': '*'}]
+})
+
+@mock_aws
+@mock.patch.dict(os.environ, {'AWS_DEFAULT_REGION': 'us-west-2'})
+class TestPolicyResolver(unittest.TestCase):
+
+   def setUp(self):
+      aws.reset()
+      iam_policies.policy_index = None
+      self.iam = boto3.client('iam')
+      # More customer managed policies than one page of list_policies
+      for number in range(250):
+         self.iam.create_policy(PolicyName=f'Policy-{number:03d}', PolicyDocument=document)
+      self.iam.create_policy(PolicyName='Policy-On-A-Path', Path='/service/', PolicyDocument=document)
+
+   def test_Policy_Is_Fetched_By_Its_ARN(self):
+      with mock.patch.object(iam_policies, 'get_policy_index') as get_policy_index:
+         policy_arn = get_policy_arn('Policy-249', account_id=account_id)
+      self.assertEqual(policy_arn, f'arn:aws:iam::{account_id}:policy/Policy-249')
+      get_policy_index.assert_not_called()
+
+   def test_Index_Covers_Every_Page(self):
+      index = get_policy_index()
+      self.assertEqual(len(index), 251)
+      self.assertEqual(get_policy_arn('Policy-On-A-Path', account_id=account_id), f'arn:aws:iam::{account_id}:policy/service/Policy-On-A-Path')
+
+   def test_Index_Is_Refreshed_For_A_New_Policy(self):
+      get_policy_index()
+      self.iam.create_policy(PolicyName='Newer-Policy', Path='/service/', PolicyDocument=document)
+      self.assertEqual(get_policy_arn('Newer-Policy', account_id=account_id), f'arn:aws:iam::{account_id}:policy/service/Newer-Policy')
+
+   def test_Missing_Policy_Resolves_To_None(self):
+      self.assertIsNone(get_policy_arn('Missing-Policy', account_id=account_id))
+      forget_policy('Policy-On-A-Path')
+      self.assertNotIn('Policy-On-A-Path', get_policy_index())
@@ -0,0 +1,107 @@
+import unittest
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import MetaData
+from load_tables import create_program_dimension, create_type_dimension
+from load_tables import create_fund_dimension, create_finance_dimension
+from load_tables import create_transaction_fact, create_load_state, create_data_version, create_summary_tables
+from load_tables import SUMMARIES_FINGERPRINT, TABLES, get_data_versions, get_load_state, merge_tables, rebuild_summaries
+
+
+def attach_schemas(dbapi_connection, connection_record):
+   # SQLite stands in for the warehouse with one database per schema
+   dbapi_connection.execute("ATTACH ':memory:' AS report")
+   dbapi_connection.execute("ATTACH ':memory:' AS stage")
+
+class TestIncrementalMerge(unittest.TestCase):
+
+   def setUp(self):
+      self.engine = create_engine('sqlite://', poolclass=StaticPool)
+      event.listen(self.engine, 'connect', attach_schemas)
+      self.report = MetaData(schema='report')
+      for create in [create_program_dimension, create_type_dimension, create_fund_dimension, create_finance_dimension, create_transaction_fact]:
+         create(schema=self.report, engine=self.engine)
+      create_load_state(schema=self.report, engine=self.engine)
+      create_data_version(schema=self.report, engine=self.engine)
+      create_summary_tables(schema=self.report, engine=self.engine)
+      self.fingerprints = {name: f'{name}-v2' for name in ['program', 'type', 'fund', 'finance', 'transaction']}
+      with self.engine.begin() as conn:
+         for table in self.report.sorted_tables:
+            if table.name not in TABLES:
+               continue
+            conn.execute(text(f'CREATE TABLE stage."{table.name}" AS SELECT * FROM report."{table.name}" WHERE 0;'))
+         for schema in ['report', 'stage']:
+            conn.execute(text(f"INSERT INTO {schema}.type VALUES (1, 'Court Fines', '425210', 'Fines', '425', 'Fines', '425');"))
+            conn.execute(text(f"INSERT INTO {schema}.fund VALUES (1, 'Operating', '1.0', 'General Fund', '1GAGF', 'General Fund', '1G');"))
+            conn.execute(text(f"INSERT INTO {schema}.finance VALUES (1, 'Spending'), (2, 'Revenue');"))
+         conn.execute(text("INSERT INTO report.program VALUES (1, 'Patrol', 'P', 'Police', 'POL', 'Public Protection', '1', 'No');"))
+         conn.execute(text(
+            "INSERT INTO report.\"transaction\" VALUES "
+            "(1, 2020, 1, 1, 1, 1, 10.00), (2, 2021, 1, 1, 1, 1, 20.00), (3, 2021, 1, 1, 1, 2, 30.00);"
+         ))
+         # The refresh renames program 1, adds program 2 and replaces fiscal year 2021
+         conn.execute(text(
+            "INSERT INTO stage.program VALUES "
+            "(1, 'Patrol Services', 'P', 'Police', 'POL', 'Public Protection', '1', 'No'), "
+            "(2, 'Investigations', 'I', 'Police', 'POL', 'Public Protection', '1', 'No');"
+         ))
+         conn.execute(text("INSERT INTO stage.\"transaction\" VALUES (1, 2021, 2, 1, 1, 1, 25.00);"))
+      rebuild_summaries(schema=self.report, engine=self.engine)
+
+   def summary(self):
+      return [tuple(row) for row in self.engine.execute(text(
+         "SELECT fiscal_year, organization_group, revenue_or_spending, amount, max_amount, transactions "
+         "FROM report.organization_group_summary ORDER BY fiscal_year, revenue_or_spending;"
+      ))]
+
+   def test_Only_Staged_Fiscal_Years_Are_Replaced(self):
+      fiscal_years = merge_tables(schema=self.report, stage='stage', engine=self.engine, fingerprints=self.fingerprints)
+
+      rows = self.engine.execute(text(
+         "SELECT transaction_id, fiscal_year, program_id, amount FROM report.\"transaction\" ORDER BY fiscal_year;"
+      )).fetchall()
+      self.assertEqual(fiscal_years, [2021])
+      self.assertEqual([tuple(row[1:]) for row in rows], [(2020, 1, 10), (2021, 2, 25)])
+      self.assertEqual(len({row[0] for row in rows}), 2)
+
+   def test_Changed_And_New_Dimension_Rows_Are_Merged(self):
+      merge_tables(schema=self.report, stage='stage', engine=self.engine, fingerprints=self.fingerprints)
+
+      programs = self.engine.execute(text("SELECT program_id, program FROM report.program ORDER BY program_id;")).fetchall()
+      self.assertEqual([tuple(row) for row in programs], [(1, 'Patrol Services'), (2, 'Investigations')])
+      self.assertEqual(self.engine.execute(text("SELECT COUNT(*) FROM report.finance;")).scalar(), 2)
+
+   def test_Fingerprints_Are_Recorded_With_The_Merge(self):
+      merge_tables(schema=self.report, stage='stage', engine=self.engine, fingerprints={'program': 'program-v2'})
+
+      self.assertEqual(get_load_state(schema='report', engine=self.engine), {'program': 'program-v2', 'summaries': SUMMARIES_FINGERPRINT})
+      # The fact was not fingerprinted, so its rows are left alone
+      self.assertEqual(self.engine.execute(text('SELECT COUNT(*) FROM report."transaction";')).scalar(), 3)
+
+   def test_Summaries_Of_The_Refreshed_Fiscal_Years_Are_Recomputed(self):
+      self.engine.execute(text("UPDATE stage.program SET program = 'Patrol' WHERE program_id = 1;"))
+      # A row the summaries were not rebuilt from, in a fiscal year the merge leaves alone
+      self.engine.execute(text("INSERT INTO report.\"transaction\" VALUES (4, 2020, 1, 1, 1, 1, 5.00);"))
+      merge_tables(schema=self.report, stage='stage', engine=self.engine, fingerprints=self.fingerprints)
+
+      self.assertEqual(self.summary(), [
+         (2020, 'Public Protection', 'Spending', 10, 10, 1),
+         (2021, 'Public Protection', 'Spending', 25, 25, 1)
+      ])
+
+   def test_Summaries_Are_Rebuilt_When_A_Dimension_Row_Changes(self):
+      self.engine.execute(text("UPDATE stage.program SET organization_group = 'Police Services' WHERE program_id = 1;"))
+      merge_tables(schema=self.report, stage='stage', engine=self.engine, fingerprints={'program': 'program-v2'})
+
+      self.assertEqual([row[:2] for row in self.summary()], [
+         (2020, 'Police Services'), (2021, 'Police Services'), (2021, 'Police Services')
+      ])
+
+   def test_Data_Versions_Of_The_Merged_Tables_Are_Bumped(self):
+      merge_tables(schema=self.report, stage='stage', engine=self.engine, fingerprints={'program': 'program-v2', 'transaction': 'transaction-v2'})
+
+      with self.engine.connect() as conn:
+         versions = get_data_versions(schema='report', conn=conn)
+      # The summaries were built once by setUp, and refreshed by the merge
+      self.assertEqual(versions, {'program': 1, 'transaction': 1, 'organization_group_summary': 2, 'fund_type_summary': 2, 'character_summary': 2})
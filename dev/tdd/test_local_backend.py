@@ -0,0 +1,149 @@
+import os
+import csv
+import io
+import shutil
+import tempfile
+import unittest
+import load_tables
+
+from unittest import mock
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import MetaData
+from export import split_table, write_parquet
+from load_tables import copy_local, get_reloads, get_source_fingerprint, load_table, reload_star_schema
+from load_tables import create_program_dimension, create_type_dimension, create_fund_dimension
+from load_tables import create_finance_dimension, create_transaction_fact, create_data_version
+
+
+class RecordingCursor:
+   # Stands in for the psycopg2 cursor of a local Postgres database
+   def __init__(self):
+      self.copies = []
+
+   def copy_expert(self, sql, file):
+      self.copies.append((sql, file.read().decode()))
+
+class TestLocalCopy(unittest.TestCase):
+
+   def setUp(self):
+      self.directory = tempfile.mkdtemp()
+      self.header = ['transaction_id', 'fiscal_year', 'program_id', 'type_id', 'fund_id', 'finance_id', 'amount']
+      self.rows = [[str(row), str(2000 + row % 20), str(row % 23), str(row % 7), '5', '1', f'{row * 1.25:.2f}'] for row in range(1, 300001)]
+      with open(os.path.join(self.directory, 'transaction.csv'), 'w', newline='') as file:
+         writer = csv.writer(file)
+         writer.writerow(self.header)
+         writer.writerows(self.rows)
+      self.cursor = RecordingCursor()
+      self.conn = mock.Mock()
+      self.conn.connection.cursor.return_value = self.cursor
+      self.patches = [mock.patch.object(load_tables, 'backend', 'postgres'), mock.patch.object(load_tables, 'local_directory', self.directory)]
+      for patch in self.patches:
+         patch.start()
+
+   def tearDown(self):
+      for patch in self.patches:
+         patch.stop()
+      shutil.rmtree(self.directory)
+
+   def copied_rows(self):
+      rows = []
+      for sql, data in self.cursor.copies:
+         self.assertEqual(sql, 'COPY report."transaction" FROM STDIN WITH (FORMAT csv, HEADER true);')
+         lines = list(csv.reader(io.StringIO(data)))
+         self.assertEqual(lines[0], self.header)
+         rows.extend(lines[1:])
+      return rows
+
+   def test_CSV_Is_Copied(self):
+      copy_local('transaction', table='report."transaction"', conn=self.conn)
+      self.assertEqual(self.copied_rows(), self.rows)
+
+   def test_Manifest_Parts_Are_Decompressed(self):
+      split_table('transaction', source=self.directory, directory=self.directory, parts=3, compression='gzip', bucket='test-bucket', max_workers=2)
+      os.remove(os.path.join(self.directory, 'transaction.csv'))
+      copy_local('transaction', table='report."transaction"', conn=self.conn, manifest=True)
+      self.assertEqual(len(self.cursor.copies), 3)
+      self.assertEqual(self.copied_rows(), self.rows)
+
+   def test_Parquet_Is_Copied_As_CSV(self):
+      write_parquet('transaction', source=self.directory, directory=self.directory)
+      copy_local('transaction', table='report."transaction"', conn=self.conn)
+      self.assertEqual(self.copied_rows(), self.rows)
+
+   def test_Fingerprint_Of_The_Local_Files(self):
+      fingerprint = get_source_fingerprint('transaction')
+      self.assertEqual(get_source_fingerprint('transaction'), fingerprint)
+      with open(os.path.join(self.directory, 'transaction.csv'), 'a') as file:
+         file.write('300001,2020,1,1,5,1,1.00\n')
+      self.assertNotEqual(get_source_fingerprint('transaction'), fingerprint)
+
+def enforce_foreign_keys(dbapi_connection, connection_record):
+   # Postgres enforces the foreign keys of the fact table, and so does SQLite with the pragma
+   dbapi_connection.execute("ATTACH ':memory:' AS report")
+   dbapi_connection.execute('PRAGMA foreign_keys=ON')
+
+class TestForeignKeys(unittest.TestCase):
+
+   ROWS = {
+      'program': "(1, 'Patrol', 'P', 'Police', 'POL', 'Public Protection', '1', 'No')",
+      'type': "(1, 'Court Fines', '425210', 'Fines', '425', 'Fines', '425')",
+      'fund': "(1, 'Operating', '1.0', 'General Fund', '1GAGF', 'General Fund', '1G')",
+      'finance': "(1, 'Spending')",
+      'transaction': "(1, 2021, 1, 1, 1, 1, 25.00)"
+   }
+
+   def setUp(self):
+      self.engine = create_engine('sqlite://', poolclass=StaticPool)
+      event.listen(self.engine, 'connect', enforce_foreign_keys)
+      report = MetaData(schema='report')
+      for create in [create_program_dimension, create_type_dimension, create_fund_dimension, create_finance_dimension, create_transaction_fact, create_data_version]:
+         create(schema=report, engine=self.engine)
+      with self.engine.begin() as conn:
+         for name, row in self.ROWS.items():
+            conn.execute(text(f'INSERT INTO report."{name}" VALUES {row};'))
+      self.patches = [
+         mock.patch.object(load_tables, 'backend', 'postgres'),
+         mock.patch.object(load_tables, 'copy_into', self.copy_into)
+      ]
+      for patch in self.patches:
+         patch.start()
+
+   def tearDown(self):
+      for patch in self.patches:
+         patch.stop()
+      self.engine.dispose()
+
+   def copy_into(self, name, table, conn, manifest=False, compression='none'):
+      # Stands in for the COPY of the reloaded files, which keep the ids of the dimensions
+      conn.execute(text(f'INSERT INTO {table} VALUES {self.ROWS[name]};'))
+
+   def test_Dimension_Cannot_Be_Replaced_Under_The_Fact(self):
+      with self.assertRaises(IntegrityError):
+         load_table('program', schema='report', engine=self.engine, replace=True)
+
+   def test_Fact_Is_Emptied_And_Reloaded_With_Its_Dimensions(self):
+      fingerprints = {name: f'{name}-v2' for name in self.ROWS}
+      reloads = get_reloads({'program': 'program-v2'}, fingerprints)
+      self.assertEqual(reloads, {'program': 'program-v2', 'transaction': 'transaction-v2'})
+
+      reload_star_schema({name: None for name in reloads}, schema='report', engine=self.engine)
+      with self.engine.connect() as conn:
+         self.assertEqual(conn.execute(text('SELECT COUNT(*) FROM report."transaction";')).scalar(), 1)
+         self.assertEqual(dict(conn.execute(text('SELECT table_name, version FROM report.data_version;')).fetchall()), {'program': 1, 'transaction': 1})
+
+   def test_Failed_Reload_Keeps_The_Fact(self):
+      def copy_into(name, table, conn, manifest=False, compression='none'):
+         if name == 'transaction':
+            raise OSError('transaction.csv is missing')
+         self.copy_into(name, table, conn)
+
+      with mock.patch.object(load_tables, 'copy_into', copy_into), self.assertRaises(OSError):
+         reload_star_schema({'program': None, 'transaction': None}, schema='report', engine=self.engine)
+      with self.engine.connect() as conn:
+         self.assertEqual(conn.execute(text('SELECT COUNT(*) FROM report."transaction";')).scalar(), 1)
+         self.assertEqual(conn.execute(text('SELECT COUNT(*) FROM report.data_version;')).scalar(), 0)
+
+   def test_Fact_Alone_Is_Reloaded_In_Place(self):
+      self.assertEqual(get_reloads({'transaction': 'transaction-v2'}, {}), {'transaction': 'transaction-v2'})
@@ -0,0 +1,58 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import parse_policy
+
+from concurrent.futures import ThreadPoolExecutor
+from parse_policy import get_S3_policy_document, get_trust_policy_document, get_ssh_key_content
+
+
+class TestPolicyTemplates(unittest.TestCase):
+
+   def setUp(self):
+      # Work from a project directory with the policies and a dummy key pair
+      self.project_dir = os.getcwd()
+      self.directory = tempfile.mkdtemp()
+      shutil.copytree(os.path.join(self.project_dir, 'policy'), os.path.join(self.directory, 'policy'))
+      os.mkdir(os.path.join(self.directory, 'ssh'))
+      for key_name, content in [('test_key', 'PRIVATE KEY'), ('test_key.pub', 'ssh-rsa AAAAB3NzaC1yc2E test'), ('keygen.sh', '')]:
+         with open(os.path.join(self.directory, 'ssh', key_name), 'w') as file:
+            file.write(content)
+      os.chdir(self.directory)
+
+   def tearDown(self):
+      os.chdir(self.project_dir)
+      shutil.rmtree(self.directory)
+
+   def test_Placeholders_Are_Substituted(self):
+      policy = json.loads(get_S3_policy_document('bucket-region-account_id', service='redshift'))
+      self.assertEqual(policy['Statement'][0]['Resource'], ['arn:aws:s3:::bucket-region-account_id/*', 'arn:aws:s3:::bucket-region-account_id'])
+
+      trust = json.loads(get_trust_policy_document(account_id='123456789012', region='us-west-2'))
+      condition = trust['Statement'][0]['Condition']
+      self.assertEqual(condition['StringEquals']['aws:SourceAccount'], '123456789012')
+      self.assertEqual(condition['ArnLike']['aws:SourceArn'], 'arn:aws:transfer:us-west-2:123456789012:user/*')
+
+   def test_Cached_Template_Is_Left_Untouched(self):
+      get_S3_policy_document('first-bucket', service='transfer')
+      policy = json.loads(get_S3_policy_document('second-bucket', service='transfer'))
+      self.assertEqual(policy['Statement'][1]['Resource'], 'arn:aws:s3:::second-bucket/*')
+
+   def test_SSH_Keys(self):
+      self.assertEqual(get_ssh_key_content(type='public'), 'ssh-rsa AAAAB3NzaC1yc2E test')
+      self.assertEqual(get_ssh_key_content(type='private'), 'PRIVATE KEY')
+
+   def test_Concurrent_Rendering_Reads_Each_File_Once(self):
+      parse_policy.load_template.cache_clear()
+      buckets = [f'bucket-{number}' for number in range(200)]
+      with ThreadPoolExecutor(max_workers=16) as executor:
+         documents = list(executor.map(lambda bucket: get_S3_policy_document(bucket, service='transfer'), buckets))
+         keys = list(executor.map(lambda _: get_ssh_key_content(type='public'), range(200)))
+
+      for bucket, document in zip(buckets, documents):
+         self.assertEqual(json.loads(document)['Statement'][0]['Resource'], [f'arn:aws:s3:::{bucket}'])
+      self.assertEqual(set(keys), {'ssh-rsa AAAAB3NzaC1yc2E test'})
+      self.assertEqual(os.getcwd(), os.path.realpath(self.directory))
+      self.assertEqual(parse_policy.load_template.cache_info().currsize, 1)
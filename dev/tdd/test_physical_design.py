@@ -0,0 +1,55 @@
+import unittest
+
+from sqlalchemy.engine import create_mock_engine
+from sqlalchemy.schema import MetaData
+from load_tables import DIMENSIONS, create_program_dimension, create_type_dimension
+from load_tables import create_fund_dimension, create_finance_dimension, create_transaction_fact
+from physical_design import design_table, get_ddl, profile_tables
+
+
+class TestPhysicalDesign(unittest.TestCase):
+
+   @classmethod
+   def setUpClass(cls):
+      cls.profiles = profile_tables(DIMENSIONS, directory='data')
+
+   def setUp(self):
+      # The tables are only defined, a mock engine executes nothing
+      engine = create_mock_engine('sqlite://', lambda *args, **kwargs: None)
+      self.report = MetaData(schema='report')
+      for create in [create_program_dimension, create_type_dimension, create_fund_dimension, create_finance_dimension, create_transaction_fact]:
+         create(schema=self.report, engine=engine)
+
+   def design(self, name, **kwargs):
+      return design_table(self.report.tables[f'report.{name}'], self.profiles, **kwargs)
+
+   def test_Small_Dimensions_Are_Copied_To_Every_Node(self):
+      for name in DIMENSIONS:
+         self.assertEqual(self.design(name)['diststyle'], 'ALL')
+      transaction = self.design('transaction')
+      self.assertEqual((transaction['diststyle'], transaction['distkey']), ('EVEN', None))
+      self.assertEqual(transaction['sortkey'], ['fiscal_year'])
+
+   def test_Fact_Is_Collocated_With_The_Largest_Dimension_Distributed_On_Its_Key(self):
+      # program (1571 rows) and type (4458 rows) are too large to copy
+      self.assertEqual(self.design('program', all_max_rows=1000)['distkey'], 'program_id')
+      self.assertEqual(self.design('fund', all_max_rows=1000)['diststyle'], 'ALL')
+      transaction = self.design('transaction', all_max_rows=1000)
+      self.assertEqual((transaction['diststyle'], transaction['distkey']), ('KEY', 'type_id'))
+
+   def test_Columns_Are_Encoded_After_Their_Type_And_Distinct_Values(self):
+      encode = self.design('program')['encode']
+      self.assertEqual(encode['program_id'], 'raw')
+      self.assertEqual(encode['organization_group'], 'bytedict')
+      self.assertEqual(encode['program'], 'zstd')
+      encode = self.design('transaction')['encode']
+      self.assertEqual(encode['fiscal_year'], 'raw')
+      self.assertEqual({encode[column] for column in ['transaction_id', 'program_id', 'amount']}, {'az64'})
+
+   def test_Generated_DDL(self):
+      ddl = get_ddl(self.profiles)
+
+      self.assertIn('DISTSTYLE ALL SORTKEY (program_id);', ddl)
+      self.assertIn('DISTSTYLE EVEN SORTKEY (fiscal_year);', ddl)
+      self.assertIn('organization_group VARCHAR(100) ENCODE bytedict NOT NULL', ddl)
+      self.assertEqual(ddl.count('CREATE TABLE'), 8)
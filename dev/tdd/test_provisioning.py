@@ -0,0 +1,170 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import importlib.util
+import boto3
+import botocore.client
+
+from unittest import mock
+from moto import mock_aws
+import aws
+import clean_up
+import iam_policies
+import load_tables
+import state
+
+# dev/tdd keeps its own prototype of infrastructures.py, so load the project's module by path
+spec = importlib.util.spec_from_file_location('project_infrastructures', os.path.join(os.getcwd(), 'infrastructures.py'))
+infrastructures = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(infrastructures)
+
+
+region = 'us-west-2'
+bucket_name = 'test-sftp-1290'
+settings = {
+   'account_id': '123456789012',
+   'region': region,
+   'bucket_name': bucket_name,
+   'transfer_s3_policy': f'TransferFamilyListGetDeletePutS3Bucket-{bucket_name}',
+   'redshift_s3_policy': f'RedshiftListGetCreateDeletePutAbortS3Bucket-{bucket_name}',
+   'sftp_server_username': 'sftp-user',
+   'redshift_db_username': 'awsuser',
+   'redshift_db_password': 'Knpweoak3fu2p'
+}
+
+@mock_aws(config={'iam': {'load_aws_managed_policies': True}})
+@mock.patch.dict(os.environ, {'AWS_DEFAULT_REGION': region})
+class TestProvisioningGraph(unittest.TestCase):
+
+   def setUp(self):
+      # Work from a project directory with the policies and a dummy key pair
+      self.project_dir = os.getcwd()
+      self.directory = tempfile.mkdtemp()
+      shutil.copytree(os.path.join(self.project_dir, 'policy'), os.path.join(self.directory, 'policy'))
+      os.mkdir(os.path.join(self.directory, 'ssh'))
+      for key_name, content in [('test_key', 'PRIVATE KEY'), ('test_key.pub', 'ssh-rsa AAAAB3NzaC1yc2E test')]:
+         with open(os.path.join(self.directory, 'ssh', key_name), 'w') as file:
+            file.write(content)
+      os.chdir(self.directory)
+      aws.reset()
+      self.patches = [mock.patch.object(infrastructures, name, value) for name, value in settings.items()]
+      self.patches += [mock.patch.object(clean_up, name, settings[name]) for name in ['account_id', 'bucket_name', 'transfer_s3_policy', 'redshift_s3_policy']]
+      self.patches.append(mock.patch.object(iam_policies, 'policy_index', None))
+      for patch in self.patches:
+         patch.start()
+
+   def tearDown(self):
+      for patch in self.patches:
+         patch.stop()
+      os.chdir(self.project_dir)
+      shutil.rmtree(self.directory)
+
+   def test_Every_Resource_Is_Provisioned(self):
+      infrastructures.main()
+
+      buckets = [bucket['Name'] for bucket in boto3.client('s3').list_buckets()['Buckets']]
+      self.assertIn(bucket_name, buckets)
+      servers = boto3.client('transfer').list_servers()['Servers']
+      user = boto3.client('transfer').describe_user(ServerId=servers[0]['ServerId'], UserName='sftp-user')['User']
+      self.assertEqual(user['HomeDirectory'], f'/{bucket_name}')
+      cluster = boto3.client('redshift').describe_clusters(ClusterIdentifier=infrastructures.redshift_cluster)['Clusters'][0]
+      self.assertEqual(cluster['IamRoles'][0]['IamRoleArn'], f'arn:aws:iam::123456789012:role/{infrastructures.redshift_role}')
+      attached = boto3.client('iam').list_attached_role_policies(RoleName=infrastructures.transfer_role)['AttachedPolicies']
+      self.assertEqual(len(attached), 4)
+
+   def test_Every_Resource_Is_Torn_Down(self):
+      infrastructures.main()
+      with mock.patch.object(clean_up, 'print_timings') as print_timings:
+         clean_up.main()
+      timings = print_timings.call_args.args[0]
+      # The security group and the Redshift role wait for the cluster, the rest does not
+      self.assertGreaterEqual(timings['security_group'][0], timings['redshift_cluster'][1])
+      self.assertGreaterEqual(timings['redshift_role'][0], timings['redshift_cluster'][1])
+      self.assertLess(timings['sftp_servers'][0], timings['redshift_cluster'][1])
+
+      self.assertEqual(boto3.client('s3').list_buckets()['Buckets'], [])
+      self.assertEqual(boto3.client('transfer').list_servers()['Servers'], [])
+      self.assertEqual(boto3.client('redshift').describe_clusters()['Clusters'], [])
+      roles = [role['RoleName'] for role in boto3.client('iam').list_roles()['Roles']]
+      self.assertNotIn(infrastructures.transfer_role, roles)
+      self.assertNotIn(infrastructures.redshift_role, roles)
+      self.assertEqual(boto3.client('iam').list_policies(Scope='Local')['Policies'], [])
+
+   def test_Rerun_Reuses_The_Recorded_Resources(self):
+      infrastructures.main()
+      recorded = state.read_state()
+      self.assertEqual(recorded['bucket:test-sftp-1290'], bucket_name)
+      self.assertEqual(recorded[f'role:{infrastructures.redshift_role}'], f'arn:aws:iam::123456789012:role/{infrastructures.redshift_role}')
+
+      operations = []
+      make_api_call = botocore.client.BaseClient._make_api_call
+      def recorded_call(client, operation, params):
+         operations.append(operation)
+         return make_api_call(client, operation, params)
+      with mock.patch.object(botocore.client.BaseClient, '_make_api_call', recorded_call):
+         infrastructures.main()
+      # Only targeted GETs and the waiters, no create attempts or listings
+      self.assertEqual([operation for operation in operations if operation.startswith(('Create', 'List'))], [])
+      self.assertEqual(state.read_state(), recorded)
+
+   def test_Stale_Record_Is_Replaced(self):
+      infrastructures.main()
+      security_group = state.get_state(f'security_group:{infrastructures.security_group_name}')
+      state.record_state(f'security_group:{infrastructures.security_group_name}', 'sg-0123456789abcdef0')
+
+      infrastructures.main()
+      self.assertEqual(state.get_state(f'security_group:{infrastructures.security_group_name}'), security_group)
+
+   def test_Stale_Server_Record_Falls_Back_To_The_Listing(self):
+      infrastructures.main()
+      state.record_state('sftp_server', 's-0123456789abcdef0')
+
+      with mock.patch.object(clean_up, 'print_timings'):
+         clean_up.main()
+      self.assertEqual(boto3.client('transfer').list_servers()['Servers'], [])
+      self.assertIsNone(state.get_state('sftp_server'))
+
+   def test_Stale_Role_And_Policy_Records_Are_Forgotten(self):
+      infrastructures.main()
+      # Records of a role and a policy deleted outside the tool
+      state.record_state('role:DeletedRole', 'arn:aws:iam::123456789012:role/DeletedRole')
+      state.record_state('policy:DeletedPolicy', 'arn:aws:iam::123456789012:policy/DeletedPolicy')
+      # A policy recorded under a stale ARN but still present under another path
+      iam = boto3.client('iam')
+      iam.create_policy(PolicyName='MovedPolicy', Path='/moved/', PolicyDocument=json.dumps({'Version': '2012-10-17', 'Statement': [{'Effect': 'Allow', 'Action': 's3:ListBucket', 'Resource': '*'}]}))
+      state.record_state('policy:MovedPolicy', 'arn:aws:iam::123456789012:policy/MovedPolicy')
+
+      clean_up.delete_iam_role(name='DeletedRole')
+      clean_up.delete_s3_policy(name='DeletedPolicy')
+      clean_up.delete_s3_policy(name='MovedPolicy')
+      for key in ['role:DeletedRole', 'policy:DeletedPolicy', 'policy:MovedPolicy']:
+         self.assertIsNone(state.get_state(key))
+      self.assertEqual([policy['PolicyName'] for policy in iam.list_policies(Scope='Local')['Policies'] if policy['PolicyName'] == 'MovedPolicy'], [])
+
+      with mock.patch.object(clean_up, 'print_timings'):
+         clean_up.main()
+      self.assertEqual(state.read_state(), {})
+
+   def test_Stale_Endpoint_Is_Looked_Up_Again(self):
+      infrastructures.main()
+      endpoint = state.get_state(f'redshift_cluster:{infrastructures.redshift_cluster}')
+      # The endpoint of a cluster that was since recreated
+      state.record_state(f'redshift_cluster:{infrastructures.redshift_cluster}', 'stale.redshift.amazonaws.com')
+
+      with mock.patch.object(load_tables, 'create_engine') as create_engine:
+         load_tables.redshift_connection(cluster=infrastructures.redshift_cluster, db_name='dev', username='awsuser', password='secret')
+      self.assertEqual(create_engine.call_args.kwargs['url'].host, endpoint)
+      self.assertEqual(state.get_state(f'redshift_cluster:{infrastructures.redshift_cluster}'), endpoint)
+
+   def test_Load_And_Teardown_Reuse_The_State(self):
+      infrastructures.main()
+      endpoint = state.get_state(f'redshift_cluster:{infrastructures.redshift_cluster}')
+      with mock.patch.object(load_tables, 'create_engine') as create_engine:
+         load_tables.redshift_connection(cluster=infrastructures.redshift_cluster, db_name='dev', username='awsuser', password='secret')
+      self.assertEqual(create_engine.call_args.kwargs['url'].host, endpoint)
+
+      with mock.patch.object(clean_up, 'print_timings'):
+         clean_up.main()
+      self.assertEqual(state.read_state(), {})
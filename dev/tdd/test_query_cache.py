@@ -0,0 +1,105 @@
+import unittest
+import load_tables
+
+from unittest import mock
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import MetaData
+from load_tables import create_program_dimension, create_fund_dimension, create_data_version
+from load_tables import bump_data_version, load_table
+from query_cache import QueryCache, get_data_stamp, normalize_sql
+
+
+def attach_schemas(dbapi_connection, connection_record):
+   # SQLite stands in for the warehouse with one database per schema
+   dbapi_connection.execute("ATTACH ':memory:' AS report")
+
+PROGRAMS = "SELECT organization_group, COUNT(*) AS programs FROM report.program GROUP BY organization_group;"
+FUNDS = "SELECT fund_type, COUNT(*) AS funds FROM report.fund WHERE fund_type <> :excluded GROUP BY fund_type;"
+
+class TestQueryCache(unittest.TestCase):
+
+   def setUp(self):
+      self.engine = create_engine('sqlite://', poolclass=StaticPool)
+      event.listen(self.engine, 'connect', attach_schemas)
+      report = MetaData(schema='report')
+      create_program_dimension(schema=report, engine=self.engine)
+      create_fund_dimension(schema=report, engine=self.engine)
+      create_data_version(schema=report, engine=self.engine)
+      with self.engine.begin() as conn:
+         conn.execute(text("INSERT INTO report.program VALUES (1, 'Patrol', 'P', 'Police', 'POL', 'Public Protection', '1', 'No');"))
+         conn.execute(text("INSERT INTO report.fund VALUES (1, 'Operating', '1.0', 'General Fund', '1GAGF', 'General Fund', '1G');"))
+         bump_data_version(['program', 'fund'], schema='report', conn=conn)
+      self.executed = []
+      event.listen(self.engine, 'before_cursor_execute', self.record)
+      self.cache = QueryCache(self.engine, version_check=0)
+
+   def record(self, conn, cursor, statement, parameters, context, executemany):
+      if 'data_version' not in statement:
+         self.executed.append(statement)
+
+   def test_Normalized_SQL(self):
+      self.assertEqual(
+         normalize_sql("SELECT  fund_type -- per type\n FROM report.fund  WHERE fund = 'General  Fund' ;"),
+         "select fund_type from report.fund where fund = 'General  Fund'"
+      )
+      self.assertEqual(normalize_sql('select * from report."transaction"'), normalize_sql('SELECT *\nFROM   report."transaction";'))
+      self.assertNotEqual(normalize_sql("select 'A'"), normalize_sql("select 'a'"))
+
+   def test_Repeated_Queries_Are_Served_From_The_Cache(self):
+      first = self.cache.query(PROGRAMS)
+      second = self.cache.query(PROGRAMS.lower().replace(' ', '  '))
+
+      self.assertEqual(second.values.tolist(), [['Public Protection', 1]])
+      self.assertEqual(first.values.tolist(), second.values.tolist())
+      self.assertEqual(len(self.executed), 1)
+      self.cache.query(FUNDS, {'excluded': 'Other'})
+      self.cache.query(FUNDS, {'excluded': 'General Fund'})
+      self.assertEqual(len(self.executed), 3)
+      self.assertEqual((self.cache.hits, self.cache.misses), (1, 3))
+
+   def test_A_Load_Invalidates_Only_The_Results_Of_Its_Table(self):
+      self.cache.query(PROGRAMS)
+      self.cache.query(FUNDS, {'excluded': 'Other'})
+
+      def copy_into(name, table, conn, manifest=False, compression='none'):
+         conn.execute(text(f"INSERT INTO {table} VALUES (2, 'Investigations', 'I', 'Police', 'POL', 'Public Protection', '1', 'No');"))
+      with mock.patch.object(load_tables, 'copy_into', copy_into):
+         load_table('program', schema='report', engine=self.engine)
+
+      self.assertEqual(self.cache.query(PROGRAMS).values.tolist(), [['Public Protection', 2]])
+      self.cache.query(FUNDS, {'excluded': 'Other'})
+      self.assertEqual(len([statement for statement in self.executed if 'report.program' in statement and statement.startswith('SELECT')]), 2)
+      self.assertEqual(len([statement for statement in self.executed if 'report.fund' in statement]), 1)
+
+   def test_Results_Expire_And_Are_Evicted(self):
+      cache = QueryCache(self.engine, max_size=1, ttl=60, version_check=0)
+      cache.query(PROGRAMS)
+      cache.query(FUNDS, {'excluded': 'Other'})
+      cache.query(PROGRAMS)
+      self.assertEqual(cache.misses, 3)
+
+      cache = QueryCache(self.engine, ttl=0, version_check=0)
+      cache.query(PROGRAMS)
+      cache.query(PROGRAMS)
+      self.assertEqual(cache.misses, 2)
+
+   def test_Queries_Of_Unknown_Tables_Depend_On_Every_Table(self):
+      versions = {'program': 3, 'fund': 1}
+      self.assertEqual(get_data_stamp(normalize_sql(PROGRAMS), versions), (('program', 3),))
+      sql = normalize_sql("WITH groups AS (SELECT organization_group FROM report.program) SELECT * FROM groups")
+      self.assertEqual(get_data_stamp(sql, versions), (('fund', 1), ('program', 3)))
+
+   def test_Comma_Joins_Depend_On_Every_Table(self):
+      versions = {'program': 3, 'fund': 1}
+      sql = normalize_sql("SELECT COUNT(*) FROM report.fund f, report.program p WHERE f.fund_id = p.program_id")
+      self.assertEqual(get_data_stamp(sql, versions), (('fund', 1), ('program', 3)))
+      sql = normalize_sql("SELECT fund, 'a, b' FROM report.fund JOIN report.program ON fund_id = program_id")
+      self.assertEqual(get_data_stamp(sql, versions), (('fund', 1), ('program', 3)))
+
+      joined = "SELECT COUNT(*) AS pairs FROM report.fund f, report.program p;"
+      self.assertEqual(self.cache.query(joined).values.tolist(), [[1]])
+      with self.engine.begin() as conn:
+         conn.execute(text("INSERT INTO report.program VALUES (2, 'Investigations', 'I', 'Police', 'POL', 'Public Protection', '1', 'No');"))
+         bump_data_version(['program'], schema='report', conn=conn)
+      self.assertEqual(self.cache.query(joined).values.tolist(), [[2]])
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import unittest
+import paramiko
+
+from sftp_stub import serve
+from sftp_upload import upload_files
+
+
+class TestSFTPUpload(unittest.TestCase):
+
+   @classmethod
+   def setUpClass(cls):
+      cls.key = paramiko.RSAKey.generate(2048)
+
+   def setUp(self):
+      self.directory = tempfile.mkdtemp()
+      self.bucket = os.path.join(self.directory, 'bucket')
+      os.mkdir(self.bucket)
+      self.port, self.stop = serve(self.bucket, host_key=self.key)
+      self.paths = []
+      for name, size in [('transaction.csv', 3 * 1024 * 1024 + 17), ('program.csv', 70000), ('type.csv', 250000), ('fund.csv', 0)]:
+         path = os.path.join(self.directory, name)
+         with open(path, 'wb') as file:
+            file.write(os.urandom(size))
+         self.paths.append(path)
+
+   def tearDown(self):
+      self.stop()
+      shutil.rmtree(self.directory)
+
+   def upload(self, **kwargs):
+      return upload_files(self.paths, host='127.0.0.1', port=self.port, username='sftp-user', key=self.key, **kwargs)
+
+   def assertUploaded(self):
+      for path in self.paths:
+         with open(path, 'rb') as local, open(os.path.join(self.bucket, os.path.basename(path)), 'rb') as remote:
+            self.assertEqual(local.read(), remote.read())
+
+   def test_Files_Are_Uploaded_Over_Several_Sessions(self):
+      sent = self.upload(max_sessions=3, buffer_size=64 * 1024)
+      self.assertEqual(sent['transaction.csv'], 3 * 1024 * 1024 + 17)
+      self.assertUploaded()
+
+   def test_Partial_File_Is_Resumed(self):
+      with open(self.paths[0], 'rb') as local, open(os.path.join(self.bucket, 'transaction.csv'), 'wb') as partial:
+         partial.write(local.read(1024 * 1024))
+      sent = self.upload(max_sessions=2)
+      self.assertEqual(sent['transaction.csv'], 2 * 1024 * 1024 + 17)
+      self.assertUploaded()
+      # Nothing is sent again once every file is complete
+      self.assertEqual(set(self.upload().values()), {0})
+
+   def test_Unknown_Host_Key_Is_Rejected(self):
+      with self.assertRaises(paramiko.SSHException):
+         upload_files(self.paths, host='127.0.0.1', port=self.port, username='sftp-user', key=paramiko.RSAKey.generate(1024))
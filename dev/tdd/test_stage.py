@@ -0,0 +1,199 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+from sqlalchemy import Column, MetaData, Table, create_engine, event
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.types import BigInteger, Float, Text
+from contextlib import contextmanager
+from stage import TRANSACTION_TYPES, get_column_types, read_stage, write_stage
+from transform import normalize_columns, stream_transform, stream_transform_chunks, to_output, transform_chunks
+
+
+def attach_stage(dbapi_connection, connection_record):
+   # SQLite stands in for the local Postgres database with one database per schema
+   dbapi_connection.execute("ATTACH ':memory:' AS stage")
+
+class RecordingCopy:
+   # Stands in for the COPY FROM STDIN of a psycopg cursor
+   def __init__(self, statements):
+      self.statements = statements
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, *args):
+      pass
+
+   def write(self, data):
+      self.statements.append(('write', data))
+
+class RecordingConnection:
+   # Stands in for a psycopg connection to the local Postgres database
+   def __init__(self):
+      self.statements = []
+
+   @contextmanager
+   def transaction(self):
+      self.statements.append('BEGIN')
+      try:
+         yield
+      except Exception:
+         self.statements.append('ROLLBACK')
+         raise
+      self.statements.append('COMMIT')
+
+   @contextmanager
+   def cursor(self):
+      yield self
+
+   def execute(self, sql):
+      self.statements.append(sql)
+
+   def copy(self, sql):
+      self.statements.append(sql)
+      return RecordingCopy(self.statements)
+
+class TestReadStage(unittest.TestCase):
+
+   def setUp(self):
+      self.directory = tempfile.mkdtemp()
+      self.raw = os.path.join(self.directory, 'Spending_and_Revenue.csv')
+      rng = np.random.default_rng(0)
+      rows = 1000
+      department = rng.integers(0, 5, rows)
+      pd.DataFrame({
+         'Fiscal Year': rng.integers(2000, 2023, rows),
+         'Related Govt Units': rng.choice(['No', 'NO', 'YES'], rows),
+         'Organization Group Code': 1,
+         'Organization Group': 'Public Protection',
+         'Department Code': [f'D{code}' for code in department + 5 * (rng.random(rows) < 0.1)],
+         'Department': [f'Department {code}' for code in department],
+         'Program Code': np.where(rng.random(rows) < 0.05, None, 'P'),
+         'Program': np.where(rng.random(rows) < 0.05, None, 'Program'),
+         'Character Code': 'C',
+         'Character': 'Character',
+         'Object Code': 'O',
+         'Object': 'Object',
+         'Sub-object Code': 'NKEY',
+         'Sub-object': None,
+         'Fund Type Code': 'F',
+         'Fund Type': 'Fund Type',
+         'Fund Code': 'F',
+         'Fund': 'Fund',
+         'Fund Category Code': np.where(rng.random(rows) < 0.05, np.nan, 1.0),
+         'Fund Category': 'Operating',
+         'Revenue or Spending': rng.choice(['Revenue', 'Spending'], rows),
+         'Amount': rng.normal(0, 1000, rows).round(2)
+      }).to_csv(self.raw, index=False)
+
+      # The table DataFrame.to_sql creates from the export in dev/eda.ipynb
+      df = normalize_columns(pd.read_csv(self.raw))
+      self.engine = create_engine('sqlite://', poolclass=StaticPool)
+      event.listen(self.engine, 'connect', attach_stage)
+      columns = [Column('index', BigInteger)] + [
+         Column(col, {'i': BigInteger, 'f': Float}.get(df[col].dtype.kind, Text)) for col in df.columns
+      ]
+      table = Table('transaction', MetaData(schema='stage'), *columns)
+      table.create(self.engine)
+      records = df.astype(object).where(df.notna(), None).reset_index().to_dict('records')
+      with self.engine.begin() as conn:
+         conn.execute(table.insert(), records)
+
+   def tearDown(self):
+      self.engine.dispose()
+      shutil.rmtree(self.directory)
+
+   def test_Chunks_Of_Fetch_Size_With_Compact_Types(self):
+      chunks = list(read_stage('transaction', engine=self.engine, schema='stage', fetch_size=300))
+
+      self.assertEqual([len(chunk) for chunk in chunks], [300, 300, 300, 100])
+      chunk = chunks[0]
+      self.assertNotIn('index', chunk.columns)
+      self.assertEqual(chunk['fiscal_year'].dtype, np.int16)
+      self.assertEqual(chunk['amount'].dtype, np.int64)
+      for col in ['department', 'program', 'organization_group_code']:
+         self.assertIsInstance(chunk[col].dtype, pd.CategoricalDtype)
+
+   def test_Selected_Columns(self):
+      chunk = next(read_stage('transaction', engine=self.engine, schema='stage', columns=['fiscal_year', 'amount', 'department']))
+      self.assertEqual(chunk.columns.tolist(), ['fiscal_year', 'amount', 'department'])
+
+   def test_Streaming_From_Stage_Matches_The_Export(self):
+      staged = os.path.join(self.directory, 'staged.csv')
+      exported = os.path.join(self.directory, 'exported.csv')
+      rows = stream_transform_chunks(
+         lambda: read_stage('transaction', engine=self.engine, schema='stage', fetch_size=128), output=staged
+      )
+
+      self.assertEqual(rows, stream_transform(self.raw, output=exported, chunksize=128))
+      pd.testing.assert_frame_equal(pd.read_csv(staged), pd.read_csv(exported))
+
+   def test_Transformed_Chunks_Are_Copied_Back(self):
+      conn = RecordingConnection()
+      transformed = transform_chunks(lambda: read_stage('transaction', engine=self.engine, schema='stage', fetch_size=300))
+      rows = write_stage((to_output(chunk) for chunk in transformed), 'transaction_clean', conn=conn, schema='stage', types=TRANSACTION_TYPES)
+
+      data = ''.join(statement[1] for statement in conn.statements if isinstance(statement, tuple))
+      copied = pd.read_csv(io.StringIO(data), header=None)
+      self.assertEqual(rows, 1000)
+      self.assertEqual(len(copied), 1000)
+      self.assertIn('"fund_category_code" text', conn.statements[3])
+      # The raw stage is kept for another run of the transform
+      self.assertNotIn('DROP TABLE IF EXISTS stage."transaction";', conn.statements)
+
+class TestWriteStage(unittest.TestCase):
+
+   def setUp(self):
+      self.conn = RecordingConnection()
+      self.chunks = [
+         pd.DataFrame({
+            'fiscal_year': np.array([2020, 2021], dtype=np.int16),
+            'department': pd.Categorical(['Police', None]),
+            'amount': [10.5, -3.25]
+         }),
+         pd.DataFrame({
+            'fiscal_year': np.array([2022], dtype=np.int16),
+            'department': pd.Categorical(['Fire']),
+            'amount': [7.0]
+         })
+      ]
+
+   def test_Column_Types(self):
+      self.assertEqual(get_column_types(self.chunks[0]), {'fiscal_year': 'smallint', 'department': 'text', 'amount': 'double precision'})
+      self.assertEqual(get_column_types(self.chunks[0], types={'amount': 'numeric(20,2)'})['amount'], 'numeric(20,2)')
+
+   def test_New_Table_Is_Copied_And_Swapped_In_One_Transaction(self):
+      rows = write_stage(iter(self.chunks), 'transaction', conn=self.conn, schema='stage', types={'amount': 'numeric(20,2)'})
+
+      self.assertEqual(rows, 3)
+      self.assertEqual(self.conn.statements, [
+         'BEGIN',
+         'CREATE SCHEMA IF NOT EXISTS stage;',
+         'DROP TABLE IF EXISTS stage."transaction_new";',
+         'CREATE TABLE stage."transaction_new" ("fiscal_year" smallint, "department" text, "amount" numeric(20,2));',
+         'COPY stage."transaction_new" ("fiscal_year", "department", "amount") FROM STDIN WITH (FORMAT csv);',
+         ('write', '2020,Police,10.5\n2021,,-3.25\n'),
+         ('write', '2022,Fire,7.0\n'),
+         'DROP TABLE IF EXISTS stage."transaction";',
+         'ALTER TABLE stage."transaction_new" RENAME TO "transaction";',
+         'COMMIT'
+      ])
+
+   def test_Failed_Copy_Keeps_The_Table(self):
+      def chunks():
+         yield self.chunks[0]
+         raise ValueError('bad chunk')
+
+      with self.assertRaises(ValueError):
+         write_stage(chunks(), 'transaction', conn=self.conn, schema='stage')
+      self.assertEqual(self.conn.statements[-1], 'ROLLBACK')
+      self.assertNotIn('DROP TABLE IF EXISTS stage."transaction";', self.conn.statements)
+
+   def test_Nothing_Is_Written_Without_Chunks(self):
+      self.assertEqual(write_stage(iter([]), 'transaction', conn=self.conn, schema='stage'), 0)
+      self.assertEqual(self.conn.statements, [])
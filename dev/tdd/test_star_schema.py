@@ -0,0 +1,54 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from star_schema import DIMENSIONS, NULL_VALUES, build_star_schema
+
+
+class TestStarSchema(unittest.TestCase):
+
+   def setUp(self):
+      rng = np.random.default_rng(0)
+      rows = 2000
+      self.df = pd.DataFrame({
+         attribute: [f'{attribute} {value}' for value in rng.integers(0, 4, rows)]
+         for attributes in DIMENSIONS.values() for attribute in attributes
+      })
+      self.df['fiscal_year'] = rng.integers(2000, 2023, rows)
+      self.df['amount'] = rng.normal(0, 1000, rows).round(2)
+      self.partitions = [self.df.iloc[start:start + 300] for start in range(0, rows, 300)]
+
+   def test_Fact_Rows_Are_Keyed_To_Their_Attributes(self):
+      dimensions, transaction = build_star_schema(self.partitions, max_workers=2)
+
+      self.assertEqual(list(transaction['transaction_id']), list(range(1, len(self.df) + 1)))
+      for name, attributes in DIMENSIONS.items():
+         dimension = dimensions[name].set_index(f'{name}_id')
+         keyed = dimension.loc[transaction[f'{name}_id'], attributes].reset_index(drop=True)
+         pd.testing.assert_frame_equal(keyed, self.df[attributes].reset_index(drop=True))
+         # One surrogate id per distinct combination of attributes
+         self.assertFalse(dimensions[name][attributes].duplicated().any())
+
+   def test_Existing_Surrogate_Ids_Are_Kept(self):
+      dimensions, _ = build_star_schema(self.partitions[:1], max_workers=1)
+      existing = {name: dimension.iloc[::-1] for name, dimension in dimensions.items()}
+
+      rebuilt, _ = build_star_schema(self.partitions, existing=existing, max_workers=2)
+
+      for name, dimension in dimensions.items():
+         pd.testing.assert_frame_equal(rebuilt[name].iloc[:len(dimension)], dimension)
+
+   def test_Transactions_With_Null_Attributes_Are_Kept(self):
+      self.df.loc[::7, 'sub_object'] = None
+      self.df.loc[::11, 'character_code'] = np.nan
+      partitions = [self.df.iloc[start:start + 300] for start in range(0, len(self.df), 300)]
+
+      dimensions, transaction = build_star_schema(partitions, max_workers=2)
+
+      self.assertEqual(len(transaction), len(self.df))
+      self.assertAlmostEqual(transaction['amount'].sum(), self.df['amount'].sum())
+      # The nulls are keyed to a placeholder row of the dimension
+      types = dimensions['type'].set_index('type_id').loc[transaction['type_id']].reset_index(drop=True)
+      self.assertTrue((types.loc[self.df['sub_object'].isna().to_numpy(), 'sub_object'] == NULL_VALUES['sub_object']).all())
+      self.assertEqual(NULL_VALUES['character_code'], 'No Character Code')
+      self.assertFalse(types.isna().any().any())
@@ -0,0 +1,132 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+from transform import get_invalid_groups, repair_hierarchy
+from transform import read_raw_chunks, stream_transform, to_output, transform
+
+
+class TestHierarchyRepair(unittest.TestCase):
+
+   def setUp(self):
+      self.df = pd.DataFrame({
+         'department': ['Police', 'Police', 'Police', 'Fire', 'Fire', None],
+         'department_code': ['POL', 'PD', 'POL', 'FIR', np.nan, 'XXX']
+      })
+
+   def test_First_Code_Wins_Within_Invalid_Group(self):
+      updated = repair_hierarchy(['department'], target='department_code', df=self.df)
+
+      self.assertEqual(updated, 1)
+      self.assertEqual(list(self.df['department_code'][:3]), ['POL', 'POL', 'POL'])
+
+   def test_Valid_Groups_And_Null_Features_Are_Untouched(self):
+      repair_hierarchy(['department'], target='department_code', df=self.df)
+
+      self.assertTrue(pd.isna(self.df['department_code'][4]))
+      self.assertEqual(self.df['department_code'][5], 'XXX')
+
+   def test_No_Invalid_Group_After_Repair(self):
+      self.assertEqual(get_invalid_groups(['department'], target='department_code', df=self.df).sum(), 3)
+      repair_hierarchy(['department'], target='department_code', df=self.df)
+      self.assertEqual(get_invalid_groups(['department'], target='department_code', df=self.df).sum(), 0)
+
+
+class TestStreamTransform(unittest.TestCase):
+
+   def setUp(self):
+      self.directory = tempfile.mkdtemp()
+      self.raw = os.path.join(self.directory, 'Spending_and_Revenue.csv')
+      rng = np.random.default_rng(0)
+      rows = 1000
+      department = rng.integers(0, 5, rows)
+      sub_object_code = np.where(rng.random(rows) < 0.05, 'NKEY', rng.integers(0, 20, rows).astype(str))
+      pd.DataFrame({
+         'Fiscal Year': rng.integers(2000, 2023, rows),
+         'Related Govt Units': rng.choice(['No', 'NO', 'YES'], rows),
+         'Organization Group Code': 1,
+         'Organization Group': 'Public Protection',
+         'Department Code': np.where(rng.random(rows) < 0.05, None, [f'D{code}' for code in department + 5 * (rng.random(rows) < 0.1)]),
+         'Department': [f'Department {code}' for code in department],
+         'Program Code': np.where(rng.random(rows) < 0.05, None, 'P'),
+         'Program': np.where(rng.random(rows) < 0.05, None, 'Program'),
+         # Null codes of a group with a single code, which the repair leaves null
+         'Character Code': np.where(rng.random(rows) < 0.05, None, 'C'),
+         'Character': 'Character',
+         'Object Code': 'O',
+         'Object': 'Object',
+         'Sub-object Code': sub_object_code,
+         'Sub-object': np.where(sub_object_code == 'NKEY', None, [f'Sub {code}' for code in sub_object_code]),
+         'Fund Type Code': 'F',
+         'Fund Type': 'Fund Type',
+         'Fund Code': 'F',
+         'Fund': 'Fund',
+         'Fund Category Code': np.where(rng.random(rows) < 0.05, np.nan, 1.0),
+         'Fund Category': 'Operating',
+         'Revenue or Spending': rng.choice(['Revenue', 'Spending'], rows),
+         'Amount': rng.normal(0, 1000, rows).round(2)
+      }).to_csv(self.raw, index=False)
+
+   def tearDown(self):
+      shutil.rmtree(self.directory)
+
+   def test_Streaming_Matches_In_Memory_Transform(self):
+      output = os.path.join(self.directory, 'transaction.csv')
+      rows = stream_transform(self.raw, output=output, chunksize=128)
+
+      expected = transform(next(read_raw_chunks(self.raw, chunksize=10 ** 6)))
+      streamed = pd.read_csv(output)
+
+      self.assertEqual(rows, len(expected))
+      pd.testing.assert_frame_equal(
+         streamed, pd.read_csv(io.StringIO(to_output(expected).to_csv(index=False)))
+      )
+      self.assertEqual(set(streamed['related_govt_units']), {'No', 'Yes'})
+      self.assertTrue(streamed['character_code'].isna().any())
+      self.assertFalse(streamed['department_code'].isna().any())
+
+   def test_Numeric_Codes_Agree_Across_Chunks(self):
+      raw = pd.read_csv(self.raw)
+      # Null codes in the first chunk only
+      raw.loc[:9, ['Organization Group Code', 'Fund Category Code']] = np.nan
+      raw['Fund Category Code'] = raw['Fund Category Code'].where(raw.index < 10, 1.0)
+      raw.loc[:9, 'Fund Category'] = 'Reserve'
+      raw.to_csv(self.raw, index=False)
+      output = os.path.join(self.directory, 'transaction.csv')
+      stream_transform(self.raw, output=output, chunksize=128)
+
+      streamed = pd.read_csv(output, dtype=str)
+      self.assertEqual(set(streamed['organization_group_code'].dropna()), {'1'})
+      self.assertEqual(set(streamed['fund_category_code']), {'1.0', 'No Fund Category Code'})
+
+   def test_Chunks_Have_Compact_Types(self):
+      chunk = next(read_raw_chunks(self.raw, chunksize=10 ** 6))
+      raw = pd.read_csv(self.raw)
+
+      self.assertEqual(chunk['fiscal_year'].dtype, np.int16)
+      self.assertEqual(chunk['amount'].dtype, np.int64)
+      np.testing.assert_array_equal(chunk['amount'].to_numpy(), np.rint(raw['Amount'].to_numpy() * 100))
+      for col in ['department', 'program_code', 'organization_group_code']:
+         self.assertIsInstance(chunk[col].dtype, pd.CategoricalDtype)
+      self.assertLess(chunk.memory_usage(deep=True).sum(), raw.memory_usage(deep=True).sum() / 2)
+
+   def test_Null_Amount_Is_Rejected(self):
+      raw = pd.read_csv(self.raw)
+      raw.loc[500, 'Amount'] = np.nan
+      raw.to_csv(self.raw, index=False)
+
+      with self.assertRaisesRegex(ValueError, '1 transactions have no amount'):
+         list(read_raw_chunks(self.raw, chunksize=128))
+
+   def test_Memory_Report_Covers_Every_Stage(self):
+      report = {}
+      stream_transform(self.raw, output=os.path.join(self.directory, 'transaction.csv'), chunksize=128, report=report)
+
+      self.assertEqual(list(report), ['read', 'clean', 'repair'])
+      for entry in report.values():
+         self.assertGreater(entry['dataframe_mb'], 0)
+         self.assertGreater(entry['peak_rss_mb'], 0)
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import unittest
+import boto3
+import aws
+
+from unittest import mock
+from moto import mock_aws
+from upload import MB, upload_files
+
+
+bucket_name = 'test-upload-1290'
+
+@mock_aws
+@mock.patch.dict(os.environ, {'AWS_DEFAULT_REGION': 'us-west-2'})
+class TestParallelUpload(unittest.TestCase):
+
+   def setUp(self):
+      aws.reset()
+      self.s3 = boto3.client('s3')
+      self.s3.create_bucket(Bucket=bucket_name, CreateBucketConfiguration={'LocationConstraint': 'us-west-2'})
+      self.directory = tempfile.mkdtemp()
+      # A file large enough for a multipart upload, and two small ones
+      self.paths = []
+      for name, size in [('transaction.csv', 12 * MB), ('program.csv', 1000), ('fund.csv', 500)]:
+         path = os.path.join(self.directory, name)
+         with open(path, 'wb') as file:
+            file.write(os.urandom(size))
+         self.paths.append(path)
+
+   def tearDown(self):
+      shutil.rmtree(self.directory)
+
+   def upload(self):
+      return upload_files(self.paths, bucket=bucket_name, part_size=5 * MB, max_concurrency=4)
+
+   def test_Files_Are_Uploaded_In_Parts(self):
+      self.assertEqual(self.upload(), {'transaction.csv': True, 'program.csv': True, 'fund.csv': True})
+      head = self.s3.head_object(Bucket=bucket_name, Key='transaction.csv')
+      self.assertEqual(head['ContentLength'], 12 * MB)
+      # A multipart ETag ends with the number of parts
+      self.assertTrue(head['ETag'].strip('"').endswith('-3'))
+      with open(self.paths[0], 'rb') as file:
+         self.assertEqual(self.s3.get_object(Bucket=bucket_name, Key='transaction.csv')['Body'].read(), file.read())
+
+   def test_Unchanged_Files_Are_Skipped(self):
+      self.upload()
+      with open(self.paths[1], 'ab') as file:
+         file.write(b'more rows')
+      self.assertEqual(self.upload(), {'transaction.csv': False, 'program.csv': True, 'fund.csv': False})
+
+   def test_File_Put_In_One_Part_Is_Skipped(self):
+      # e.g. put over SFTP, without the checksum metadata
+      with open(self.paths[2], 'rb') as file:
+         self.s3.put_object(Bucket=bucket_name, Key='fund.csv', Body=file.read())
+      self.assertFalse(self.upload()['fund.csv'])
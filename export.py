@@ -0,0 +1,201 @@
+import os
+import bz2
+import gzip
+import json
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from configparser import ConfigParser
+from typing import List, Tuple
+
+
+config = ConfigParser()
+config.read_file(open('params.cfg'))
+
+# -----------Envrionment Variables----------- #
+# S3
+bucket_name = config['S3']['bucket_name']
+# Data
+data_directory = config['Data']['data_directory']
+workers = int(config['Data']['workers'])
+# Export
+file_format = config['Export']['file_format']
+compression = config['Export']['compression']
+slices = int(config['Export']['slices'])
+parts_per_slice = int(config['Export']['parts_per_slice'])
+export_directory = config['Export']['export_directory']
+# ------------------------------------------- #
+
+TABLES = ['program', 'type', 'fund', 'finance', 'transaction']
+# File extension of each compression and the matching COPY option
+COMPRESSIONS = {
+   'none': ('', ''),
+   'gzip': ('.gz', 'GZIP'),
+   'bzip2': ('.bz2', 'BZIP2'),
+   'zstd': ('.zst', 'ZSTD')
+}
+# Parts smaller than this are not worth a slice of their own
+MIN_PART_SIZE = 1024 * 1024
+# Rows per Parquet row group; Redshift splits the COPY of a file by row group
+ROW_GROUP_SIZE = 1024 * 1024
+
+def open_compressed(path: str, compression: str):
+   """Open a file for writing with the given compression.
+   """
+   if compression == 'none':
+      return open(path, 'wb')
+   if compression == 'gzip':
+      return gzip.open(path, 'wb', compresslevel=6)
+   if compression == 'bzip2':
+      return bz2.open(path, 'wb')
+   if compression == 'zstd':
+      # zstandard is only needed when zstd compression is configured
+      import zstandard
+      return zstandard.open(path, 'wb')
+   raise ValueError(f'Unknown compression {compression}')
+
+def open_decompressed(path: str):
+   """Open a file for reading, decompressing it by its file extension.
+   """
+   if path.endswith(COMPRESSIONS['gzip'][0]):
+      return gzip.open(path, 'rb')
+   if path.endswith(COMPRESSIONS['bzip2'][0]):
+      return bz2.open(path, 'rb')
+   if path.endswith(COMPRESSIONS['zstd'][0]):
+      import zstandard
+      return zstandard.open(path, 'rb')
+   return open(path, 'rb')
+
+def get_part_ranges(path: str, parts: int) -> Tuple[bytes, List[Tuple[int, int]]]:
+   """Split the rows of a CSV file into byte ranges of similar size that
+   start and end on line breaks. Return the header line and the ranges.
+   """
+   size = os.path.getsize(path)
+   parts = max(1, min(parts, size // MIN_PART_SIZE))
+   with open(path, 'rb') as file:
+      header = file.readline()
+      boundaries = [file.tell()]
+      for part in range(1, parts):
+         file.seek(max(boundaries[-1], len(header) + part * (size - len(header)) // parts))
+         # Move to the start of the next line
+         file.readline()
+         boundaries.append(file.tell())
+   boundaries.append(size)
+   ranges = [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+   return header, ranges
+
+def compress_part(path: str, header: bytes, start: int, end: int, output: str, compression: str) -> int:
+   """Compress the rows in a byte range of the CSV file, preceded by the
+   header, into the output file. Return the size of the output file.
+   """
+   with open(path, 'rb') as file, open_compressed(output, compression) as part:
+      part.write(header)
+      file.seek(start)
+      remaining = end - start
+      while remaining > 0:
+         block = file.read(min(remaining, 8 * 1024 * 1024))
+         part.write(block)
+         remaining -= len(block)
+   return os.path.getsize(output)
+
+def split_table(name: str, source: str, directory: str, parts: int, compression: str, bucket: str, max_workers: int = workers) -> str:
+   """Split <source>/<name>.csv into compressed parts written to the directory,
+   compressing them in parallel, and write the COPY manifest listing where
+   the parts will live in the S3 bucket. Return the manifest path.
+   """
+   path = os.path.join(source, f'{name}.csv')
+   extension, _ = COMPRESSIONS[compression]
+   header, ranges = get_part_ranges(path, parts=parts)
+   outputs = [f'{name}.{part:04d}.csv{extension}' for part in range(len(ranges))]
+
+   with ProcessPoolExecutor(max_workers=max_workers) as executor:
+      sizes = list(executor.map(
+         compress_part,
+         [path] * len(ranges), [header] * len(ranges),
+         [start for start, _ in ranges], [end for _, end in ranges],
+         [os.path.join(directory, output) for output in outputs],
+         [compression] * len(ranges)
+      ))
+
+   manifest = {
+      'entries': [
+         {'url': f's3://{bucket}/{output}', 'mandatory': True, 'meta': {'content_length': size}}
+         for output, size in zip(outputs, sizes)
+      ]
+   }
+   manifest_path = os.path.join(directory, f'{name}.manifest')
+   with open(manifest_path, 'w') as file:
+      json.dump(manifest, file, indent=3)
+
+   print(f'{name}: {os.path.getsize(path)} bytes -> {len(outputs)} {compression} parts of {sum(sizes)} bytes')
+   return manifest_path
+
+def get_parquet_schema(name: str, columns: List[str]):
+   """Type the columns of a table for Parquet: surrogate keys and the fiscal
+   year as int32, the amount as decimal(20, 2) like the fact table, and
+   every attribute as a dictionary-encoded string.
+   """
+   import pyarrow as pa
+
+   def column_type(column: str):
+      if column.endswith('_id') or column == 'fiscal_year':
+         return pa.int32()
+      if column == 'amount':
+         return pa.decimal128(20, 2)
+      return pa.dictionary(pa.int32(), pa.string())
+
+   return pa.schema([(column, column_type(column)) for column in columns])
+
+def write_parquet(name: str, source: str, directory: str) -> str:
+   """Convert <source>/<name>.csv to <name>.parquet in the directory, one
+   batch of rows at a time. Return the path of the Parquet file.
+   """
+   # pyarrow is only needed when the Parquet format is configured
+   import pyarrow as pa
+   import pyarrow.csv as pa_csv
+   import pyarrow.compute as pa_compute
+   import pyarrow.parquet as pq
+
+   path = os.path.join(source, f'{name}.csv')
+   output = os.path.join(directory, f'{name}.parquet')
+   with open(path) as file:
+      columns = file.readline().strip().split(',')
+   schema = get_parquet_schema(name, columns)
+   # Amounts are parsed as floats and rounded to cents before the decimal cast
+   column_types = {field.name: pa.float64() if field.name == 'amount' else field.type for field in schema}
+
+   start = time.perf_counter()
+   reader = pa_csv.open_csv(path, convert_options=pa_csv.ConvertOptions(column_types=column_types))
+   with pq.ParquetWriter(output, schema, compression='snappy') as writer:
+      for batch in reader:
+         if 'amount' in columns:
+            amount = pa_compute.cast(pa_compute.round(batch.column('amount'), 2), pa.decimal128(20, 2), safe=False)
+            batch = pa.RecordBatch.from_arrays(
+               [amount if column == 'amount' else batch.column(column) for column in columns],
+               schema=schema
+            )
+         writer.write_table(pa.Table.from_batches([batch], schema=schema), row_group_size=ROW_GROUP_SIZE)
+   elapsed = time.perf_counter() - start
+
+   csv_size, parquet_size = os.path.getsize(path), os.path.getsize(output)
+   print(f'{name}: {csv_size} CSV bytes -> {parquet_size} Parquet bytes '
+         f'({csv_size / parquet_size:.1f}x smaller, {csv_size / elapsed / 1e6:.1f} MB/s)')
+   return output
+
+def main() -> None:
+   """Export every table of the star schema for the load, either as Parquet
+   files or as compressed CSV parts with a COPY manifest. Upload the export
+   directory to the S3 bucket afterwards.
+   """
+   os.makedirs(export_directory, exist_ok=True)
+   for name in TABLES:
+      if file_format == 'parquet':
+         write_parquet(name=name, source=data_directory, directory=export_directory)
+      else:
+         split_table(
+            name=name, source=data_directory, directory=export_directory,
+            parts=slices * parts_per_slice, compression=compression, bucket=bucket_name
+         )
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,50 @@
+import threading
+
+from aws import get_client
+from botocore.exceptions import ClientError
+from typing import Dict, Optional
+
+
+# Names and ARNs of every customer managed policy, built on the first lookup
+# that the direct ARN cannot answer, e.g. a policy created under a path
+index_lock = threading.Lock()
+policy_index: Optional[Dict[str, str]] = None
+
+def get_policy_index(refresh: bool = False) -> Dict[str, str]:
+   """Return the ARN of every customer managed policy by name, listing
+   every page of policies on first use or when refreshed.
+   """
+   global policy_index
+   with index_lock:
+      if policy_index is None or refresh:
+         index = {}
+         for page in get_client('iam').get_paginator('list_policies').paginate(Scope='Local'):
+            index.update({policy['PolicyName']: policy['Arn'] for policy in page['Policies']})
+         policy_index = index
+      return policy_index
+
+def get_policy_arn(policy_name: str, account_id: str) -> Optional[str]:
+   """Return the ARN of the customer managed policy, or None if there is
+   no such policy. The ARN of a policy created without a path is fetched
+   directly; otherwise the policy is looked up in the index, which is
+   refreshed once in case the policy is newer than the index.
+   """
+   policy_arn = f'arn:aws:iam::{account_id}:policy/{policy_name}'
+   try:
+      get_client('iam').get_policy(PolicyArn=policy_arn)
+      return policy_arn
+   except ClientError as error:
+      if error.response['Error']['Code'] != 'NoSuchEntity':
+         raise
+   refresh = policy_index is not None
+   policy_arn = get_policy_index().get(policy_name)
+   if policy_arn is None and refresh:
+      policy_arn = get_policy_index(refresh=True).get(policy_name)
+   return policy_arn
+
+def forget_policy(policy_name: str) -> None:
+   """Remove a deleted policy from the index.
+   """
+   with index_lock:
+      if policy_index is not None:
+         policy_index.pop(policy_name, None)
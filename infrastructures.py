@@ -1,11 +1,14 @@
-import boto3
 import logging
 import json
 
+from aws import get_client, get_resource, print_clients_built
 from botocore.exceptions import ClientError
 from configparser import ConfigParser
 from typing import Optional, Dict, List
+from dag import run_dag, get_critical_path, print_timings
 from parse_policy import *
+from state import get_state, record_state, validated
+from iam_policies import get_policy_arn
 
 
 config = ConfigParser()
@@ -42,7 +45,9 @@ def create_or_get_s3_bucket(name: str, region: str) -> Optional[bool]:
 
    : create_bucket returns a dict of bucket info
    """
-   s3 = boto3.client('s3')  
+   s3 = get_client('s3')  
+   if validated(f'bucket:{name}', lambda bucket: s3.head_bucket(Bucket=bucket)) is not None:
+      return True
    try:
       s3.create_bucket(
          Bucket=name, 
@@ -56,37 +61,42 @@ def create_or_get_s3_bucket(name: str, region: str) -> Optional[bool]:
          logging.error(s3_error['Message'])
          return False
       print(s3_error['Message'])
+   record_state(f'bucket:{name}', name)
    return True
 
 def create_or_get_s3_policy(policy_name: str, bucket_name: str, service: str) -> dict:
    """Create an IAM policy that defines the actions a service may
    apply onto the target S3 bucket.
    """
-   iam = boto3.client('iam')
+   iam = get_client('iam')
+   s3_policy = validated(f'policy:{policy_name}', lambda arn: iam.get_policy(PolicyArn=arn))
+   if s3_policy is not None:
+      return s3_policy
    try:
       s3_policy_document = get_S3_policy_document(bucket_name, service=service)
       s3_policy = iam.create_policy(
          PolicyName=policy_name, 
          PolicyDocument=s3_policy_document
       )
+      record_state(f'policy:{policy_name}', s3_policy['Policy']['Arn'])
       return s3_policy
    except ClientError as error:
       logging.error(error)
       # Policy already created...
       # EntityAlreadyExists exception
-      response = iam.list_policies(Scope='Local')
-      for policy in response['Policies']:
-         if policy['PolicyName'] == policy_name:
-            return {'Policy': policy}
+      policy_arn = get_policy_arn(policy_name, account_id=account_id)
+      if policy_arn is not None:
+         record_state(f'policy:{policy_name}', policy_arn)
+         return iam.get_policy(PolicyArn=policy_arn)
 
 def attach_policies_to_iam_role(policies: Dict[str, List[str]], role_name: str) -> None:
    """Attach managed policies to the IAM role.
    """
-   role = boto3.resource('iam').Role(role_name)
+   role = get_resource('iam').Role(role_name)
    for account, policy_names in policies.items():
       for policy_name in policy_names:
          if account.lower() == 'customer':
-            policy_arn = f'arn:aws:iam::{account_id}:policy/{policy_name}'
+            policy_arn = get_state(f'policy:{policy_name}') or get_policy_arn(policy_name, account_id=account_id)
          else:
             policy_arn = f'arn:aws:iam::aws:policy/{policy_name}'
 
@@ -97,7 +107,10 @@ def create_or_get_transfer_family_role(role_name: str) -> dict:
    relationship between Transfer Family and AWS for it to behave on 
    user's behalf. 
    """
-   iam = boto3.client('iam')
+   iam = get_client('iam')
+   role = validated(f'role:{role_name}', lambda arn: iam.get_role(RoleName=role_name))
+   if role is not None:
+      return role
    try:
       trust_policy_document = get_trust_policy_document(
          account_id=account_id,
@@ -108,12 +121,13 @@ def create_or_get_transfer_family_role(role_name: str) -> dict:
          # Establish a trust relationship between AWS and Transfer Family
          AssumeRolePolicyDocument=trust_policy_document
       )
-      return role
    except ClientError as error:
       logging.error(error)
       # Role already created...
       # EntityAlreadyExists exception
-      return iam.get_role(RoleName=role_name)
+      role = iam.get_role(RoleName=role_name)
+   record_state(f'role:{role_name}', role['Role']['Arn'])
+   return role
 
 def create_or_get_sftp_server() -> dict:
    """Create a service-managed SFTP server with Transfer 
@@ -121,11 +135,14 @@ def create_or_get_sftp_server() -> dict:
    storage domain. SSH host keys will be needed for migrating
    local user to the SFTP server.
    """
-   transfer = boto3.client('transfer')
+   transfer = get_client('transfer')
+   if validated('sftp_server', lambda server_id: transfer.describe_server(ServerId=server_id)) is not None:
+      return {'ServerId': get_state('sftp_server')}
    try:
       server_lists = transfer.list_servers()
       # Check if there is any server already created
       if len(server_lists['Servers']) >= 1:
+         record_state('sftp_server', server_lists['Servers'][0]['ServerId'])
          return {'ServerId': server_lists['Servers'][0]['ServerId']}
 
       ssh_private_key_content = get_ssh_key_content(type='private')
@@ -138,6 +155,7 @@ def create_or_get_sftp_server() -> dict:
          # submit the ssh private key content for user authentication
          HostKey=ssh_private_key_content
       )
+      record_state('sftp_server', server['ServerId'])
 
       return server
    except ClientError as error:
@@ -148,7 +166,9 @@ def create_or_get_sftp_user(username: str, role_name: str, server_id: str, home_
    Family role. The user will land on the S3 bucket home directory. 
    SSH public key is needed to authenticate with the server. 
    """
-   transfer = boto3.client('transfer')
+   transfer = get_client('transfer')
+   if validated(f'sftp_user:{username}', lambda _: transfer.describe_user(ServerId=server_id, UserName=username)) is not None:
+      return {'ServerId': server_id, 'UserName': username}
    try:
       # Retrieve relevant configuration parameters 
       # Set up a user for the server
@@ -159,6 +179,7 @@ def create_or_get_sftp_user(username: str, role_name: str, server_id: str, home_
          HomeDirectory='/' + home_directory,
          SshPublicKeyBody=get_ssh_key_content(type='public')
       )
+      record_state(f'sftp_user:{username}', server_id)
       return user
    except ClientError as error:
       user_error = error.response['Error']
@@ -169,13 +190,20 @@ def create_or_get_sftp_user(username: str, role_name: str, server_id: str, home_
       for user in users['Users']:
          if user['UserName'] == username:
             user['ServerId'] = users['ServerId']
+            record_state(f'sftp_user:{username}', server_id)
             return user
 
 def create_or_get_security_group(group_name: str) -> dict:
    """Create a security group that routes inbound traffic
    to the port 5439.
    """   
-   ec2 = boto3.client('ec2')
+   ec2 = get_client('ec2')
+   security_group = validated(
+      f'security_group:{group_name}',
+      lambda group_id: ec2.describe_security_groups(GroupIds=[group_id])['SecurityGroups'][0]
+   )
+   if security_group is not None:
+      return security_group
    try:
       security_group = ec2.create_security_group(
          GroupName=group_name,
@@ -204,12 +232,16 @@ def create_or_get_security_group(group_name: str) -> dict:
       logging.error(error)
       
    groups = ec2.describe_security_groups(GroupNames=[group_name])
+   record_state(f'security_group:{group_name}', groups['SecurityGroups'][0]['GroupId'])
    return groups['SecurityGroups'][0]
 
 def create_or_get_redshift_role(role_name: str, s3_policy_name: str, s3_bucket: str) -> dict:
    """Create an IAM role for Redshift. The role is granted full access to Redshift including console and editor. A policy defining the actions allowed on the S3 bucket is attached.
    """
-   iam = boto3.client('iam')
+   iam = get_client('iam')
+   role = validated(f'role:{role_name}', lambda arn: iam.get_role(RoleName=role_name))
+   if role is not None:
+      return role
    try:
       iam.create_role(
          RoleName=role_name,
@@ -231,13 +263,13 @@ def create_or_get_redshift_role(role_name: str, s3_policy_name: str, s3_bucket:
          )
       )
 
-      create_or_get_s3_policy(
+      s3_policy = create_or_get_s3_policy(
          policy_name=s3_policy_name, 
          bucket_name=s3_bucket, 
          service='redshift'
       )
 
-      policy_arn = f'arn:aws:iam::{account_id}:policy/{s3_policy_name}'
+      policy_arn = s3_policy['Policy']['Arn']
       # Wait for the role and the policy to become available
       iam.get_waiter('role_exists').wait(RoleName=role_name)
       iam.get_waiter('policy_exists').wait(PolicyArn=policy_arn)
@@ -254,14 +286,23 @@ def create_or_get_redshift_role(role_name: str, s3_policy_name: str, s3_bucket:
       # EntityAlreadyExists
       logging.error(error)
 
-   return iam.get_role(RoleName=role_name)
+   role = iam.get_role(RoleName=role_name)
+   # Recorded once the policies are attached, so that a rerun can skip the role
+   record_state(f'role:{role_name}', role['Role']['Arn'])
+   return role
    
 def create_or_get_redshift_cluster(cluster_name: str, db_name: str, db_username: str, db_password: str, security_group: dict, role_name: str) -> dict:
    """Create a Redshift cluster on Postgres. Redshift role is already created and ready to be attached.
    """
-   redshift = boto3.client('redshift')
+   redshift = get_client('redshift')
+   cluster = validated(
+      f'redshift_cluster:{cluster_name}',
+      lambda endpoint: redshift.describe_clusters(ClusterIdentifier=cluster_name)['Clusters'][0]
+   )
+   if cluster is not None:
+      return cluster
    try:
-      redshift_role = boto3.resource('iam').Role(role_name)
+      redshift_role = get_resource('iam').Role(role_name)
       cluster = redshift.create_cluster(
          ClusterIdentifier=cluster_name,
          DBName=db_name, 
@@ -280,64 +321,111 @@ def create_or_get_redshift_cluster(cluster_name: str, db_name: str, db_username:
       cluster = redshift.describe_clusters(ClusterIdentifier=cluster_name)
       return cluster['Clusters'][0]
 
+def wait_for(service: str, waiter: str, **kwargs) -> None:
+   """Block until the waiter of the service succeeds.
+   """
+   get_client(service).get_waiter(waiter).wait(**kwargs)
+
 def main() -> None:
    """Set up an S3 bucket, an SFTP server with a user, and a Redshift cluster.
+
+   The steps run as a dependency graph on a thread pool, so that the SFTP 
+   and the Redshift branches, and their waiters, overlap.
    """
+   results = {}
+
    # 1. Set up an S3 bucket 
-   create_or_get_s3_bucket(name=bucket_name, region=region)
+   def s3_bucket() -> None:
+      create_or_get_s3_bucket(name=bucket_name, region=region)
+      # Wait for S3 bucket to become available
+      wait_for('s3', 'bucket_exists', Bucket=bucket_name)
+
    # 2.1 Set up an IAM role for Transfer Family
-   create_or_get_transfer_family_role(role_name=transfer_role)
-   # Wait for S3 bucket to become available
-   boto3.client('s3').get_waiter('bucket_exists').wait(Bucket=bucket_name)
+   def transfer_family_role() -> None:
+      create_or_get_transfer_family_role(role_name=transfer_role)
+      # Wait for Transfer Family role to become available
+      wait_for('iam', 'role_exists', RoleName=transfer_role)
+
    # 2.2 Set up the S3 policy for Transfer Family to call the S3 bucket on user's behalf
-   s3_policy = create_or_get_s3_policy(
-      policy_name=transfer_s3_policy, 
-      bucket_name=bucket_name, 
-      service='transfer'
-   )
-   # Wait for policy to become available
-   boto3.client('iam').get_waiter('policy_exists').wait(PolicyArn=s3_policy['Policy']['Arn'])
-   # Wait for Transfer Family role to become available
-   boto3.client('iam').get_waiter('role_exists').wait(RoleName=transfer_role)
+   def transfer_family_s3_policy() -> None:
+      s3_policy = create_or_get_s3_policy(
+         policy_name=transfer_s3_policy, 
+         bucket_name=bucket_name, 
+         service='transfer'
+      )
+      # Wait for policy to become available
+      wait_for('iam', 'policy_exists', PolicyArn=s3_policy['Policy']['Arn'])
+
    # 2.3 Attach managed policies to the Transfer Family role 
-   transfer_permissions = {'aws': transfer_aws_permissions, 'customer': [transfer_s3_policy]}
-   attach_policies_to_iam_role(
-      policies=transfer_permissions, 
-      role_name=transfer_role
-   )
+   def transfer_family_permissions() -> None:
+      transfer_permissions = {'aws': transfer_aws_permissions, 'customer': [transfer_s3_policy]}
+      attach_policies_to_iam_role(
+         policies=transfer_permissions, 
+         role_name=transfer_role
+      )
+
    # 3. Set up an SFTP server with Transfer Family
-   sftp_server = create_or_get_sftp_server()
-   # Wait for the server to become available online
-   boto3.client('transfer').get_waiter('server_online').wait(ServerId=sftp_server['ServerId'])
+   def sftp_server() -> None:
+      results['sftp_server'] = create_or_get_sftp_server()
+      # Wait for the server to become available online
+      wait_for('transfer', 'server_online', ServerId=results['sftp_server']['ServerId'])
+
    # 4. Create a user to attach to the server
-   create_or_get_sftp_user(
-      username=sftp_server_username, 
-      role_name=transfer_role, 
-      server_id=sftp_server['ServerId'], 
-      home_directory=bucket_name
-   )
+   def sftp_user() -> None:
+      create_or_get_sftp_user(
+         username=sftp_server_username, 
+         role_name=transfer_role, 
+         server_id=results['sftp_server']['ServerId'], 
+         home_directory=bucket_name
+      )
+
    # 5.1 Set up a security group to route traffic to Redshift
-   traffic_group = create_or_get_security_group(group_name=security_group_name)
+   def security_group() -> None:
+      results['security_group'] = create_or_get_security_group(group_name=security_group_name)
+
    # 5.2 Set up an IAM role for Redshift
-   create_or_get_redshift_role(
-      role_name=redshift_role, 
-      s3_policy_name=redshift_s3_policy, 
-      s3_bucket=bucket_name
-   )
+   def redshift_iam_role() -> None:
+      create_or_get_redshift_role(
+         role_name=redshift_role, 
+         s3_policy_name=redshift_s3_policy, 
+         s3_bucket=bucket_name
+      )
+
    # No need to Wait for the Redshift role to become available since that is accounted for during role creation
    # 5.3 Create a Redshift cluster with the Redshift role attached
-   create_or_get_redshift_cluster(
-      cluster_name=redshift_cluster, 
-      db_name=redshift_db_name, 
-      db_username=redshift_db_username, 
-      db_password=redshift_db_password, 
-      security_group=traffic_group, 
-      role_name=redshift_role
-   )
-   # Wait for the cluster to become available
-   boto3.client('redshift').get_waiter('cluster_available').wait(ClusterIdentifier=redshift_cluster)
+   def cluster() -> None:
+      redshift = create_or_get_redshift_cluster(
+         cluster_name=redshift_cluster, 
+         db_name=redshift_db_name, 
+         db_username=redshift_db_username, 
+         db_password=redshift_db_password, 
+         security_group=results['security_group'], 
+         role_name=redshift_role
+      )
+      # Wait for the cluster to become available
+      wait_for('redshift', 'cluster_available', ClusterIdentifier=redshift_cluster)
+      if 'Endpoint' not in redshift:
+         # The endpoint is only assigned once the cluster is available
+         redshift = get_client('redshift').describe_clusters(ClusterIdentifier=redshift_cluster)['Clusters'][0]
+      record_state(f'redshift_cluster:{redshift_cluster}', redshift['Endpoint']['Address'])
+
+   tasks = {
+      's3_bucket': (s3_bucket, []),
+      'transfer_family_role': (transfer_family_role, []),
+      'transfer_family_s3_policy': (transfer_family_s3_policy, []),
+      'transfer_family_permissions': (transfer_family_permissions, ['transfer_family_role', 'transfer_family_s3_policy']),
+      'sftp_server': (sftp_server, []),
+      'sftp_user': (sftp_user, ['s3_bucket', 'transfer_family_permissions', 'sftp_server']),
+      'security_group': (security_group, []),
+      'redshift_role': (redshift_iam_role, []),
+      'redshift_cluster': (cluster, ['security_group', 'redshift_role'])
+   }
+   timings = run_dag(tasks, max_workers=len(tasks))
+   print_timings(timings, critical_path=get_critical_path(tasks, timings))
+
    # Print the SFTP server Endpoint
-   print(f'SFTP Server Endpoint: {sftp_server["ServerId"]}.server.transfer.{region}.amazonaws.com')
+   print(f'SFTP Server Endpoint: {results["sftp_server"]["ServerId"]}.server.transfer.{region}.amazonaws.com')
+   print_clients_built()
 
 if __name__ == '__main__':
-   main()
\ No newline at end of file
+   main()
@@ -1,12 +1,22 @@
-import boto3
+import os
+import json
+import hashlib
 
+from aws import get_client, print_clients_built
 from configparser import ConfigParser
+from functools import partial
+from physical_design import apply_design, profile_tables
+from dag import run_dag, print_timings
+from export import COMPRESSIONS, open_decompressed
+from state import get_state, record_state, validated
+from typing import Any, Dict, List, Optional
 from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine, url
+from sqlalchemy.engine import Connection, Engine, url
 from sqlalchemy import Table, Column, ForeignKey
-from sqlalchemy.types import Integer, Numeric, String
+from sqlalchemy.types import DateTime, Integer, Numeric, String
 from sqlalchemy.schema import MetaData
 from sqlalchemy.exc import ProgrammingError
+from botocore.exceptions import ClientError
 
 
 config = ConfigParser()
@@ -24,15 +34,40 @@ redshift_cluster = config['Redshift']['redshift_cluster']
 db_name = config['Redshift']['redshift_db_name']
 db_username = config['Redshift']['redshift_db_username']
 db_password = config['Redshift']['redshift_db_password']
+# Load
+max_connections = int(config['Load']['max_connections'])
+incremental = config.getboolean('Load', 'incremental')
+backend = config['Load']['backend']
+local_url = config['Load']['local_url']
+local_directory = config['Load']['local_directory']
+# Export
+split = config.getboolean('Export', 'split')
+compression = config['Export']['compression']
 # ------------------------------------------- #
 
-def redshift_connection(cluster: str, db_name: str, username: str, password: str, port: int = 5439) -> Engine:
-   """Establish a SQL client connection to the Redshift cluster.
+DIMENSIONS = ['program', 'type', 'fund', 'finance']
+TABLES = DIMENSIONS + ['transaction']
+# Summary tables of the dashboard metrics, with the dimension and the attribute they aggregate by
+SUMMARIES = {
+   'organization_group_summary': ('program', 'organization_group'),
+   'fund_type_summary': ('fund', 'fund_type'),
+   'character_summary': ('type', 'character')
+}
+# Recorded in the load state once the summaries are built, so that a change of their definitions rebuilds them
+SUMMARIES_FINGERPRINT = hashlib.md5(json.dumps(SUMMARIES, sort_keys=True).encode()).hexdigest()
+
+def redshift_connection(cluster: str, db_name: str, username: str, password: str, port: int = 5439, pool_size: int = 1) -> Engine:
+   """Establish a SQL client connection to the Redshift cluster. The engine
+   keeps a pool of at most pool_size connections for concurrent statements.
    """
-   # Get the host endpoint
-   redshift = boto3.client('redshift')
-   clusters_info = redshift.describe_clusters(ClusterIdentifier=cluster)
+   # Get the host endpoint, recorded by infrastructures.py unless it ran elsewhere,
+   # and confirm it with a targeted GET, since the cluster may have been recreated
+   redshift = get_client('redshift')
+   clusters_info = validated(f'redshift_cluster:{cluster}', lambda host: redshift.describe_clusters(ClusterIdentifier=cluster))
+   clusters_info = clusters_info or redshift.describe_clusters(ClusterIdentifier=cluster)
    host = clusters_info['Clusters'][0]['Endpoint']['Address']
+   if host != get_state(f'redshift_cluster:{cluster}'):
+      record_state(f'redshift_cluster:{cluster}', host)
    # Build the connection URL
    connection_url = url.URL.create(
       drivername='redshift+redshift_connector', 
@@ -42,7 +77,20 @@ def redshift_connection(cluster: str, db_name: str, username: str, password: str
       username=username, 
       password=password
    )
-   return create_engine(url=connection_url)
+   return create_engine(url=connection_url, pool_size=pool_size, max_overflow=0)
+
+def warehouse_connection(pool_size: int = 1) -> Engine:
+   """Connect to the configured backend: the Redshift cluster, or a local
+   Postgres database loaded from the local directory in place of the S3
+   bucket.
+   """
+   if backend == 'postgres':
+      return create_engine(local_url, pool_size=pool_size, max_overflow=0)
+   return redshift_connection(
+      cluster=redshift_cluster, db_name=db_name,
+      username=db_username, password=db_password,
+      pool_size=pool_size
+   )
 
 def create_schema(name: str, engine: Engine) -> None:
    """Create a schema called <name>.
@@ -50,7 +98,7 @@ def create_schema(name: str, engine: Engine) -> None:
    with engine.connect() as conn:
       conn.execute(f"CREATE SCHEMA IF NOT EXISTS {name};")
 
-def create_program_dimension(schema: MetaData, engine: Engine) -> None:
+def create_program_dimension(schema: MetaData, engine: Engine, profiles: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
    """Create the Program dimensional table. 
    """
    try:
@@ -65,11 +113,12 @@ def create_program_dimension(schema: MetaData, engine: Engine) -> None:
          Column('related_govt_units', String(10), nullable=False),
          keep_existing=True
       )
+      apply_design(program, profiles)
       program.create(engine, checkfirst=True)
    except ProgrammingError as error:
       print(error)
 
-def create_type_dimension(schema: MetaData, engine: Engine) -> None:
+def create_type_dimension(schema: MetaData, engine: Engine, profiles: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
    """Create the Type dimensional table.
    """
    try:
@@ -83,11 +132,12 @@ def create_type_dimension(schema: MetaData, engine: Engine) -> None:
          Column('character_code', String(50), nullable=False),
          keep_existing=True
       )
+      apply_design(type, profiles)
       type.create(engine, checkfirst=True)
    except ProgrammingError as error:
       print(error)
 
-def create_fund_dimension(schema: MetaData, engine: Engine) -> None:
+def create_fund_dimension(schema: MetaData, engine: Engine, profiles: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
    """Create the Fund dimensional table.
    """
    try:
@@ -101,11 +151,12 @@ def create_fund_dimension(schema: MetaData, engine: Engine) -> None:
          Column('fund_type_code', String(50), nullable=False),
          keep_existing=True 
       )
+      apply_design(fund, profiles)
       fund.create(engine, checkfirst=True)
    except ProgrammingError as error:
       print(error)
    
-def create_finance_dimension(schema: MetaData, engine: Engine) -> None:
+def create_finance_dimension(schema: MetaData, engine: Engine, profiles: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
    """Create the Finance dimensional table.
    """
    try:
@@ -114,11 +165,12 @@ def create_finance_dimension(schema: MetaData, engine: Engine) -> None:
          Column('revenue_or_spending', String(20), nullable=False),
          keep_existing=True 
       )
+      apply_design(finance, profiles)
       finance.create(engine, checkfirst=True)
    except ProgrammingError as error:
       print(error)
    
-def create_transaction_fact(schema: MetaData, engine: Engine) -> None:
+def create_transaction_fact(schema: MetaData, engine: Engine, profiles: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
    """Create the transaction fact table.
    """
    try:
@@ -132,29 +184,341 @@ def create_transaction_fact(schema: MetaData, engine: Engine) -> None:
          Column('amount', Numeric(20, 2), nullable=False),
          keep_existing=True
       )
+      apply_design(transaction, profiles)
       transaction.create(engine, checkfirst=True)
    except ProgrammingError as error:
       print(error)
 
-def load_table(name: str, schema: str, engine: Engine) -> None:
-   """Insert data from S3 bucket into the table.
+def create_load_state(schema: MetaData, engine: Engine) -> None:
+   """Create the table that records the fingerprint of the S3 objects
+   each table was last loaded from.
+   """
+   try:
+      load_state = Table('load_state', schema,
+         Column('table_name', String(50), primary_key=True),
+         Column('fingerprint', String(32), nullable=False),
+         Column('loaded_at', DateTime, nullable=False),
+         keep_existing=True
+      )
+      load_state.create(engine, checkfirst=True)
+   except ProgrammingError as error:
+      print(error)
+
+def create_data_version(schema: MetaData, engine: Engine) -> None:
+   """Create the table of the version of the data of every table, bumped
+   by every load of the table, which the cached query results depend on.
+   """
+   try:
+      data_version = Table('data_version', schema,
+         Column('table_name', String(50), primary_key=True),
+         Column('version', Integer, nullable=False),
+         Column('updated_at', DateTime, nullable=False),
+         keep_existing=True
+      )
+      data_version.create(engine, checkfirst=True)
+   except ProgrammingError as error:
+      print(error)
+
+def create_summary_tables(schema: MetaData, engine: Engine, profiles: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+   """Create the summary tables of the dashboard metrics: the total,
+   largest and number of transactions per fiscal year, attribute and
+   revenue or spending.
    """
-   stmt = "COPY {table} FROM '{s3}' iam_role '{role_arn}' csv ignoreheader 1;".format(
-      table=f'{schema}.{name}', 
-      s3=f's3://{bucket_name}/{name}.csv', 
+   try:
+      for name, (dimension, attribute) in SUMMARIES.items():
+         summary = Table(name, schema,
+            Column('fiscal_year', Integer, primary_key=True),
+            Column(attribute, String(100), primary_key=True),
+            Column('revenue_or_spending', String(20), primary_key=True),
+            Column('amount', Numeric(20, 2), nullable=False),
+            Column('max_amount', Numeric(20, 2), nullable=False),
+            Column('transactions', Integer, nullable=False),
+            keep_existing=True
+         )
+         apply_design(summary, profiles)
+         summary.create(engine, checkfirst=True)
+   except ProgrammingError as error:
+      print(error)
+
+def get_source_fingerprint(name: str) -> str:
+   """Fingerprint the objects in S3 bucket a table may be copied from, i.e.
+   every <name>.* object, by their keys, ETags and sizes. With the local
+   backend, the <name>.* files of the local directory are fingerprinted by
+   their names, modification times and sizes instead.
+   """
+   objects = []
+   if backend == 'postgres':
+      for file_name in os.listdir(local_directory):
+         if file_name.startswith(f'{name}.'):
+            stat = os.stat(os.path.join(local_directory, file_name))
+            objects.append(f'{file_name}:{stat.st_mtime_ns}:{stat.st_size}')
+      return hashlib.md5('\n'.join(sorted(objects)).encode()).hexdigest()
+   s3 = get_client('s3')
+   for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket_name, Prefix=f'{name}.'):
+      objects.extend(f"{item['Key']}:{item['ETag']}:{item['Size']}" for item in page.get('Contents', []))
+   return hashlib.md5('\n'.join(sorted(objects)).encode()).hexdigest()
+
+def get_load_state(schema: str, engine: Engine) -> Dict[str, str]:
+   """Return the fingerprint each table was last loaded from.
+   """
+   rows = engine.execute(text(f"SELECT table_name, fingerprint FROM {schema}.load_state;"))
+   return {table_name: fingerprint for table_name, fingerprint in rows}
+
+def record_load_state(name: str, fingerprint: str, schema: str, conn: Connection) -> None:
+   """Record the fingerprint a table was loaded from, as part of the
+   transaction that loaded it.
+   """
+   conn.execute(text(f"DELETE FROM {schema}.load_state WHERE table_name = :name;"), {'name': name})
+   conn.execute(
+      text(f"INSERT INTO {schema}.load_state VALUES (:name, :fingerprint, CURRENT_TIMESTAMP);"),
+      {'name': name, 'fingerprint': fingerprint}
+   )
+
+def get_data_versions(schema: str, conn: Connection) -> Dict[str, int]:
+   """Return the version of the data of every loaded table.
+   """
+   rows = conn.execute(text(f"SELECT table_name, version FROM {schema}.data_version;"))
+   return {table_name: version for table_name, version in rows}
+
+def bump_data_version(names: List[str], schema: str, conn: Connection) -> None:
+   """Bump the version of the data of the tables, as part of the
+   transaction that changed them.
+   """
+   for name in names:
+      updated = conn.execute(
+         text(f"UPDATE {schema}.data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = :name;"),
+         {'name': name}
+      )
+      if updated.rowcount == 0:
+         conn.execute(text(f"INSERT INTO {schema}.data_version VALUES (:name, 1, CURRENT_TIMESTAMP);"), {'name': name})
+
+def parquet_object_exists(name: str) -> bool:
+   """Check if the table was uploaded to the S3 bucket as <name>.parquet.
+   """
+   if backend == 'postgres':
+      return os.path.exists(os.path.join(local_directory, f'{name}.parquet'))
+   try:
+      get_client('s3').head_object(Bucket=bucket_name, Key=f'{name}.parquet')
+      return True
+   except ClientError as error:
+      # Anything but a missing object, e.g. AccessDenied, must not fall back to the CSV
+      if error.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+         return False
+      raise
+
+def copy_statement(name: str, table: str, manifest: bool = False, compression: str = 'none') -> str:
+   """Build the COPY of the <name> data in the S3 bucket into the table. A
+   <name>.parquet object is copied as Parquet. Otherwise the CSV is copied,
+   in parallel from the parts listed in <name>.manifest if there is a manifest.
+   """
+   if parquet_object_exists(name):
+      source, options = f'{name}.parquet', ['FORMAT AS PARQUET']
+   elif manifest:
+      # The compression of the parts listed in the manifest
+      source, options = f'{name}.manifest', ['csv', 'ignoreheader 1', COMPRESSIONS[compression][1], 'manifest']
+   else:
+      source, options = f'{name}.csv', ['csv', 'ignoreheader 1']
+   return "COPY {table} FROM '{s3}' iam_role '{role_arn}' {options};".format(
+      table=table, 
+      s3=f's3://{bucket_name}/{source}', 
       role_arn=f'arn:aws:iam::{account_id}:role/{redshift_role}', 
+      options=' '.join(option for option in options if option),
       region=region
    )
 
-   engine.execute(text(stmt).execution_options(autocommit=True))
+def copy_local(name: str, table: str, conn: Connection, manifest: bool = False) -> None:
+   """Emulate copy_statement on Postgres: stream the <name> files of the
+   local directory into the table with COPY FROM STDIN. A <name>.parquet
+   file is streamed one row group at a time, and the parts listed in
+   <name>.manifest are decompressed by their file extension.
+   """
+   cursor = conn.connection.cursor()
+   copy = f"COPY {table} FROM STDIN WITH (FORMAT csv, HEADER true);"
+   if parquet_object_exists(name):
+      # pyarrow is only needed when a Parquet file is copied
+      import io
+      import pyarrow as pa
+      import pyarrow.csv as pa_csv
+      import pyarrow.parquet as pq
+      for batch in pq.ParquetFile(os.path.join(local_directory, f'{name}.parquet')).iter_batches():
+         columns = [column.dictionary_decode() if pa.types.is_dictionary(column.type) else column for column in batch.columns]
+         buffer = io.BytesIO()
+         pa_csv.write_csv(pa.Table.from_arrays(columns, names=batch.schema.names), buffer)
+         buffer.seek(0)
+         cursor.copy_expert(copy, buffer)
+   elif manifest:
+      with open(os.path.join(local_directory, f'{name}.manifest')) as file:
+         entries = json.load(file)['entries']
+      for entry in entries:
+         # The parts are listed by their S3 URL
+         with open_decompressed(os.path.join(local_directory, entry['url'].rsplit('/', 1)[-1])) as part:
+            cursor.copy_expert(copy, part)
+   else:
+      with open(os.path.join(local_directory, f'{name}.csv'), 'rb') as file:
+         cursor.copy_expert(copy, file)
+
+def copy_into(name: str, table: str, conn: Connection, manifest: bool = False, compression: str = 'none') -> None:
+   """Copy the <name> data into the table with the configured backend.
+   """
+   if backend == 'postgres':
+      copy_local(name, table=table, conn=conn, manifest=manifest)
+   else:
+      conn.execute(text(copy_statement(name, table=table, manifest=manifest, compression=compression)))
+
+def copy_table(name: str, schema: str, conn: Connection, manifest: bool = False, compression: str = 'none', replace: bool = False, fingerprint: Optional[str] = None) -> None:
+   """Insert data from S3 bucket into the table within the transaction of
+   the connection, as load_table does.
+   """
+   table = f'{schema}.{conn.dialect.identifier_preparer.quote(name)}'
+   if replace:
+      conn.execute(text(f"DELETE FROM {table};"))
+   copy_into(name, table=table, conn=conn, manifest=manifest, compression=compression)
+   if fingerprint is not None:
+      record_load_state(name, fingerprint=fingerprint, schema=schema, conn=conn)
+   bump_data_version([name], schema=schema, conn=conn)
+
+def load_table(name: str, schema: str, engine: Engine, manifest: bool = False, compression: str = 'none', replace: bool = False, fingerprint: Optional[str] = None) -> None:
+   """Insert data from S3 bucket into the table. With replace, the rows
+   already in the table are deleted first. The fingerprint of the source,
+   if given, is recorded and the data version of the table bumped in the
+   same transaction.
+   """
+   with engine.begin() as conn:
+      copy_table(name, schema=schema, conn=conn, manifest=manifest, compression=compression, replace=replace, fingerprint=fingerprint)
+
+def reload_star_schema(fingerprints: Dict[str, Optional[str]], schema: str, engine: Engine, manifest: bool = False, compression: str = 'none') -> None:
+   """Replace the fact and the fingerprinted dimensions in one transaction,
+   emptying the fact first so that a backend that enforces its foreign
+   keys accepts the new dimension rows. A failed reload rolls the emptied
+   fact back, so readers never see an empty report. A fingerprint of None
+   is not recorded.
+   """
+   with engine.begin() as conn:
+      conn.execute(text(f"DELETE FROM {schema}.{conn.dialect.identifier_preparer.quote('transaction')};"))
+      for name in TABLES:
+         if name in fingerprints:
+            copy_table(name, schema=schema, conn=conn, manifest=manifest, compression=compression, replace=True, fingerprint=fingerprints[name])
+
+def get_reloads(changed: Dict[str, str], fingerprints: Dict[str, str]) -> Dict[str, str]:
+   """Return the fingerprints of the tables to reload for the changed ones.
+   Postgres enforces the foreign keys of the fact table, unlike Redshift,
+   so on the local backend the fact is reloaded with any of its dimensions
+   by reload_star_schema.
+   """
+   if backend == 'postgres' and set(changed) & set(DIMENSIONS):
+      return {**changed, 'transaction': fingerprints['transaction']}
+   return changed
+
+def stage_table(name: str, schema: str, stage: str, engine: Engine, manifest: bool = False, compression: str = 'none') -> None:
+   """Copy data from S3 bucket into an emptied staging table <stage>.<name>
+   shaped like the report table.
+   """
+   table = engine.dialect.identifier_preparer.quote(name)
+   with engine.begin() as conn:
+      conn.execute(text(f"CREATE TABLE IF NOT EXISTS {stage}.{table} (LIKE {schema}.{table});"))
+      conn.execute(text(f"DELETE FROM {stage}.{table};"))
+      copy_into(name, table=f'{stage}.{table}', conn=conn, manifest=manifest, compression=compression)
+
+def merge_dimension(table: Table, stage: str, conn: Connection) -> int:
+   """Update the rows of the dimension whose attributes changed in the
+   staging table, and insert the rows it does not have yet. Return the
+   number of rows updated.
+   """
+   # Quote the table names that are reserved words in the dialect
+   target = conn.dialect.identifier_preparer.format_table(table)
+   source = f'{stage}.{conn.dialect.identifier_preparer.quote(table.name)}'
+   key = table.primary_key.columns.values()[0].name
+   attributes = [column.name for column in table.columns if column.name != key]
+   updated = conn.execute(text(
+      f"UPDATE {target} SET {', '.join(f'{column} = s.{column}' for column in attributes)} "
+      f"FROM {source} AS s WHERE {target}.{key} = s.{key} "
+      f"AND ({' OR '.join(f'{target}.{column} <> s.{column}' for column in attributes)});"
+   ))
+   conn.execute(text(
+      f"INSERT INTO {target} SELECT s.* FROM {source} AS s "
+      f"LEFT JOIN {target} AS t ON s.{key} = t.{key} WHERE t.{key} IS NULL;"
+   ))
+   return updated.rowcount
+
+def merge_fact(table: Table, stage: str, conn: Connection) -> List[int]:
+   """Replace the fiscal years of the fact table that are in the staging
+   table. Return those fiscal years.
+   """
+   # Quote the table names that are reserved words in the dialect
+   target = conn.dialect.identifier_preparer.format_table(table)
+   source = f'{stage}.{conn.dialect.identifier_preparer.quote(table.name)}'
+   fiscal_years = [row[0] for row in conn.execute(text(f"SELECT DISTINCT fiscal_year FROM {source};"))]
+   conn.execute(text(f"DELETE FROM {target} WHERE fiscal_year IN (SELECT DISTINCT fiscal_year FROM {source});"))
+   # Staged transaction ids start at 1, so they are numbered after the kept rows
+   columns = [column.name for column in table.columns if column.name != 'transaction_id']
+   conn.execute(text(
+      f"INSERT INTO {target} SELECT s.transaction_id + m.max_id, {', '.join(f's.{column}' for column in columns)} "
+      f"FROM {source} AS s CROSS JOIN (SELECT COALESCE(MAX(transaction_id), 0) AS max_id FROM {target}) AS m;"
+   ))
+   return sorted(fiscal_years)
+
+def refresh_summaries(schema: MetaData, conn: Connection, fiscal_years: Optional[List[int]] = None) -> None:
+   """Recompute the rows of the summary tables for the fiscal years given,
+   or rebuild them entirely without fiscal years.
+   """
+   if fiscal_years == []:
+      return
+   preparer = conn.dialect.identifier_preparer
+   fact = preparer.format_table(schema.tables[f'{schema.schema}.transaction'])
+   finance = preparer.format_table(schema.tables[f'{schema.schema}.finance'])
+   years = '' if fiscal_years is None else f"WHERE fiscal_year IN ({', '.join(str(int(year)) for year in fiscal_years)})"
+   for name, (dimension, attribute) in SUMMARIES.items():
+      target = preparer.format_table(schema.tables[f'{schema.schema}.{name}'])
+      source = preparer.format_table(schema.tables[f'{schema.schema}.{dimension}'])
+      attribute = preparer.quote(attribute)
+      conn.execute(text(f"DELETE FROM {target} {years};"))
+      conn.execute(text(
+         f"INSERT INTO {target} (fiscal_year, {attribute}, revenue_or_spending, amount, max_amount, transactions) "
+         f"SELECT t.fiscal_year, d.{attribute}, f.revenue_or_spending, SUM(t.amount), MAX(t.amount), COUNT(*) "
+         f"FROM (SELECT * FROM {fact} {years}) AS t "
+         f"JOIN {source} AS d ON t.{dimension}_id = d.{dimension}_id "
+         f"JOIN {finance} AS f ON t.finance_id = f.finance_id "
+         f"GROUP BY t.fiscal_year, d.{attribute}, f.revenue_or_spending;"
+      ))
+   bump_data_version(list(SUMMARIES), schema=schema.schema, conn=conn)
+   if fiscal_years is None:
+      record_load_state('summaries', fingerprint=SUMMARIES_FINGERPRINT, schema=schema.schema, conn=conn)
+
+def rebuild_summaries(schema: MetaData, engine: Engine) -> None:
+   """Rebuild the summary tables from the report tables in one transaction.
+   """
+   with engine.begin() as conn:
+      refresh_summaries(schema, conn=conn)
+   print('Summary tables rebuilt')
+
+def merge_tables(schema: MetaData, stage: str, engine: Engine, fingerprints: Dict[str, str], rebuild: bool = False) -> List[int]:
+   """Merge the staging tables of the fingerprinted tables into the report
+   schema inside one transaction, the dimensions before the fact, refresh
+   the summary tables, record the fingerprints and bump the data versions.
+   Return the fiscal years that were refreshed.
+
+   Only the summaries of the refreshed fiscal years are recomputed, unless
+   rebuild is set or a dimension row changed, which may move transactions
+   of any fiscal year to another group.
+   """
+   fiscal_years, updated = [], 0
+   with engine.begin() as conn:
+      for name in DIMENSIONS:
+         if name in fingerprints:
+            updated += merge_dimension(schema.tables[f'{schema.schema}.{name}'], stage=stage, conn=conn)
+      if 'transaction' in fingerprints:
+         fiscal_years = merge_fact(schema.tables[f'{schema.schema}.transaction'], stage=stage, conn=conn)
+      refresh_summaries(schema, conn=conn, fiscal_years=None if rebuild or updated else fiscal_years)
+      for name, fingerprint in fingerprints.items():
+         record_load_state(name, fingerprint=fingerprint, schema=schema.schema, conn=conn)
+      bump_data_version([name for name in TABLES if name in fingerprints], schema=schema.schema, conn=conn)
+   print(f"Fiscal years refreshed: {fiscal_years}")
+   return fiscal_years
 
 def main() -> None:
    
    # 0. Create a connection instance
-   engine = redshift_connection(
-      cluster=redshift_cluster, db_name=db_name, 
-      username=db_username, password=db_password
-   )
+   engine = warehouse_connection(pool_size=max_connections)
 
    # 1. Create a REPORT schema
    schema = 'report'
@@ -162,23 +526,79 @@ def main() -> None:
 
    create_schema(name=schema, engine=engine)
 
-   # 2. Create Dimensional Tables
-   create_program_dimension(schema=report, engine=engine)
-   create_type_dimension(schema=report, engine=engine)
-   create_fund_dimension(schema=report, engine=engine)
-   create_finance_dimension(schema=report, engine=engine)
+   # Skip the tables whose objects in S3 bucket are unchanged since their last load
+   create_load_state(schema=report, engine=engine)
+   create_data_version(schema=report, engine=engine)
+   loaded = get_load_state(schema=schema, engine=engine)
+   fingerprints = {name: get_source_fingerprint(name) for name in TABLES}
+   changed = {name: fingerprint for name, fingerprint in fingerprints.items() if loaded.get(name) != fingerprint}
+   stale_summaries = loaded.get('summaries') != SUMMARIES_FINGERPRINT
+   if not changed and not stale_summaries:
+      print('All tables are up to date.')
+      engine.dispose()
+      return
 
-   # 3. Create Transaction Fact Table
-   create_transaction_fact(schema=report, engine=engine)
-
-   # 4. Load Dimensional Tables
-   load_table(name='program', schema=schema, engine=engine)
-   load_table(name='type', schema=schema, engine=engine)
-   load_table(name='fund', schema=schema, engine=engine)
-   load_table(name='finance', schema=schema, engine=engine)
+   # 2. Create Dimensional Tables, distributed and encoded after the profiles of their data
+   profiles = profile_tables(DIMENSIONS)
+   tasks = {
+      'create_program': (partial(create_program_dimension, schema=report, engine=engine, profiles=profiles), []),
+      'create_type': (partial(create_type_dimension, schema=report, engine=engine, profiles=profiles), []),
+      'create_fund': (partial(create_fund_dimension, schema=report, engine=engine, profiles=profiles), []),
+      'create_finance': (partial(create_finance_dimension, schema=report, engine=engine, profiles=profiles), [])
+   }
+   # 3. Create Transaction Fact Table once the dimensions it references exist
+   tasks['create_transaction'] = (
+      partial(create_transaction_fact, schema=report, engine=engine, profiles=profiles),
+      [f'create_{name}' for name in DIMENSIONS]
+   )
+   tasks['create_summaries'] = (partial(create_summary_tables, schema=report, engine=engine, profiles=profiles), [])
+   if incremental and changed:
+      # 4. Copy every changed table into the STAGE schema
+      create_schema(name='stage', engine=engine)
+      for name in changed:
+         tasks[f'stage_{name}'] = (
+            partial(stage_table, name=name, schema=schema, stage='stage', engine=engine, manifest=split, compression=compression),
+            ['create_transaction']
+         )
+      # 5. Merge the new and changed rows into the REPORT schema at once
+      tasks['merge'] = (
+         partial(merge_tables, schema=report, stage='stage', engine=engine, fingerprints=changed, rebuild=stale_summaries),
+         [f'stage_{name}' for name in changed] + ['create_summaries']
+      )
+   else:
+      changed = get_reloads(changed, fingerprints)
+      if backend == 'postgres' and set(changed) & set(DIMENSIONS):
+         # 4-5. On the local backend, reload the fact with its dimensions in one transaction
+         loads = ['load_star_schema']
+         tasks['load_star_schema'] = (
+            partial(reload_star_schema, fingerprints=changed, schema=schema, engine=engine, manifest=split, compression=compression),
+            ['create_transaction']
+         )
+      else:
+         loads = [f'load_{name}' for name in changed]
+         # 4. Reload changed Dimensional Tables
+         for name in DIMENSIONS:
+            if name in changed:
+               tasks[f'load_{name}'] = (
+                  partial(load_table, name=name, schema=schema, engine=engine, manifest=split, compression=compression, replace=True, fingerprint=changed[name]),
+                  [f'create_{name}']
+               )
+         # 5. Reload Fact Table after all of its dimensions
+         if 'transaction' in changed:
+            tasks['load_transaction'] = (
+               partial(load_table, name='transaction', schema=schema, engine=engine, manifest=split, compression=compression, replace=True, fingerprint=changed['transaction']),
+               ['create_transaction'] + [f'load_{name}' for name in DIMENSIONS if name in changed]
+            )
+      # 6. Rebuild the summary tables of the dashboard from the reloaded tables
+      tasks['summaries'] = (
+         partial(rebuild_summaries, schema=report, engine=engine),
+         ['create_transaction', 'create_summaries'] + loads
+      )
 
-   # 5. Load Fact Table
-   load_table(name='transaction', schema=schema, engine=engine)
+   # Independent statements run concurrently over the connection pool
+   timings = run_dag(tasks, max_workers=max_connections)
+   print_timings(timings)
+   print_clients_built()
 
    engine.dispose()
 
@@ -1,79 +1,79 @@
-import os 
+import os
+import re
 import json
 
-# Intermediary step to parse json document
+from functools import lru_cache
+from typing import Any, Dict
+
+# Files are read once per absolute path, so the cached values are shared across
+# threads and no function changes the working directory
+@lru_cache(maxsize=None)
+def load_template(path: str) -> Any:
+   """Parse the JSON policy template at the absolute path.
+   """
+   with open(path) as file:
+      return json.load(file)
+
+@lru_cache(maxsize=None)
+def load_key(path: str) -> str:
+   """Read the SSH key at the absolute path.
+   """
+   with open(path) as file:
+      return file.read()
+
+def substitute(template: Any, values: Dict[str, str]) -> Any:
+   """Return a copy of the parsed template with every placeholder in its
+   strings replaced by its value. The template itself is left untouched.
+   """
+   if isinstance(template, dict):
+      return {key: substitute(value, values) for key, value in template.items()}
+   if isinstance(template, list):
+      return [substitute(value, values) for value in template]
+   if isinstance(template, str):
+      # One pass, so that a value containing a placeholder is not replaced again
+      pattern = '|'.join(re.escape(placeholder) for placeholder in values)
+      return re.sub(pattern, lambda match: values[match.group(0)], template)
+   return template
+
+def render_policy(file_name: str, **values: str) -> str:
+   """Render the policy template policy/<file_name> with the values of
+   its placeholders as a JSON document.
+   """
+   path = os.path.abspath(os.path.join('policy', file_name))
+   assert os.path.exists(path), f'{path} is missing'
+   return json.dumps(substitute(load_template(path), values))
+
 def get_S3_policy_document(bucket_name: str, service: str) -> str:
    """Service is either 'transfer' or 'redshift'
    """
-   project_dir = os.getcwd()
-   assert 'policy' in os.listdir()
-   # Make sure in the policy directory
-   os.chdir('./policy')
-   # deserialize into dictionary for Python to work with
-   # serialize again for string update
-   if service == 'transfer':
-      assert 'transfer_S3_policy.json' in os.listdir()
-      with open('transfer_S3_policy.json') as file:
-         policy = json.dumps(json.load(file))
-   else:
-      assert 'redshift_S3_policy.json' in os.listdir()
-      with open('redshift_S3_policy.json') as file:
-         policy = json.dumps(json.load(file))
-   
+   file_name = 'transfer_S3_policy.json' if service == 'transfer' else 'redshift_S3_policy.json'
    # update 'bucket_name' placeholder with the S3 bucket name
-   policy_document = bucket_name.join(policy.split('bucket_name'))
-   
-   # Make sure go back to project directory
-   os.chdir(project_dir)
-
-   return policy_document
+   return render_policy(file_name, bucket_name=bucket_name)
 
-# Intermediary step to parse json document
 def get_trust_policy_document(account_id: str, region: str) -> str:
    """Service can be any AWS service
    """
-   project_dir = os.getcwd()
-   assert 'policy' in os.listdir()
-   # Make sure in the policy directory
-   os.chdir('./policy')
-   assert 'transfer_trust_policy.json' in os.listdir()
-   # deserialize into dictionary for Python to work with
-   # serialize again for string update
-   with open('transfer_trust_policy.json') as file:
-      policy = json.dumps(json.load(file))
-   
    # update placeholders with actual configuration
-   policy = account_id.join(policy.split('account_id'))
-   policy_document = region.join(policy.split('region'))
+   return render_policy('transfer_trust_policy.json', account_id=account_id, region=region)
 
-   # Make sure go back to project directory
-   os.chdir(project_dir)
-
-   return policy_document
-
-# Intermediary step to parse key content
-def get_ssh_key_content(type: str) -> str:
-   # Keep track of the project directory
-   project_dir = os.getcwd()
-   assert 'ssh' in os.listdir()
-   # Make sure in the ssh/ directory
-   os.chdir('./ssh')
+@lru_cache(maxsize=None)
+def find_ssh_key(ssh_directory: str, type: str) -> str:
+   """Return the absolute path of the public or the private key in the
+   ssh directory.
+   """
+   assert os.path.isdir(ssh_directory), f'{ssh_directory} is missing'
    # Must already have ssh key pairs generated
-   assert os.listdir() != []
-
-   ssh_key_pairs = list(filter(lambda file: '.sh' not in file, os.listdir()))
+   ssh_key_pairs = [file for file in sorted(os.listdir(ssh_directory)) if '.sh' not in file]
+   assert ssh_key_pairs != []
 
    # Request ssh public key
    if type == 'public':
-      ssh_key = list(filter(lambda file: '.pub' in file, ssh_key_pairs))[0]
+      ssh_key = [file for file in ssh_key_pairs if '.pub' in file][0]
    else: # Request ssh private key
-      ssh_key = list(filter(lambda file: '.pub' not in file, ssh_key_pairs))[0]
+      ssh_key = [file for file in ssh_key_pairs if '.pub' not in file][0]
+   return os.path.join(ssh_directory, ssh_key)
 
-   # Convert ssh key into string format
-   with open(ssh_key) as file:
-      ssh_key_content = ''.join(file.readlines())
-
-   # return to project directory
-   os.chdir(project_dir)
-
-   return ssh_key_content
+def get_ssh_key_content(type: str) -> str:
+   """Type is either 'public' or 'private'
+   """
+   return load_key(find_ssh_key(os.path.abspath('ssh'), type))
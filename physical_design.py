@@ -0,0 +1,152 @@
+import os
+import pandas as pd
+
+from configparser import ConfigParser
+from sqlalchemy import Table
+from sqlalchemy.engine import create_mock_engine
+from sqlalchemy.schema import MetaData
+from sqlalchemy.types import String
+from typing import Any, Dict, List, Optional
+
+
+config = ConfigParser()
+config.read_file(open('params.cfg'))
+
+# -----------Envrionment Variables----------- #
+# Data
+data_directory = config['Data']['data_directory']
+# Design
+diststyle_all_max_rows = int(config['Design']['diststyle_all_max_rows'])
+filter_columns = [column.strip() for column in config['Design']['filter_columns'].split(',')]
+# ------------------------------------------- #
+
+# BYTEDICT keeps a one-byte dictionary of up to 256 values per block, and
+# stores the values past those uncompressed
+BYTEDICT_MAX_DISTINCT = 256
+
+def profile_table(path: str, chunksize: int = 500000) -> Dict[str, Any]:
+   """Count the rows of the CSV file and the distinct values of each of its
+   columns.
+   """
+   rows, values = 0, {}
+   for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize):
+      rows += len(chunk)
+      for column in chunk.columns:
+         values.setdefault(column, set()).update(chunk[column].unique())
+   return {'rows': rows, 'distinct': {column: len(distinct) for column, distinct in values.items()}}
+
+def profile_tables(names: List[str], directory: str = data_directory) -> Dict[str, Dict[str, Any]]:
+   """Profile the <name>.csv file of each table in the directory, skipping
+   the tables without one.
+   """
+   profiles = {}
+   for name in names:
+      path = os.path.join(directory, f'{name}.csv')
+      if os.path.exists(path):
+         profiles[name] = profile_table(path)
+   return profiles
+
+def is_distributed_on_key(name: str, profiles: Dict[str, Dict[str, Any]], all_max_rows: int) -> bool:
+   """Whether the dimension is too large to copy to every node.
+   """
+   return name in profiles and profiles[name]['rows'] > all_max_rows
+
+def design_table(table: Table, profiles: Dict[str, Dict[str, Any]], all_max_rows: int = diststyle_all_max_rows, sort_columns: List[str] = filter_columns) -> Dict[str, Any]:
+   """Choose the distribution, sort key and column encodings of the table
+   from the profiles of the dimensions.
+
+   A dimension of up to all_max_rows rows is copied to every node, so the
+   joins to it never redistribute rows, and a larger one is distributed on
+   its key. The fact is distributed on its foreign key to the largest
+   dimension distributed on its key, so that the join to it is collocated,
+   or else evenly. Tables without a profile, like the summaries, are left
+   to Redshift (DISTSTYLE AUTO).
+
+   A table sorts on the filter columns it has, so that filters on them
+   skip blocks, or else on its key. Numbers are encoded with AZ64, strings
+   of few values with BYTEDICT and the others with ZSTD. The leading sort
+   key column is left raw: scans restricted on it read few blocks of it,
+   and would otherwise read many blocks of the other columns for each one.
+   """
+   name = table.name
+   key = table.primary_key.columns.values()[0].name
+   references = {
+      foreign_key.column.table.name: column.name
+      for column in table.columns for foreign_key in column.foreign_keys
+   }
+   design = {'diststyle': None, 'distkey': None}
+   if references:
+      distributed = [
+         dimension for dimension in references
+         if is_distributed_on_key(dimension, profiles, all_max_rows)
+      ]
+      if distributed:
+         largest = max(distributed, key=lambda dimension: profiles[dimension]['rows'])
+         design.update(diststyle='KEY', distkey=references[largest])
+      else:
+         design['diststyle'] = 'EVEN'
+   elif is_distributed_on_key(name, profiles, all_max_rows):
+      design.update(diststyle='KEY', distkey=key)
+   elif name in profiles:
+      design['diststyle'] = 'ALL'
+
+   design['sortkey'] = [column for column in sort_columns if column in table.columns] or [key]
+   if name in profiles:
+      distinct = profiles[name]['distinct']
+   else:
+      # The columns of the summaries hold the values of the same columns of the dimensions
+      distinct = {}
+      for profile in profiles.values():
+         for column, count in profile['distinct'].items():
+            distinct[column] = max(count, distinct.get(column, 0))
+   encode = {}
+   for column in table.columns:
+      if column.name == design['sortkey'][0]:
+         encode[column.name] = 'raw'
+      elif not isinstance(column.type, String):
+         encode[column.name] = 'az64'
+      elif distinct.get(column.name, BYTEDICT_MAX_DISTINCT + 1) <= BYTEDICT_MAX_DISTINCT:
+         encode[column.name] = 'bytedict'
+      else:
+         encode[column.name] = 'zstd'
+   design['encode'] = encode
+   return design
+
+def apply_design(table: Table, profiles: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+   """Set the design of the table as its Redshift dialect options, which
+   the other dialects ignore.
+   """
+   design = design_table(table, profiles or {})
+   options = table.dialect_options['redshift']
+   options['diststyle'], options['distkey'], options['sortkey'] = design['diststyle'], design['distkey'], design['sortkey']
+   for column, encode in design['encode'].items():
+      table.c[column].dialect_options['redshift']['encode'] = encode
+
+def get_ddl(profiles: Dict[str, Dict[str, Any]], url: str = 'redshift+psycopg2://') -> str:
+   """Return the CREATE TABLE statements load_tables.py issues with the
+   design chosen from the profiles, compiled for the dialect of the url.
+   """
+   from load_tables import create_program_dimension, create_type_dimension, create_fund_dimension
+   from load_tables import create_finance_dimension, create_transaction_fact, create_summary_tables
+
+   statements = []
+   # A mock engine compiles the statements instead of executing them
+   engine = create_mock_engine(url, lambda statement, *args, **kwargs: statements.append(str(statement.compile(dialect=engine.dialect)).strip()))
+   report = MetaData(schema='report')
+   for create in [create_program_dimension, create_type_dimension, create_fund_dimension, create_finance_dimension, create_transaction_fact, create_summary_tables]:
+      create(schema=report, engine=engine, profiles=profiles)
+   return ';\n\n'.join(statements) + ';'
+
+def main() -> None:
+   """Print the profile of the dimensions and the DDL of the report tables.
+   """
+   from load_tables import DIMENSIONS
+
+   profiles = profile_tables(DIMENSIONS)
+   for name, profile in profiles.items():
+      print(f"{name}: {profile['rows']} rows, distinct values {profile['distinct']}")
+   print()
+   print(get_ddl(profiles))
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,167 @@
+import re
+import time
+import threading
+import pandas as pd
+
+from collections import OrderedDict
+from configparser import ConfigParser
+from load_tables import get_data_versions, warehouse_connection
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from typing import Any, Dict, Optional, Set, Tuple
+
+
+config = ConfigParser()
+config.read_file(open('params.cfg'))
+
+# -----------Envrionment Variables----------- #
+# Query
+cache_size = int(config['Query']['cache_size'])
+cache_ttl_seconds = float(config['Query']['cache_ttl_seconds'])
+version_check_seconds = float(config['Query']['version_check_seconds'])
+# ------------------------------------------- #
+
+# String literals and quoted identifiers, which are kept as they are
+QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+COMMENTS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+WHITESPACE = re.compile(r'\s+')
+# Tables a query reads from, with or without their schema
+TABLE_NAMES = re.compile(r'\b(?:from|join)\s+(?:"?\w+"?\.)?"?(\w+)"?')
+# A FROM clause, up to the clause that follows it or the end of its subquery
+FROM_CLAUSES = re.compile(r'\bfrom\b(.*?)(?=\b(?:where|group|order|having|limit|offset|union|intersect|except)\b|\)|;|$)', re.S)
+
+def normalize_sql(sql: str) -> str:
+   """Lower-case the query and drop its comments, extra whitespace and
+   final semicolon, outside of its string literals and quoted identifiers,
+   so that the same query written differently is cached once.
+   """
+   parts = QUOTED.split(sql)
+   for position in range(0, len(parts), 2):
+      parts[position] = WHITESPACE.sub(' ', COMMENTS.sub(' ', parts[position])).lower()
+   return ''.join(parts).strip().rstrip(';').rstrip()
+
+def get_tables(sql: str) -> Set[str]:
+   """Return the names of the tables the normalized query reads from, or
+   none if they cannot be told apart, e.g. from a FROM clause that lists
+   its tables with commas, of which only the first follows the FROM.
+   """
+   if any(',' in clause for clause in FROM_CLAUSES.findall(QUOTED.sub("''", sql))):
+      return set()
+   return set(TABLE_NAMES.findall(sql))
+
+def get_data_stamp(sql: str, versions: Dict[str, int]) -> Tuple[Tuple[str, int], ...]:
+   """Return the data version of every table the normalized query reads
+   from. A query on anything else, e.g. a view or a common table
+   expression, depends on the versions of all the tables.
+   """
+   tables = get_tables(sql)
+   if not tables or not tables <= set(versions):
+      tables = set(versions)
+   return tuple((table, versions[table]) for table in sorted(tables))
+
+class QueryCache:
+   """Cache the results of the queries on the report schema in memory.
+
+   A result is keyed by the normalized query, its parameters and the data
+   version of the tables it reads from, which every load bumps. A load
+   thus invalidates only the results of the tables it changed. Up to
+   max_size results are kept, the least recently used dropped first, each
+   for ttl seconds at most. The data versions are read from the warehouse
+   at most every version_check seconds.
+   """
+   def __init__(self, engine: Engine, schema: str = 'report', max_size: int = cache_size, ttl: float = cache_ttl_seconds, version_check: float = version_check_seconds) -> None:
+      self.engine = engine
+      self.schema = schema
+      self.max_size = max_size
+      self.ttl = ttl
+      self.version_check = version_check
+      self.results: Dict[tuple, Tuple[float, pd.DataFrame]] = OrderedDict()
+      self.versions: Dict[str, int] = {}
+      self.checked_at: Optional[float] = None
+      self.hits = self.misses = 0
+      self.lock = threading.Lock()
+
+   def get_versions(self) -> Dict[str, int]:
+      """Return the data version of every table, read again if the last
+      read is older than version_check seconds. The cached results of the
+      tables whose version changed are dropped.
+      """
+      with self.lock:
+         if self.checked_at is not None and time.monotonic() - self.checked_at < self.version_check:
+            return self.versions
+      with self.engine.connect() as conn:
+         versions = get_data_versions(self.schema, conn)
+      with self.lock:
+         changed = {table for table in set(versions) | set(self.versions) if versions.get(table) != self.versions.get(table)}
+         for key in [key for key in self.results if {table for table, _ in key[2]} & changed]:
+            del self.results[key]
+         self.versions, self.checked_at = versions, time.monotonic()
+         return versions
+
+   def query(self, sql: str, params: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+      """Return the result of the query, from the cache if it holds it for
+      the current data of the tables the query reads from.
+      """
+      params = params or {}
+      normalized = normalize_sql(sql)
+      key = (normalized, tuple(sorted(params.items())), get_data_stamp(normalized, self.get_versions()))
+      with self.lock:
+         if key in self.results:
+            expires, result = self.results[key]
+            if time.monotonic() < expires:
+               self.results.move_to_end(key)
+               self.hits += 1
+               return result.copy()
+            del self.results[key]
+         self.misses += 1
+
+      with self.engine.connect() as conn:
+         rows = conn.execute(text(sql), params)
+         result = pd.DataFrame(rows.fetchall(), columns=list(rows.keys()))
+
+      with self.lock:
+         self.results[key] = (time.monotonic() + self.ttl, result)
+         self.results.move_to_end(key)
+         while len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+      return result.copy()
+
+   def print_stats(self) -> None:
+      """Print the cache hits and misses.
+      """
+      print(f'{self.hits} cache hits, {self.misses} misses, {len(self.results)} results cached')
+
+def main() -> None:
+   """Run the queries of the dashboard twice, the second time from the cache.
+   """
+   engine = warehouse_connection()
+   cache = QueryCache(engine)
+   queries = {
+      'Net Profit by Organization Group': (
+         "SELECT organization_group, SUM(CASE WHEN revenue_or_spending = 'Revenue' THEN amount ELSE -amount END) AS net_profit "
+         "FROM report.organization_group_summary WHERE fiscal_year = :fiscal_year GROUP BY organization_group ORDER BY net_profit DESC;"
+      ),
+      'Taxes as Revenue': (
+         "SELECT fiscal_year, SUM(amount) AS revenue FROM report.character_summary "
+         "WHERE revenue_or_spending = 'Revenue' AND character LIKE '%Taxes%' GROUP BY fiscal_year ORDER BY fiscal_year;"
+      ),
+      'Top Fund Type by Max Spending': (
+         "SELECT fund_type, MAX(max_amount) AS max_spending FROM report.fund_type_summary "
+         "WHERE revenue_or_spending = 'Spending' AND fiscal_year = :fiscal_year GROUP BY fund_type ORDER BY max_spending DESC;"
+      ),
+      'Transactions by Organization Group': (
+         "SELECT organization_group, SUM(transactions) AS transactions FROM report.organization_group_summary "
+         "WHERE fiscal_year = :fiscal_year GROUP BY organization_group ORDER BY transactions DESC;"
+      )
+   }
+   fiscal_year = cache.query("SELECT MAX(fiscal_year) AS fiscal_year FROM report.organization_group_summary;")['fiscal_year'][0]
+   for attempt in ['first run', 'cached']:
+      for title, sql in queries.items():
+         start = time.perf_counter()
+         result = cache.query(sql, {'fiscal_year': int(fiscal_year)} if ':fiscal_year' in sql else None)
+         print(f'{title} ({attempt}, {time.perf_counter() - start:.3f}s): {len(result)} rows')
+   cache.print_stats()
+   engine.dispose()
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,129 @@
+import os
+import glob
+import queue
+import time
+import posixpath
+import threading
+import paramiko
+
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from parse_policy import find_ssh_key
+from state import get_state
+from typing import Dict, List, Optional, Tuple
+
+
+config = ConfigParser()
+config.read_file(open('params.cfg'))
+
+# -----------Envrionment Variables----------- #
+# Account Info
+region = config['Account Info']['region']
+# Transfer Family
+sftp_server_username = config['Transfer Family']['sftp_server_username']
+# Upload
+files = config['Upload']['files']
+# SFTP
+sessions = int(config['SFTP']['sessions'])
+buffer_size_kb = int(config['SFTP']['buffer_size_kb'])
+# ------------------------------------------- #
+
+# SSH flow control window of each session; the default 2 MB stalls the
+# pipelined writes on a long round trip
+WINDOW_SIZE = 64 * 1024 * 1024
+MAX_PACKET_SIZE = 256 * 1024
+
+def open_session(host: str, port: int, username: str, key: paramiko.PKey) -> Tuple[paramiko.Transport, paramiko.SFTPClient]:
+   """Open an SSH connection with an SFTP session to the server. The SFTP
+   server of infrastructures.py presents the project's key as its host
+   key, so the server is verified against that key.
+   """
+   transport = paramiko.Transport((host, port), default_window_size=WINDOW_SIZE, default_max_packet_size=MAX_PACKET_SIZE)
+   transport.connect(hostkey=key, username=username, pkey=key)
+   sftp = paramiko.SFTPClient.from_transport(transport, window_size=WINDOW_SIZE, max_packet_size=MAX_PACKET_SIZE)
+   return transport, sftp
+
+def upload_file(sftp: paramiko.SFTPClient, path: str, remote_path: str, buffer_size: int) -> int:
+   """Upload the file, resuming from the size of a partial remote file, and
+   verify the size of the remote file afterwards. Writes are pipelined, so
+   they do not wait for the server to acknowledge each one. Return the
+   number of bytes sent.
+   """
+   size = os.path.getsize(path)
+   try:
+      offset = sftp.stat(remote_path).st_size
+      if offset == size:
+         return 0
+   except FileNotFoundError:
+      offset = 0
+   # A remote file larger than the local one is not a partial upload of it
+   if offset > size:
+      offset = 0
+
+   with open(path, 'rb') as local, sftp.open(remote_path, 'r+' if offset else 'w', bufsize=buffer_size) as remote:
+      remote.set_pipelined(True)
+      local.seek(offset)
+      remote.seek(offset)
+      for block in iter(lambda: local.read(buffer_size), b''):
+         remote.write(block)
+
+   remote_size = sftp.stat(remote_path).st_size
+   if remote_size != size:
+      raise IOError(f'{remote_path} is {remote_size} bytes on the server instead of {size}')
+   return size - offset
+
+def upload_files(paths: List[str], host: str, username: str, key: paramiko.PKey, port: int = 22, remote_directory: str = '.', max_sessions: int = sessions, buffer_size: int = buffer_size_kb * 1024) -> Dict[str, int]:
+   """Upload the files over several SFTP sessions at once, each taking the
+   largest file left until none is. Return the bytes sent per file.
+   """
+   pending = queue.Queue()
+   for path in sorted(paths, key=os.path.getsize, reverse=True):
+      pending.put(path)
+   sent, lock = {}, threading.Lock()
+   start = time.perf_counter()
+
+   def session() -> None:
+      transport, sftp = open_session(host, port, username, key)
+      try:
+         while True:
+            try:
+               path = pending.get_nowait()
+            except queue.Empty:
+               return
+            name = os.path.basename(path)
+            size = upload_file(sftp, path, posixpath.join(remote_directory, name), buffer_size)
+            with lock:
+               sent[name] = size
+            print(f'{name}: {size / 1024 / 1024:.1f} MB sent at {time.perf_counter() - start:.2f}s')
+      finally:
+         sftp.close()
+         transport.close()
+
+   with ThreadPoolExecutor(max_workers=max_sessions) as executor:
+      for future in [executor.submit(session) for _ in range(min(max_sessions, len(paths)))]:
+         future.result()
+   elapsed = time.perf_counter() - start
+
+   total = sum(sent.values())
+   print(f'{len(paths)} files, {total / 1024 / 1024:.1f} MB sent over {max_sessions} sessions '
+         f'in {elapsed:.2f}s ({total / 1024 / 1024 / elapsed:.1f} MB/s)')
+   return sent
+
+def get_sftp_endpoint() -> Optional[str]:
+   """Return the endpoint of the SFTP server recorded by infrastructures.py.
+   """
+   server_id = get_state('sftp_server')
+   return f'{server_id}.server.transfer.{region}.amazonaws.com' if server_id else None
+
+def main() -> None:
+   """Upload the dataset files to the S3 bucket through the SFTP server.
+   """
+   host = get_sftp_endpoint()
+   if host is None:
+      print('No SFTP server recorded, run infrastructures.py first')
+      return
+   key = paramiko.RSAKey.from_private_key_file(find_ssh_key(os.path.abspath('ssh'), 'private'))
+   upload_files(sorted(glob.glob(files)), host=host, username=sftp_server_username, key=key)
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,147 @@
+import time
+import pandas as pd
+
+from configparser import ConfigParser
+from itertools import chain
+from sqlalchemy import MetaData, Table, create_engine, select
+from sqlalchemy.engine import Engine, make_url
+from transform import compact_types, normalize_columns, print_memory_report, to_output, transform_chunks
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+
+config = ConfigParser()
+config.read_file(open('params.cfg'))
+
+# -----------Envrionment Variables----------- #
+# Data
+raw_export = config['Data']['raw_export']
+# Stage
+stage_url = config['Stage']['url']
+stage_schema = config['Stage']['schema']
+fetch_size = int(config['Stage']['fetch_size'])
+# ------------------------------------------- #
+
+# Postgres type of the columns of each kind of dtype; anything else is text
+POSTGRES_TYPES = {
+   'int16': 'smallint',
+   'int32': 'integer',
+   'int64': 'bigint',
+   'float32': 'real',
+   'float64': 'double precision',
+   'bool': 'boolean',
+   'datetime64[ns]': 'timestamp'
+}
+# Types of the raw and transformed transactions that their dtypes do not
+# tell; the codes are strings, as in the star schema, since a chunk may
+# fill the nulls of a numeric code with a placeholder
+TRANSACTION_TYPES = {
+   'fiscal_year': 'smallint',
+   'organization_group_code': 'text',
+   'fund_category_code': 'text',
+   'amount': 'numeric(20,2)'
+}
+
+def stage_connection() -> Engine:
+   """Connect to the local database holding the stage schema.
+   """
+   return create_engine(stage_url)
+
+def read_stage(name: str, engine: Engine, schema: str = stage_schema, fetch_size: int = fetch_size, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+   """Read the staged table in chunks of fetch_size rows, typed for the
+   transform stage. The rows are streamed from a server-side cursor, so
+   the time to the first chunk and the memory held do not grow with the
+   size of the table.
+   """
+   with engine.connect() as conn:
+      table = Table(name, MetaData(schema=schema), autoload_with=conn)
+      # DataFrame.to_sql writes the index of the frame as an 'index' column
+      selected = [table.c[col] for col in columns] if columns else [col for col in table.c if col.name != 'index']
+      # yield_per fetches fetch_size rows at a time from a named cursor
+      result = conn.execution_options(yield_per=fetch_size).execute(select(*selected))
+      keys = list(result.keys())
+      for rows in result.partitions():
+         yield compact_types(pd.DataFrame.from_records(rows, columns=keys))
+
+def copy_connection(url: str = stage_url) -> Any:
+   """Connect with psycopg to the database at the SQLAlchemy URL, for
+   COPY FROM STDIN.
+   """
+   # psycopg is only needed to write the stage
+   import psycopg
+   return psycopg.connect(make_url(url).set(drivername='postgresql').render_as_string(hide_password=False))
+
+def get_column_types(df: pd.DataFrame, types: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+   """Return the Postgres type of every column of the chunk: the one in
+   types if given, else the type of its dtype, or of its categories.
+   """
+   types = types or {}
+   column_types = {}
+   for col in df.columns:
+      dtype = df[col].dtype
+      if isinstance(dtype, pd.CategoricalDtype):
+         dtype = dtype.categories.dtype
+      column_types[col] = types.get(col, POSTGRES_TYPES.get(str(dtype), 'text'))
+   return column_types
+
+def write_stage(chunks: Iterable[pd.DataFrame], name: str, conn: Any, schema: str = stage_schema, types: Optional[Dict[str, str]] = None) -> int:
+   """Write the chunks into the <schema>.<name> table with COPY FROM STDIN
+   over the psycopg connection, in place of DataFrame.to_sql. The rows are
+   copied into a new table created with the column types of the first
+   chunk, which then replaces the table in the same transaction, so that
+   readers see either all the old rows or all the new ones. Return the
+   number of rows written.
+   """
+   chunks = iter(chunks)
+   first = next(chunks, None)
+   if first is None:
+      return 0
+   column_types = get_column_types(first, types=types)
+   columns = ', '.join(f'"{col}"' for col in column_types)
+   definitions = ', '.join(f'"{col}" {type_}' for col, type_ in column_types.items())
+   table, new = f'{schema}."{name}"', f'{schema}."{name}_new"'
+   rows = 0
+   with conn.transaction():
+      with conn.cursor() as cursor:
+         cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema};")
+         cursor.execute(f"DROP TABLE IF EXISTS {new};")
+         cursor.execute(f"CREATE TABLE {new} ({definitions});")
+         with cursor.copy(f"COPY {new} ({columns}) FROM STDIN WITH (FORMAT csv);") as copy:
+            for chunk in chain([first], chunks):
+               copy.write(chunk.to_csv(header=False, index=False))
+               rows += len(chunk)
+         cursor.execute(f"DROP TABLE IF EXISTS {table};")
+         cursor.execute(f'ALTER TABLE {new} RENAME TO "{name}";')
+   print(f"{rows} rows copied into {table}")
+   return rows
+
+def main() -> None:
+   """Stage the raw export as dev/eda.ipynb does, then clean the staged
+   transactions and repair their hierarchies into transaction_clean as
+   dev/transform.ipynb does, with COPY instead of DataFrame.to_sql. The
+   raw stage is kept, so the transform can run on it again.
+   """
+   # 1. Stage the raw export, read as strings so that every chunk agrees on the types
+   start = time.perf_counter()
+   with copy_connection() as conn:
+      raw = (normalize_columns(chunk) for chunk in pd.read_csv(raw_export, dtype=str, chunksize=fetch_size))
+      write_stage(raw, 'transaction', conn=conn, types=TRANSACTION_TYPES)
+   print(f"{raw_export} staged in {time.perf_counter() - start:.1f}s")
+
+   # 2. Transform the staged transactions, streamed from a server-side cursor
+   engine = stage_connection()
+   start = time.perf_counter()
+   chunks = read_stage('transaction', engine=engine)
+   next(chunks)
+   chunks.close()
+   print(f"First {fetch_size} rows of {stage_schema}.transaction read in {time.perf_counter() - start:.2f}s")
+   report = {}
+   start = time.perf_counter()
+   with copy_connection() as conn:
+      transformed = transform_chunks(lambda: read_stage('transaction', engine=engine), report=report)
+      write_stage((to_output(chunk) for chunk in transformed), 'transaction_clean', conn=conn, types=TRANSACTION_TYPES)
+   print(f"{stage_schema}.transaction transformed into {stage_schema}.transaction_clean in {time.perf_counter() - start:.1f}s")
+   print_memory_report(report)
+   engine.dispose()
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,174 @@
+import os
+import numpy as np
+import pandas as pd
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from configparser import ConfigParser
+from typing import Dict, Iterable, List, Optional, Tuple
+from transform import group_ids, print_memory_report, stream_transform
+
+
+config = ConfigParser()
+config.read_file(open('params.cfg'))
+
+# -----------Envrionment Variables----------- #
+# Data
+raw_export = config['Data']['raw_export']
+data_directory = config['Data']['data_directory']
+workers = int(config['Data']['workers'])
+# ------------------------------------------- #
+
+# ---------Attributes of the Dimensions--------- #
+DIMENSIONS: Dict[str, List[str]] = {
+   'program': [
+      'program', 'program_code',
+      'department', 'department_code',
+      'organization_group', 'organization_group_code',
+      'related_govt_units'
+   ],
+   'type': [
+      'sub_object', 'sub_object_code',
+      'object', 'object_code',
+      'character', 'character_code'
+   ],
+   'fund': [
+      'fund_category', 'fund_category_code',
+      'fund', 'fund_code',
+      'fund_type', 'fund_type_code'
+   ],
+   'finance': ['revenue_or_spending']
+}
+FACT_COLUMNS = ['transaction_id', 'fiscal_year', 'program_id', 'type_id', 'fund_id', 'finance_id', 'amount']
+# Placeholder of every attribute left null by the transform, in its style
+# ('No Sub Object', 'No Character Code'), as the dimension columns are NOT NULL
+NULL_VALUES = {
+   attribute: f"No {attribute.replace('_', ' ').title()}"
+   for attributes in DIMENSIONS.values() for attribute in attributes
+}
+# ---------------------------------------------- #
+
+def encode_partition(df: pd.DataFrame) -> dict:
+   """Dictionary-encode the attributes of every dimension in a partition
+   of the transactions. Each dimension is returned as its distinct rows
+   and, for every transaction, the position of its row among them. A null
+   attribute is keyed to its NULL_VALUES placeholder, so that no
+   transaction is left out of the fact.
+   """
+   partition = {'fiscal_year': df['fiscal_year'].to_numpy(), 'amount': df['amount'].to_numpy()}
+   for name, attributes in DIMENSIONS.items():
+      filled = df[attributes].astype(object).fillna({attribute: NULL_VALUES[attribute] for attribute in attributes})
+      ids = group_ids(filled, attributes)
+      groups, first, codes = np.unique(ids, return_index=True, return_inverse=True)
+      uniques = filled.iloc[first].astype(str)
+      partition[name] = (list(uniques.itertuples(index=False, name=None)), codes.astype(np.int32))
+   return partition
+
+class Dimension:
+   """Assign stable surrogate ids to the distinct rows of a dimension. The
+   ids of rows already in an existing dimension are kept, and new rows are
+   numbered after them in the order they are first seen.
+   """
+   def __init__(self, name: str, existing: Optional[pd.DataFrame] = None) -> None:
+      self.name = name
+      self.attributes = DIMENSIONS[name]
+      self.ids: Dict[tuple, int] = {}
+      if existing is not None:
+         rows = existing[self.attributes].astype(str).itertuples(index=False, name=None)
+         self.ids = dict(zip(rows, existing[f'{name}_id'].astype(int)))
+      self.next_id = max(self.ids.values(), default=0) + 1
+
+   def lookup(self, rows: List[tuple]) -> np.ndarray:
+      """Return the surrogate id of every distinct row of a partition
+      as an array, so that partition codes map to ids by indexing.
+      """
+      ids = np.empty(len(rows), dtype=np.int32)
+      for position, row in enumerate(rows):
+         if row not in self.ids:
+            self.ids[row] = self.next_id
+            self.next_id += 1
+         ids[position] = self.ids[row]
+      return ids
+
+   def to_frame(self) -> pd.DataFrame:
+      """Return the dimension table ordered by its surrogate id.
+      """
+      dimension = pd.DataFrame(list(self.ids.keys()), columns=self.attributes)
+      dimension.insert(0, f'{self.name}_id', list(self.ids.values()))
+      return dimension.sort_values(f'{self.name}_id', ignore_index=True)
+
+def encode_partitions(partitions: Iterable[pd.DataFrame], max_workers: int) -> Iterable[dict]:
+   """Encode the partitions on a process pool, yielding the results in
+   the order of the partitions. At most two partitions per worker are in
+   flight at once, which bounds the memory held by the pool.
+   """
+   with ProcessPoolExecutor(max_workers=max_workers) as executor:
+      pending = deque()
+      for partition in partitions:
+         pending.append(executor.submit(encode_partition, partition))
+         if len(pending) >= 2 * max_workers:
+            yield pending.popleft().result()
+      while pending:
+         yield pending.popleft().result()
+
+def build_star_schema(partitions: Iterable[pd.DataFrame], existing: Optional[Dict[str, pd.DataFrame]] = None, max_workers: int = workers) -> Tuple[Dict[str, pd.DataFrame], pd.DataFrame]:
+   """Build the program, type, fund and finance dimensions and the transaction
+   fact from partitions of transformed transactions. Return the dimensions
+   by name and the fact table.
+   """
+   existing = existing or {}
+   dimensions = {name: Dimension(name, existing=existing.get(name)) for name in DIMENSIONS}
+   fact = {column: [] for column in FACT_COLUMNS[1:]}
+
+   for partition in encode_partitions(partitions, max_workers=max_workers):
+      fact['fiscal_year'].append(partition['fiscal_year'])
+      fact['amount'].append(partition['amount'])
+      for name, dimension in dimensions.items():
+         rows, codes = partition[name]
+         fact[f'{name}_id'].append(dimension.lookup(rows)[codes])
+
+   transaction = pd.DataFrame({column: np.concatenate(values) for column, values in fact.items()})
+   transaction.insert(0, 'transaction_id', np.arange(1, len(transaction) + 1, dtype=np.int32))
+
+   return {name: dimension.to_frame() for name, dimension in dimensions.items()}, transaction
+
+def read_existing_dimensions(directory: str) -> Dict[str, pd.DataFrame]:
+   """Read the dimension tables already written to the directory.
+   """
+   existing = {}
+   for name in DIMENSIONS:
+      path = os.path.join(directory, f'{name}.csv')
+      if os.path.exists(path):
+         existing[name] = pd.read_csv(path, dtype=str)
+   return existing
+
+def write_star_schema(dimensions: Dict[str, pd.DataFrame], transaction: pd.DataFrame, directory: str) -> None:
+   """Write the dimensions and the fact as <name>.csv files, the layout
+   that load_tables.load_table copies from the S3 bucket.
+   """
+   for name, dimension in dimensions.items():
+      dimension.to_csv(os.path.join(directory, f'{name}.csv'), index=False)
+   transaction.to_csv(os.path.join(directory, 'transaction.csv'), index=False)
+
+def main() -> None:
+   """Transform the raw export and build the star schema in the data directory.
+   """
+   # 1. Clean the raw export and repair its hierarchies
+   transformed = os.path.join(data_directory, 'stage_transaction.csv')
+   report = {}
+   stream_transform(raw_export, output=transformed, report=report)
+   print_memory_report(report)
+   # 2. Encode the dimensions and key the fact table, keeping existing ids
+   attributes = {attribute: str for attributes in DIMENSIONS.values() for attribute in attributes}
+   partitions = pd.read_csv(transformed, dtype=attributes, chunksize=500000)
+   dimensions, transaction = build_star_schema(
+      partitions,
+      existing=read_existing_dimensions(data_directory)
+   )
+   # 3. Write the tables for the load
+   write_star_schema(dimensions, transaction, directory=data_directory)
+   os.remove(transformed)
+   print(f"{len(transaction)} transactions written to {data_directory}")
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,81 @@
+import os
+import json
+import logging
+import threading
+
+from botocore.exceptions import ClientError
+from configparser import ConfigParser
+from typing import Any, Callable, Dict, Optional
+
+
+config = ConfigParser()
+config.read_file(open('params.cfg'))
+
+# -----------Envrionment Variables----------- #
+# AWS
+state_file = config['AWS']['state_file']
+# ------------------------------------------- #
+
+# Resources are recorded under '<kind>:<name>' keys, e.g. 'role:S3RedshiftRole',
+# by the provisioning threads, so every read-modify-write holds the lock
+state_lock = threading.Lock()
+
+def read_state() -> Dict[str, Any]:
+   """Return every resource recorded in the state file.
+   """
+   if not os.path.exists(state_file):
+      return {}
+   with open(state_file) as file:
+      return json.load(file)
+
+def write_state(state: Dict[str, Any]) -> None:
+   """Replace the state file in one step, so that an interrupted run never
+   leaves it half-written.
+   """
+   with open(f'{state_file}.tmp', 'w') as file:
+      json.dump(state, file, indent=3, sort_keys=True)
+   os.replace(f'{state_file}.tmp', state_file)
+
+def get_state(key: str) -> Optional[Any]:
+   """Return the recorded value of a resource, if any.
+   """
+   with state_lock:
+      return read_state().get(key)
+
+def record_state(key: str, value: Any) -> None:
+   """Record the ARN, ID or endpoint of a resource.
+   """
+   with state_lock:
+      state = read_state()
+      state[key] = value
+      write_state(state)
+
+def get_recorded(kind: str) -> Dict[str, Any]:
+   """Return the recorded resources of a kind by name.
+   """
+   with state_lock:
+      state = read_state()
+   return {key.split(':', 1)[1]: value for key, value in state.items() if key.startswith(f'{kind}:')}
+
+def forget_state(key: str) -> None:
+   """Remove a resource from the state, e.g. once it is deleted.
+   """
+   with state_lock:
+      state = read_state()
+      if state.pop(key, None) is not None:
+         write_state(state)
+
+def validated(key: str, check: Callable[[Any], Any]) -> Optional[Any]:
+   """Confirm that a recorded resource still exists with a targeted GET,
+   check(value), and return its response. A resource that is not recorded
+   returns None, and one that is gone is forgotten and returns None.
+   """
+   value = get_state(key)
+   if value is None:
+      return None
+   try:
+      return check(value)
+   except ClientError as error:
+      logging.error(f'{key} is no longer available: {error}')
+      forget_state(key)
+      return None
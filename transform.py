@@ -0,0 +1,290 @@
+import re
+import resource
+import numpy as np
+import pandas as pd
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+# ---------Hierarchies of the Dimensions--------- #
+# Each entry pairs a hierarchy of name columns with the code column that
+# should have a many-to-one relationship with the last name in the hierarchy
+HIERARCHIES: List[Tuple[List[str], str]] = [
+   # Program Dimension
+   (['organization_group'], 'organization_group_code'),
+   (['organization_group', 'department'], 'department_code'),
+   (['organization_group', 'department', 'program'], 'program_code'),
+   # Type Dimension
+   (['character'], 'character_code'),
+   (['character', 'object'], 'object_code'),
+   (['character', 'object', 'sub_object'], 'sub_object_code'),
+   # Fund Dimension
+   (['fund_type'], 'fund_type_code'),
+   (['fund_type', 'fund'], 'fund_code'),
+   (['fund_type', 'fund', 'fund_category'], 'fund_category_code')
+]
+# Columns parsed as numbers; every other column of the export is a string
+NUMERIC_COLUMNS = ['fiscal_year', 'organization_group_code', 'fund_category_code', 'amount']
+# The strings and numeric codes of the export repeat a few thousand values
+# over every transaction, so they are held as categoricals. The numeric
+# codes have one type whatever nulls a chunk holds, so that every chunk
+# writes a code the same way, e.g. 4 and 1.0 as in data/*.csv
+NUMERIC_CODES = {'organization_group_code': 'Int64', 'fund_category_code': 'float64'}
+# ----------------------------------------------- #
+# Peak size of the transactions and peak RSS of the process per stage, in MB
+MemoryReport = Dict[str, Dict[str, float]]
+
+def record_memory(report: Optional[MemoryReport], stage: str, df: pd.DataFrame) -> None:
+   """Record the size of the DataFrame after the stage, keeping the largest
+   one seen, and the peak RSS of the process so far.
+   """
+   if report is None:
+      return
+   size = df.memory_usage(deep=True).sum() / 1024 / 1024
+   # ru_maxrss is in kilobytes on Linux
+   peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+   entry = report.setdefault(stage, {'dataframe_mb': 0.0, 'peak_rss_mb': 0.0})
+   entry['dataframe_mb'] = max(entry['dataframe_mb'], size)
+   entry['peak_rss_mb'] = max(entry['peak_rss_mb'], peak_rss)
+
+def print_memory_report(report: MemoryReport) -> None:
+   """Print the memory recorded per stage.
+   """
+   print(f'{"stage":<10}{"DataFrame":>12}{"peak RSS":>12}')
+   for stage, entry in report.items():
+      print(f'{stage:<10}{entry["dataframe_mb"]:>9.1f} MB{entry["peak_rss_mb"]:>9.0f} MB')
+
+def fill(column: pd.Series, value: Any) -> pd.Series:
+   """Fill the nulls of the column with the value, which is added to the
+   categories of a categorical column first.
+   """
+   if isinstance(column.dtype, pd.CategoricalDtype) and value not in column.cat.categories:
+      column = column.cat.add_categories([value])
+   return column.fillna(value)
+
+def set_values(df: pd.DataFrame, rows: np.ndarray, column: str, values: Any) -> None:
+   """Set the column of the rows at the positions to the values, which are
+   added to the categories of a categorical column first.
+   """
+   position = df.columns.get_loc(column)
+   if isinstance(df[column].dtype, pd.CategoricalDtype):
+      new = pd.Index(pd.unique(np.atleast_1d(np.asarray(values, dtype=object)))).difference(df[column].cat.categories)
+      if len(new):
+         df[column] = df[column].cat.add_categories(new)
+   df.iloc[rows, position] = values
+
+def to_output(df: pd.DataFrame) -> pd.DataFrame:
+   """Return the transactions as they are written out, with the amounts in
+   dollars.
+   """
+   return df.assign(amount=df['amount'] / 100)
+
+def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+   """Engineer the column names of the raw export to be SQL-friendly,
+   e.g. 'Sub-object Code' becomes 'sub_object_code'.
+   """
+   df.columns = df.columns.map(
+      lambda col: '_'.join([strip_col.lower() for strip_col in re.split(' |-', col)])
+   )
+   return df
+
+def clean(df: pd.DataFrame) -> pd.DataFrame:
+   """Handle the null values and the miscellaneous attributes of the
+   transactions before the hierarchies are checked.
+   """
+   # Miscellaneous attributes
+   set_values(df, np.flatnonzero(df.related_govt_units == 'NO'), 'related_govt_units', 'No')
+   set_values(df, np.flatnonzero(df.related_govt_units == 'YES'), 'related_govt_units', 'Yes')
+   # Program dimension
+   df = df[df['department'].notna()].copy()
+   df['program'] = fill(df['program'], 'No Program')
+   df['program_code'] = fill(df['program_code'], 'No Program Code')
+   # Type dimension
+   df['character'] = fill(df['character'], 'No Character')
+   df['object'] = fill(df['object'], 'No Object')
+   df['object_code'] = fill(df['object_code'], 'No Object Code')
+   set_values(df, np.flatnonzero(df.sub_object_code == 'NKEY'), 'sub_object', 'No Sub Object')
+   # Fund dimension
+   df['fund_category'] = fill(df['fund_category'], 'No Fund Category')
+   df['fund_category_code'] = fill(df['fund_category_code'], 'No Fund Category Code')
+
+   return df
+
+def group_ids(df: pd.DataFrame, cols: List[str]) -> np.ndarray:
+   """Label every row with an integer id of its group under the hierarchy
+   of features in cols. Rows with a null feature are labelled -1.
+   """
+   ids = np.zeros(len(df), dtype=np.int64)
+   has_null = np.zeros(len(df), dtype=bool)
+   for col in cols:
+      codes, uniques = pd.factorize(df[col])
+      has_null |= (codes == -1)
+      # Combine the factorized columns into a dense id one level at a time
+      ids, _ = pd.factorize(ids * (len(uniques) + 1) + codes)
+   ids = ids.astype(np.int64)
+   ids[has_null] = -1
+   return ids
+
+def get_invalid_groups(hierarchy: List[str], target: str, df: pd.DataFrame) -> np.ndarray:
+   """Return a boolean mask over the rows whose group under the hierarchy
+   has more than one distinct value in the target feature.
+   """
+   ids = group_ids(df, hierarchy)
+   codes, _ = pd.factorize(df[target])
+   valid_rows = (ids != -1) & (codes != -1)
+   # Count the distinct (group, code) pairs of each group
+   pairs = np.unique(np.stack([ids[valid_rows], codes[valid_rows]]), axis=1)
+   n_codes = np.bincount(pairs[0], minlength=ids.max() + 1)
+   return (ids != -1) & (n_codes[ids] > 1)
+
+def repair_hierarchy(hierarchy: List[str], target: str, df: pd.DataFrame) -> int:
+   """Impute the first code of every group that has multiple codes to the
+   other rows of the same group, in one vectorized pass over the DataFrame.
+   Return the number of rows updated.
+   """
+   ids = group_ids(df, hierarchy)
+   codes, uniques = pd.factorize(df[target])
+   valid_rows = np.flatnonzero((ids != -1) & (codes != -1))
+   if len(valid_rows) == 0:
+      return 0
+   n_groups = ids.max() + 1
+   # Count the distinct codes of each group
+   pairs = np.unique(np.stack([ids[valid_rows], codes[valid_rows]]), axis=1)
+   n_codes = np.bincount(pairs[0], minlength=n_groups)
+   # The first code seen in row order wins within each group
+   groups, first = np.unique(ids[valid_rows], return_index=True)
+   impute_code = np.full(n_groups, -1, dtype=np.int64)
+   impute_code[groups] = codes[valid_rows[first]]
+   # Only rows of invalid groups that carry a different code are updated
+   invalid = (ids != -1) & (n_codes[np.maximum(ids, 0)] > 1)
+   update = invalid & (codes != impute_code[np.maximum(ids, 0)])
+   if update.any():
+      set_values(df, np.flatnonzero(update), target, uniques.take(impute_code[ids[update]]))
+   return int(update.sum())
+
+def transform(df: pd.DataFrame, hierarchies: List[Tuple[List[str], str]] = HIERARCHIES, report: Optional[MemoryReport] = None) -> pd.DataFrame:
+   """Clean the transactions and repair every hierarchy so that each
+   code column has a many-to-one relationship with its feature. The memory
+   of every stage is recorded in the report, if given.
+   """
+   record_memory(report, 'read', df)
+   df = clean(df)
+   record_memory(report, 'clean', df)
+   for hierarchy, target in hierarchies:
+      updated = repair_hierarchy(hierarchy, target=target, df=df)
+      print(f"{target} transformation complete! ({updated} rows imputed)")
+   record_memory(report, 'repair', df)
+   return df
+
+def read_raw_chunks(path: str, chunksize: int = 500000) -> Iterator[pd.DataFrame]:
+   """Read the raw Spending_and_Revenue export in chunks of rows with
+   normalized column names. Types are fixed up front so that every chunk
+   agrees on them regardless of the values it happens to hold: the strings
+   and codes are categoricals, the fiscal year an int16 and the amount
+   int64 cents, a fixed-point number.
+   """
+   columns = pd.read_csv(path, nrows=0).columns
+   numeric = [col for col, name in zip(columns, normalize_columns(pd.DataFrame(columns=columns)).columns) if name in NUMERIC_COLUMNS]
+   dtypes = {col: str if col in numeric else 'category' for col in columns}
+   for chunk in pd.read_csv(path, dtype=dtypes, chunksize=chunksize):
+      yield compact_types(normalize_columns(chunk))
+
+def compact_types(chunk: pd.DataFrame) -> pd.DataFrame:
+   """Convert the normalized columns of the raw export, or the ones the
+   chunk holds, to the types of the transform stage: the fiscal year to
+   int16, the amount to int64 cents and the codes and strings to
+   categoricals. A null fiscal year or amount raises a ValueError.
+   """
+   for col in chunk.columns.intersection(['fiscal_year', 'amount']):
+      chunk[col] = pd.to_numeric(chunk[col])
+      # Integers have no null, which the NOT NULL columns of the fact table reject anyway
+      missing = int(chunk[col].isna().sum())
+      if missing:
+         raise ValueError(f'{missing} transactions have no {col}')
+   if 'fiscal_year' in chunk:
+      chunk['fiscal_year'] = chunk['fiscal_year'].astype(np.int16)
+   if 'amount' in chunk:
+      chunk['amount'] = np.rint(chunk['amount'].to_numpy(dtype=float) * 100).astype(np.int64)
+   for col in chunk.columns.intersection(list(NUMERIC_CODES)):
+      chunk[col] = pd.to_numeric(chunk[col]).astype(NUMERIC_CODES[col]).astype('category')
+   for col in chunk.columns.difference(NUMERIC_COLUMNS):
+      if not isinstance(chunk[col].dtype, pd.CategoricalDtype):
+         chunk[col] = chunk[col].astype('category')
+   return chunk
+
+def update_code_maps(code_maps: Dict[str, pd.DataFrame], df: pd.DataFrame, hierarchies: List[Tuple[List[str], str]] = HIERARCHIES) -> None:
+   """Record the first code of every group of the chunk that has not
+   been seen in a previous chunk, and whether the group has more than one
+   distinct code over the chunks seen so far.
+   """
+   for hierarchy, target in hierarchies:
+      pairs = df[hierarchy + [target]].dropna().drop_duplicates().set_index(hierarchy)[target]
+      first_codes = pairs[~pairs.index.duplicated()]
+      # Groups with several codes within the chunk, or another code than in a previous chunk
+      multiple = pairs.index[pairs.index.duplicated()]
+      if target in code_maps:
+         known = code_maps[target]
+         positions = known.index.get_indexer(pairs.index)
+         seen = np.flatnonzero(positions != -1)
+         differ = np.asarray(known['code'], dtype=object)[positions[seen]] != np.asarray(pairs, dtype=object)[seen]
+         multiple = multiple.append(pairs.index[seen[differ]])
+         first_codes = first_codes[~first_codes.index.isin(known.index)]
+         code_map = pd.concat([known, pd.DataFrame({'code': first_codes, 'multiple': False})])
+      else:
+         code_map = pd.DataFrame({'code': first_codes, 'multiple': False})
+      code_map.loc[code_map.index.isin(multiple), 'multiple'] = True
+      code_maps[target] = code_map
+
+def apply_code_maps(code_maps: Dict[str, pd.DataFrame], df: pd.DataFrame, hierarchies: List[Tuple[List[str], str]] = HIERARCHIES) -> None:
+   """Impute the first code of each group with multiple codes to every row
+   of the chunk, as repair_hierarchy does. The null codes of the groups
+   with a single code are left as they are.
+   """
+   for hierarchy, target in hierarchies:
+      code_map = code_maps[target]
+      keys = pd.MultiIndex.from_frame(df[hierarchy]) if len(hierarchy) > 1 else pd.Index(df[hierarchy[0]])
+      positions = code_map.index.get_indexer(keys)
+      rows = np.flatnonzero(positions != -1)
+      rows = rows[code_map['multiple'].to_numpy()[positions[rows]]]
+      set_values(df, rows, target, code_map['code'].to_numpy()[positions[rows]])
+
+def stream_transform(path: str, output: str, chunksize: int = 500000, hierarchies: List[Tuple[List[str], str]] = HIERARCHIES, report: Optional[MemoryReport] = None) -> int:
+   """Clean the raw export and repair its hierarchies chunk by chunk, writing
+   the transactions to the output CSV. Return the number of rows written.
+   """
+   return stream_transform_chunks(
+      lambda: read_raw_chunks(path, chunksize=chunksize), output=output, hierarchies=hierarchies, report=report
+   )
+
+def transform_chunks(read_chunks: Callable[[], Iterator[pd.DataFrame]], hierarchies: List[Tuple[List[str], str]] = HIERARCHIES, report: Optional[MemoryReport] = None) -> Iterator[pd.DataFrame]:
+   """Clean the chunks of raw transactions and repair their hierarchies,
+   yielding the transformed chunks. The chunks are read twice with
+   read_chunks, and only the per-hierarchy code maps are kept across
+   chunks, so memory is bounded by the chunk size. The memory of every
+   stage is recorded in the report, if given.
+   """
+   # 1. Find the first code of every group over all the chunks
+   code_maps = {}
+   for chunk in read_chunks():
+      record_memory(report, 'read', chunk)
+      chunk = clean(chunk)
+      record_memory(report, 'clean', chunk)
+      update_code_maps(code_maps, chunk, hierarchies=hierarchies)
+   # 2. Impute the codes of every chunk
+   for chunk in read_chunks():
+      chunk = clean(chunk)
+      apply_code_maps(code_maps, chunk, hierarchies=hierarchies)
+      record_memory(report, 'repair', chunk)
+      yield chunk
+
+def stream_transform_chunks(read_chunks: Callable[[], Iterator[pd.DataFrame]], output: str, hierarchies: List[Tuple[List[str], str]] = HIERARCHIES, report: Optional[MemoryReport] = None) -> int:
+   """Transform the chunks of raw transactions with transform_chunks,
+   writing the transactions to the output CSV. Return the number of rows
+   written.
+   """
+   rows = 0
+   for chunk in transform_chunks(read_chunks, hierarchies=hierarchies, report=report):
+      to_output(chunk).to_csv(output, mode='w' if rows == 0 else 'a', header=(rows == 0), index=False)
+      rows += len(chunk)
+   print(f"{rows} transactions transformed into {output}")
+   return rows
@@ -0,0 +1,102 @@
+import os
+import glob
+import time
+import hashlib
+
+from aws import get_client
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from typing import Dict, List
+
+
+config = ConfigParser()
+config.read_file(open('params.cfg'))
+
+# -----------Envrionment Variables----------- #
+# S3
+bucket_name = config['S3']['bucket_name']
+# Upload
+files = config['Upload']['files']
+part_size_mb = int(config['Upload']['part_size_mb'])
+concurrency = int(config['Upload']['concurrency'])
+# ------------------------------------------- #
+
+MB = 1024 * 1024
+
+def get_md5(path: str) -> str:
+   """Return the MD5 checksum of the file.
+   """
+   md5 = hashlib.md5()
+   with open(path, 'rb') as file:
+      for block in iter(lambda: file.read(8 * MB), b''):
+         md5.update(block)
+   return md5.hexdigest()
+
+def is_uploaded(bucket: str, key: str, size: int, md5: str) -> bool:
+   """Whether the object already holds the file: same size, and the same
+   checksum, either recorded by upload_files or as the ETag of an object
+   uploaded in one part, e.g. over SFTP.
+   """
+   try:
+      head = get_client('s3').head_object(Bucket=bucket, Key=key)
+   except ClientError as error:
+      if error.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+         return False
+      raise
+   if head['ContentLength'] != size:
+      return False
+   return md5 in (head.get('Metadata', {}).get('md5'), head['ETag'].strip('"'))
+
+def upload_files(paths: List[str], bucket: str, part_size: int, max_concurrency: int) -> Dict[str, bool]:
+   """Upload the files to the root of the S3 bucket, splitting files larger
+   than part_size into parts uploaded concurrently. All the files share one
+   pool of max_concurrency threads. Files already in the bucket are
+   skipped. Return whether each file was uploaded, by key.
+   """
+   with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+      checksums = dict(zip(paths, executor.map(get_md5, paths)))
+      uploaded = dict(zip(paths, executor.map(
+         lambda path: not is_uploaded(bucket, os.path.basename(path), os.path.getsize(path), checksums[path]),
+         paths
+      )))
+
+   pending = [path for path in paths if uploaded[path]]
+   for path in paths:
+      if not uploaded[path]:
+         print(f'{os.path.basename(path)}: already uploaded, skipped')
+
+   transfer_config = TransferConfig(
+      multipart_threshold=part_size,
+      multipart_chunksize=part_size,
+      max_concurrency=max_concurrency
+   )
+   start = time.perf_counter()
+   with create_transfer_manager(get_client('s3'), transfer_config) as manager:
+      futures = [
+         manager.upload(path, bucket, os.path.basename(path), extra_args={'Metadata': {'md5': checksums[path]}})
+         for path in pending
+      ]
+      for path, future in zip(pending, futures):
+         future.result()
+         print(f'{os.path.basename(path)}: {os.path.getsize(path) / MB:.1f} MB uploaded at {time.perf_counter() - start:.2f}s')
+   elapsed = time.perf_counter() - start
+
+   total = sum(os.path.getsize(path) for path in pending)
+   if pending:
+      print(f'{len(pending)} files, {total / MB:.1f} MB uploaded in {elapsed:.2f}s ({total / MB / elapsed:.1f} MB/s)')
+   return {os.path.basename(path): uploaded[path] for path in paths}
+
+def main() -> None:
+   """Upload the dataset files straight to the S3 bucket, instead of
+   putting them over SFTP.
+   """
+   paths = sorted(glob.glob(files))
+   if not paths:
+      print(f'No files match {files}')
+      return
+   upload_files(paths, bucket=bucket_name, part_size=part_size_mb * MB, max_concurrency=concurrency)
+
+if __name__ == '__main__':
+   main()